@@ -0,0 +1,125 @@
+"""
+Общий кэш сборки для хостов флота
+
+Первый хост, собравший коммит, публикует результат, остальные
+разворачивают его без сборки - CPU сборки тратится один раз на коммит.
+
+- local (BUILD_CACHE_DIR - общий каталог хостов): архивы образов
+  коммитов (`docker save`, gzip)
+- registry (APP_IMAGE в registry): образ коммита публикуется `push` с
+  тегом коммита
+
+Архивы образов пишутся и читаются через Engine API (в образе агента нет
+docker CLI, а docker-compose v1 не экспортирует кэш BuildKit - общий
+кэш слоёв сборки не поддерживается).
+"""
+import os
+import time
+import logging
+from pathlib import Path
+from typing import Optional
+
+from config import BuildCacheConfig
+from docker_proxy import SecureDockerProxy, DockerProxyError
+from registry import ImageRegistry
+from metrics import MetricsStore
+
+logger = logging.getLogger('build-cache')
+
+
+class SharedBuildCache:
+    """Публикация и повторное использование образов коммитов"""
+
+    def __init__(
+        self,
+        config: BuildCacheConfig,
+        docker_proxy: SecureDockerProxy,
+        registry: ImageRegistry,
+        metrics: Optional[MetricsStore] = None
+    ):
+        self.config = config
+        self.docker_proxy = docker_proxy
+        self.registry = registry
+        self.metrics = metrics
+
+    @property
+    def enabled(self) -> bool:
+        return self.config.enabled
+
+    def archive_path(self, commit: str) -> Path:
+        return Path(self.config.directory) / 'images' / f"{self.registry.tag_for(commit)}.tar.gz"
+
+    def _record(self, name: str, started: float, help: str) -> float:
+        duration = round(time.monotonic() - started, 2)
+        if self.metrics is not None:
+            self.metrics.set(name, duration, help=help)
+            self.metrics.write()
+        return duration
+
+    def restore(self, commit: str) -> Optional[bool]:
+        """
+        Образ коммита из общего кэша.
+
+        Returns:
+            True - образ загружен локально, None - образ в registry
+            (загрузит deploy_image), False - образа в кэше нет
+        """
+        if self.config.backend == 'registry':
+            return None if self.registry.has_image(commit) is not False else False
+
+        path = self.archive_path(commit)
+        if not path.exists():
+            return False
+
+        started = time.monotonic()
+        result = self.docker_proxy.import_image(str(path))
+        duration = self._record('build_cache_restore_seconds', started, 'Duration of loading a shared commit image')
+        if not result['success']:
+            logger.warning(f"Cannot load {path}: {result['stderr'].strip()}")
+            return False
+        logger.info(f"Loaded image of {commit[:8]} from shared cache in {duration:.1f}s")
+        return True
+
+    def publish(self, commit: str) -> bool:
+        """Публикация собранного образа коммита для остальных хостов"""
+        started = time.monotonic()
+        tag = self.registry.tag_for(commit)
+        try:
+            if self.config.backend == 'registry':
+                result = self.docker_proxy.push('app', image_tag=tag)
+            else:
+                path = self.archive_path(commit)
+                if path.exists():
+                    # Хост той же волны опубликовал раньше
+                    return True
+                path.parent.mkdir(parents=True, exist_ok=True)
+                result = self.docker_proxy.export_image('app', tag, str(path), timeout=self.config.timeout)
+        except (DockerProxyError, OSError) as e:
+            logger.warning(f"Cannot publish image of {commit[:8]}: {e}")
+            return False
+
+        duration = self._record('build_cache_publish_seconds', started, 'Duration of publishing a commit image')
+        if not result['success']:
+            logger.warning(f"Cannot publish image of {commit[:8]}: {result['stderr'].strip()}")
+            return False
+
+        logger.info(f"Published image of {commit[:8]} to shared cache in {duration:.1f}s")
+        if self.config.backend == 'local':
+            self._prune()
+        return True
+
+    def _prune(self):
+        """Остаются keep последних архивов образов"""
+        archives = []
+        for path in (Path(self.config.directory) / 'images').glob('*.tar.gz'):
+            try:
+                archives.append((path.stat().st_mtime, path))
+            except OSError:
+                # Удалён другим хостом
+                continue
+        archives.sort(reverse=True)
+        for _, path in archives[max(self.config.keep, 1):]:
+            try:
+                os.unlink(path)
+            except OSError as e:
+                logger.warning(f"Cannot remove {path}: {e}")
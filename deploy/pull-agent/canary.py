@@ -0,0 +1,319 @@
+"""
+Canary-деплой для Pull-агента
+
+Новая версия запускается рядом с текущей (отдельный compose-сервис),
+после чего доля трафика на неё увеличивается по шагам через веса
+upstream в nginx. На каждом шаге canary проверяется пробами: доля
+ошибок и p95 задержки. При превышении порогов трафик возвращается
+на стабильную версию, при успехе всех шагов версия продвигается.
+
+Пробы шага идут через тот же upstream nginx, что и трафик (отдельный
+server на порту 8081 без повтора на другой сервер отвечает заголовком
+X-Upstream с адресом выбранного сервера): веса действительно решают,
+куда попадёт проба, а пороги считаются только по ответам canary. Шаг
+продлевается (до MAX_STEP_EXTENSION длительностей), пока canary не
+получит CANARY_MIN_PROBES проб. Ответ без X-Upstream (CANARY_PROBE_URL
+напрямую в canary) засчитывается canary, ошибка соединения - тоже.
+"""
+import os
+import time
+import socket
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, List, Optional, Dict, Any, Set, Tuple
+
+from config import CanaryConfig
+from docker_proxy import SecureDockerProxy, DockerProxyError
+from lazy_imports import requests
+
+logger = logging.getLogger('canary')
+
+# Во сколько раз шаг может быть длиннее CANARY_STEP_DURATION ради CANARY_MIN_PROBES
+MAX_STEP_EXTENSION = 5
+
+
+@dataclass
+class ProbeStats:
+    """Результаты проб одного шага"""
+    total: int = 0
+    errors: int = 0
+    latencies_ms: List[float] = field(default_factory=list)
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.total if self.total else 1.0
+
+    @property
+    def p95_latency_ms(self) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        index = max(0, int(round(0.95 * len(ordered))) - 1)
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'probes': self.total,
+            'errors': self.errors,
+            'error_rate': round(self.error_rate, 4),
+            'p95_latency_ms': round(self.p95_latency_ms, 1)
+        }
+
+
+@dataclass
+class CanaryResult:
+    """Итог canary-деплоя"""
+    success: bool
+    stage: str
+    share: int = 0
+    error: Optional[str] = None
+    steps: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def stable_affected(self) -> bool:
+        """Затронута ли стабильная версия (нужен полный откат)"""
+        return self.stage == 'promote'
+
+
+class CanaryDeployer:
+    """
+    Пошаговое переключение трафика на новую версию.
+
+    Веса пишутся в отдельный include-файл upstream, который nginx
+    подключает внутри блока upstream. Стабильный сервер всегда имеет
+    вес 100, вес canary рассчитывается из требуемой доли трафика.
+    """
+
+    def __init__(
+        self,
+        config: CanaryConfig,
+        docker_proxy: SecureDockerProxy,
+        stable_service: str = 'app'
+    ):
+        self.config = config
+        self.docker_proxy = docker_proxy
+        self.stable_service = stable_service
+
+    @property
+    def upstream_file(self) -> Path:
+        return Path(self.config.upstream_dir) / f'{self.config.upstream_name}.canary.conf'
+
+    @staticmethod
+    def canary_weight(share: int) -> int:
+        """Вес canary-сервера при весе стабильного 100"""
+        return max(1, round(100 * share / (100 - share)))
+
+    def _validate_steps(self):
+        if not self.config.steps:
+            raise DockerProxyError("No canary steps configured")
+
+        for share in self.config.steps:
+            if not 0 < share < 100:
+                raise DockerProxyError(f"Canary step must be between 1 and 99 percent: {share}")
+
+        if self.config.steps != sorted(self.config.steps):
+            raise DockerProxyError(f"Canary steps must be increasing: {self.config.steps}")
+
+    def _write_weights(self, share: int):
+        """Атомарная запись весов upstream"""
+        self.upstream_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.upstream_file.with_suffix('.tmp')
+
+        with open(tmp_file, 'w') as f:
+            f.write(f"# Managed by pull-agent: canary {share}%\n")
+            f.write(f"server {self.config.canary_server} weight={self.canary_weight(share)};\n")
+
+        os.replace(tmp_file, self.upstream_file)
+
+    def _clear_weights(self):
+        """Удаление canary из upstream"""
+        try:
+            self.upstream_file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _reload(self) -> bool:
+        result = self.docker_proxy.reload_reverse_proxy()
+        if not result['success']:
+            logger.error(f"Reverse proxy reload failed: {result['stderr']}")
+        return result['success']
+
+    def _request(self, url: str) -> Tuple[bool, float, Optional[str]]:
+        """Один запрос: успех, задержка (мс) и сервер upstream из X-Upstream"""
+        started = time.monotonic()
+        upstream = None
+        try:
+            response = requests.get(url, timeout=self.config.probe_timeout)
+            ok = response.status_code < 500
+            # При повторе nginx перечисляет серверы через запятую, ответил последний
+            header = response.headers.get('X-Upstream')
+            if header:
+                upstream = header.split(',')[-1].strip()
+        except requests.RequestException as e:
+            logger.debug(f"Canary probe failed: {e}")
+            ok = False
+        return ok, (time.monotonic() - started) * 1000, upstream
+
+    def _canary_addresses(self) -> Set[str]:
+        """Адреса canary-сервера в виде $upstream_addr nginx (ip:port)"""
+        host, _, port = self.config.canary_server.rpartition(':')
+        addresses = {self.config.canary_server}
+        try:
+            for info in socket.getaddrinfo(host, int(port), type=socket.SOCK_STREAM):
+                addresses.add(f"{info[4][0]}:{info[4][1]}")
+        except (socket.gaierror, ValueError) as e:
+            logger.warning(f"Cannot resolve canary server {self.config.canary_server}: {e}")
+        return addresses
+
+    def _wait_ready(self) -> bool:
+        """Ожидание готовности canary до подачи на него трафика"""
+        deadline = time.monotonic() + self.config.step_duration
+
+        while time.monotonic() < deadline:
+            ok, _, _ = self._request(self.config.ready_url)
+            if ok:
+                return True
+            time.sleep(2)
+
+        return False
+
+    def _probe_step(self) -> Tuple[ProbeStats, ProbeStats]:
+        """
+        Пробы через upstream, равномерно распределённые по длительности
+        шага, с разбивкой по серверу: (canary, stable).
+        """
+        canary, stable = ProbeStats(), ProbeStats()
+        addresses = self._canary_addresses()
+        interval = self.config.step_duration / max(1, self.config.probes_per_step)
+
+        for attempt in range(self.config.probes_per_step * MAX_STEP_EXTENSION):
+            if attempt >= self.config.probes_per_step and canary.total >= self.config.min_probes:
+                break
+            ok, latency_ms, upstream = self._request(self.config.probe_url)
+            stats = stable if upstream is not None and upstream not in addresses else canary
+            stats.total += 1
+            stats.latencies_ms.append(latency_ms)
+            if not ok:
+                stats.errors += 1
+            time.sleep(interval)
+
+        return canary, stable
+
+    def _evaluate(self, stats: ProbeStats) -> Optional[str]:
+        """Проверка порогов по пробам canary, возвращает причину отказа"""
+        if stats.total < self.config.min_probes:
+            return f"only {stats.total} probe(s) reached canary, need {self.config.min_probes}"
+
+        if stats.error_rate > self.config.max_error_rate:
+            return f"error rate {stats.error_rate:.2%} > {self.config.max_error_rate:.2%}"
+
+        if stats.p95_latency_ms > self.config.max_latency_ms:
+            return f"p95 latency {stats.p95_latency_ms:.0f}ms > {self.config.max_latency_ms}ms"
+
+        return None
+
+    def _abort(self, result: CanaryResult) -> CanaryResult:
+        """Возврат всего трафика на стабильную версию"""
+        logger.warning(f"Aborting canary at stage '{result.stage}': {result.error}")
+
+        self._clear_weights()
+        try:
+            self._reload()
+            self.docker_proxy.remove(self.config.service)
+        except DockerProxyError as e:
+            logger.error(f"Canary cleanup failed: {e}")
+
+        return result
+
+    def _promote(self, result: CanaryResult) -> CanaryResult:
+        """
+        Продвижение новой версии в стабильный сервис.
+
+        Canary остаётся в upstream на время пересоздания стабильного
+        контейнера, поэтому nginx переводит запросы на него.
+        """
+        logger.info("Promoting canary to stable")
+        result.stage = 'promote'
+
+        build_result = self.docker_proxy.build(
+            self.stable_service, no_cache=False, wait_for_capacity=False
+        )
+        if not build_result['success']:
+            result.error = f"Stable build failed: {build_result['stderr']}"
+            return self._abort(result)
+
+        up_result = self.docker_proxy.up(self.stable_service, detach=True)
+        if not up_result['success']:
+            result.error = f"Stable up failed: {up_result['stderr']}"
+            return self._abort(result)
+
+        self._clear_weights()
+        self._reload()
+        self.docker_proxy.remove(self.config.service)
+
+        result.success = True
+        result.stage = 'complete'
+        return result
+
+    def run(
+        self,
+        no_cache: bool = True,
+        before_up: Optional[Callable[[], Dict[str, Any]]] = None,
+        wait_for_capacity: bool = True
+    ) -> CanaryResult:
+        """
+        Полный цикл canary: build -> [before_up] -> up -> шаги трафика -> promote
+
+        before_up (миграции БД) выполняется на собранном образе canary
+        до его запуска; стабильная версия при этом продолжает работать.
+        wait_for_capacity=False - нагрузку на хост уже проверил агент.
+        """
+        self._validate_steps()
+        result = CanaryResult(success=False, stage='build')
+
+        logger.info(f"Starting canary deployment, steps: {self.config.steps}")
+
+        build_result = self.docker_proxy.build(
+            self.config.service, no_cache=no_cache, wait_for_capacity=wait_for_capacity
+        )
+        if not build_result['success']:
+            result.error = build_result['stderr']
+            return self._abort(result)
+
+        if before_up is not None:
+            prepared = before_up()
+            if not prepared['success']:
+                result.stage = prepared.get('stage', 'before_up')
+                result.error = prepared.get('error', '')
+                return self._abort(result)
+
+        result.stage = 'up'
+        up_result = self.docker_proxy.up(self.config.service, detach=True)
+        if not up_result['success']:
+            result.error = up_result['stderr']
+            return self._abort(result)
+
+        result.stage = 'ready'
+        if not self._wait_ready():
+            result.error = 'Canary did not become ready'
+            return self._abort(result)
+
+        result.stage = 'step'
+        for share in self.config.steps:
+            result.share = share
+            self._write_weights(share)
+            if not self._reload():
+                result.error = 'Reverse proxy reload failed'
+                return self._abort(result)
+
+            stats, stable = self._probe_step()
+            result.steps.append({'share': share, **stats.to_dict(), 'stable': stable.to_dict()})
+            logger.info(f"Canary step {share}%: {stats.to_dict()}, stable: {stable.to_dict()}")
+
+            reason = self._evaluate(stats)
+            if reason:
+                result.error = f"Canary rejected at {share}%: {reason}"
+                return self._abort(result)
+
+        return self._promote(result)
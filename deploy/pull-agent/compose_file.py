@@ -0,0 +1,134 @@
+"""
+Кэш разобранного docker-compose.yml для Docker прокси
+
+Файл разбирается один раз и переиспользуется, пока не изменились
+его mtime/размер или текущий коммит рабочей копии. Граф depends_on
+сервисов даёт порядок запуска (уровни топологической сортировки).
+"""
+import os
+import threading
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from lazy_imports import yaml
+
+logger = logging.getLogger('compose-file')
+
+
+def git_head(repo_dir: Path) -> Optional[str]:
+    """Текущий коммит рабочей копии без запуска git (чтение .git/HEAD)"""
+    git_dir = repo_dir / '.git'
+    try:
+        # В git worktree .git - файл со ссылкой на каталог рабочей копии,
+        # ссылки (refs) лежат в общем каталоге репозитория
+        common_dir = git_dir
+        if git_dir.is_file():
+            git_dir = repo_dir / git_dir.read_text().strip()[len('gitdir: '):]
+            common_file = git_dir / 'commondir'
+            common_dir = git_dir / common_file.read_text().strip() if common_file.exists() else git_dir
+
+        head = (git_dir / 'HEAD').read_text().strip()
+        if not head.startswith('ref: '):
+            return head
+
+        ref = head[5:]
+        ref_file = common_dir / ref
+        if ref_file.exists():
+            return ref_file.read_text().strip()
+
+        packed = common_dir / 'packed-refs'
+        if packed.exists():
+            for line in packed.read_text().splitlines():
+                if line.endswith(f' {ref}'):
+                    return line.split(' ', 1)[0]
+    except OSError:
+        pass
+    return None
+
+
+@dataclass
+class ComposeFile:
+    """Разобранный compose-файл"""
+    path: Path
+    data: Dict[str, Any] = field(default_factory=dict)
+    commit: Optional[str] = None
+
+    @property
+    def services(self) -> Dict[str, Dict[str, Any]]:
+        return self.data.get('services') or {}
+
+    @property
+    def service_names(self) -> List[str]:
+        return list(self.services)
+
+    def service(self, name: str) -> Optional[Dict[str, Any]]:
+        return self.services.get(name)
+
+    def dependencies(self, name: str) -> List[str]:
+        """Сервисы из depends_on (список или словарь с condition)"""
+        depends_on = (self.service(name) or {}).get('depends_on') or []
+        return list(depends_on)
+
+    def build_context(self, name: str) -> Optional[str]:
+        """Каталог сборки сервиса относительно compose-файла (None - только image)"""
+        build = (self.service(name) or {}).get('build')
+        if build is None:
+            return None
+        context = build if isinstance(build, str) else build.get('context', '.')
+        return os.path.normpath(context)
+
+    def start_order(self, names: List[str]) -> List[List[str]]:
+        """
+        Уровни запуска сервисов names по depends_on.
+        
+        Сервис попадает в уровень после всех своих зависимостей из names
+        (зависимости вне names уже работают); сервисы одного уровня друг
+        от друга не зависят. Цикл в depends_on - ValueError.
+        """
+        selected = set(names)
+        pending = {name: set(self.dependencies(name)) & selected for name in names}
+        levels = []
+        while pending:
+            ready = sorted(name for name, deps in pending.items() if not deps)
+            if not ready:
+                raise ValueError(f"depends_on cycle between services: {', '.join(sorted(pending))}")
+            levels.append(ready)
+            for name in ready:
+                del pending[name]
+            for deps in pending.values():
+                deps.difference_update(ready)
+        return levels
+
+
+class ComposeFileCache:
+    """Потокобезопасный кэш compose-файла с инвалидацией по mtime и коммиту"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._key: Optional[Tuple[int, int, Optional[str]]] = None
+        self._compose: Optional[ComposeFile] = None
+        self._lock = threading.Lock()
+
+    def _current_key(self) -> Tuple[int, int, Optional[str]]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size, git_head(self.path.parent)
+
+    def get(self) -> ComposeFile:
+        """Актуальный разобранный compose-файл"""
+        with self._lock:
+            key = self._current_key()
+            if self._compose is None or key != self._key:
+                with open(self.path, 'r') as f:
+                    data = yaml.safe_load(f) or {}
+                self._compose = ComposeFile(path=self.path, data=data, commit=key[2])
+                self._key = key
+                logger.info(f"Parsed compose file {self.path} ({len(self._compose.services)} services)")
+            return self._compose
+
+    def invalidate(self):
+        """Сброс кэша (например, после смены коммита)"""
+        with self._lock:
+            self._compose = None
+            self._key = None
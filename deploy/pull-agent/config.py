@@ -1,9 +1,25 @@
 """
 Конфигурация Pull-агента для GitOps
+
+Значения берутся из YAML-файла (AGENT_CONFIG_FILE, по умолчанию
+/app/config/agent.yml; секции и поля как у AgentConfig) и переменных
+окружения: непустая переменная перекрывает значение из файла, пустая
+считается незаданной (docker-compose передаёт ${VAR:-} пустой строкой,
+значения по умолчанию - в from_env). Файл проверяется по схеме (типы
+полей dataclass, допустимые значения), при ошибке - ConfigError со
+списком всех проблем.
 """
 import os
-from dataclasses import dataclass
-from typing import Optional
+import dataclasses
+from dataclasses import dataclass, field
+from typing import Any, Optional, List, Dict, Union, get_args, get_origin, get_type_hints
+
+from lazy_imports import yaml
+
+
+def _getenv(name: str, default: Optional[str] = None) -> Optional[str]:
+    """Переменная окружения; пустое значение - как незаданная"""
+    return os.environ.get(name) or default
 
 
 @dataclass
@@ -13,14 +29,18 @@ class GitConfig:
     branch: str
     token: Optional[str]
     local_path: str
+    worktrees: bool = True
+    worktree_keep: int = 5
     
     @classmethod
     def from_env(cls) -> 'GitConfig':
         return cls(
-            repo_url=os.getenv('GIT_REPO_URL', 'https://github.com/sileade/scoliologic-app.git'),
-            branch=os.getenv('GIT_BRANCH', 'main'),
-            token=os.getenv('GIT_TOKEN'),
-            local_path=os.getenv('GIT_LOCAL_PATH', '/app/repo')
+            repo_url=_getenv('GIT_REPO_URL', 'https://github.com/sileade/scoliologic-app.git'),
+            branch=_getenv('GIT_BRANCH', 'main'),
+            token=_getenv('GIT_TOKEN'),
+            local_path=_getenv('GIT_LOCAL_PATH', '/app/repo'),
+            worktrees=_getenv('GIT_WORKTREES', 'true').lower() == 'true',
+            worktree_keep=int(_getenv('GIT_WORKTREE_KEEP', '5'))
         )
     
     @property
@@ -41,9 +61,9 @@ class DockerConfig:
     @classmethod
     def from_env(cls) -> 'DockerConfig':
         return cls(
-            compose_file=os.getenv('DOCKER_COMPOSE_FILE', '/app/repo/docker-compose.yml'),
-            app_container=os.getenv('APP_CONTAINER_NAME', 'scoliologic-app'),
-            network=os.getenv('DOCKER_NETWORK', 'scoliologic-network')
+            compose_file=_getenv('DOCKER_COMPOSE_FILE', '/app/repo/docker-compose.yml'),
+            app_container=_getenv('APP_CONTAINER_NAME', 'scoliologic-app'),
+            network=_getenv('DOCKER_NETWORK', 'scoliologic-network')
         )
 
 
@@ -56,16 +76,369 @@ class DeployConfig:
     health_check_timeout: int
     health_check_retries: int
     deploy_timeout: int
+    strategy: str = 'recreate'
+    failure_backoff_base: int = 900
+    failure_backoff_max: int = 86400
+    # Сервисы, которые агент пересобирает при изменениях (app - всегда)
+    services: List[str] = field(default_factory=lambda: ['app'])
+    parallel_builds: int = 2
     
     @classmethod
     def from_env(cls) -> 'DeployConfig':
         return cls(
-            auto_deploy=os.getenv('AUTO_DEPLOY', 'true').lower() == 'true',
-            rollback_on_failure=os.getenv('ROLLBACK_ON_FAILURE', 'true').lower() == 'true',
-            health_check_url=os.getenv('HEALTH_CHECK_URL', 'http://app:3000/api/health'),
-            health_check_timeout=int(os.getenv('HEALTH_CHECK_TIMEOUT', '30')),
-            health_check_retries=int(os.getenv('HEALTH_CHECK_RETRIES', '5')),
-            deploy_timeout=int(os.getenv('DEPLOY_TIMEOUT', '300'))
+            auto_deploy=_getenv('AUTO_DEPLOY', 'true').lower() == 'true',
+            rollback_on_failure=_getenv('ROLLBACK_ON_FAILURE', 'true').lower() == 'true',
+            health_check_url=_getenv('HEALTH_CHECK_URL', 'http://app:3000/api/health'),
+            health_check_timeout=int(_getenv('HEALTH_CHECK_TIMEOUT', '30')),
+            health_check_retries=int(_getenv('HEALTH_CHECK_RETRIES', '5')),
+            deploy_timeout=int(_getenv('DEPLOY_TIMEOUT', '300')),
+            strategy=_getenv('DEPLOY_STRATEGY', 'recreate').lower(),
+            failure_backoff_base=int(_getenv('FAILURE_BACKOFF_BASE', '900')),
+            failure_backoff_max=int(_getenv('FAILURE_BACKOFF_MAX', '86400')),
+            services=[s.strip() for s in _getenv('DEPLOY_SERVICES', 'app').split(',') if s.strip()],
+            parallel_builds=int(_getenv('DEPLOY_PARALLEL_BUILDS', '2'))
+        )
+    
+    @property
+    def is_canary(self) -> bool:
+        return self.strategy == 'canary'
+
+
+@dataclass
+class WarmupConfig:
+    """Конфигурация профиля холодного старта и прогрева"""
+    enabled: bool
+    urls: List[str]
+    rounds: int
+    concurrency: int
+    timeout: int
+    request_timeout: int
+    
+    @classmethod
+    def from_env(cls) -> 'WarmupConfig':
+        # Пути относительно HEALTH_CHECK_URL или полные URL через запятую
+        urls = _getenv('WARMUP_URLS', '/,/api/health')
+        return cls(
+            enabled=_getenv('WARMUP_ENABLED', 'true').lower() == 'true',
+            urls=[u.strip() for u in urls.split(',') if u.strip()],
+            rounds=int(_getenv('WARMUP_ROUNDS', '2')),
+            concurrency=int(_getenv('WARMUP_CONCURRENCY', '4')),
+            timeout=int(_getenv('WARMUP_TIMEOUT', '180')),
+            request_timeout=int(_getenv('WARMUP_REQUEST_TIMEOUT', '30'))
+        )
+
+
+@dataclass
+class ProbeConfig:
+    """Конфигурация параллельных проверок здоровья"""
+    services: List[str]
+    dependencies: List[str]
+    http_targets: Dict[str, str]
+    quorum: float
+    timeout: int
+    max_workers: int
+    
+    @classmethod
+    def from_env(cls) -> 'ProbeConfig':
+        # Формат: service=url,service=url; {name} - имя контейнера реплики
+        targets = _getenv('PROBE_HTTP_TARGETS', 'app=http://{name}:3000/api/health')
+        return cls(
+            services=[s.strip() for s in _getenv('PROBE_SERVICES', 'app').split(',') if s.strip()],
+            # Только в отчёт и лог: на исход проверки деплоя не влияют
+            dependencies=[s.strip() for s in _getenv('PROBE_DEPENDENCIES', 'postgres,redis,ollama').split(',') if s.strip()],
+            http_targets=dict(t.strip().split('=', 1) for t in targets.split(',') if '=' in t),
+            quorum=float(_getenv('PROBE_QUORUM', '1.0')),
+            timeout=int(_getenv('PROBE_TIMEOUT', '5')),
+            max_workers=int(_getenv('PROBE_MAX_WORKERS', '16'))
+        )
+
+
+@dataclass
+class CanaryConfig:
+    """Конфигурация canary-деплоя"""
+    service: str
+    stable_server: str
+    canary_server: str
+    upstream_dir: str
+    upstream_name: str
+    steps: List[int]
+    step_duration: int
+    probes_per_step: int
+    min_probes: int
+    probe_url: str
+    ready_url: str
+    probe_timeout: int
+    max_error_rate: float
+    max_latency_ms: int
+    
+    @classmethod
+    def from_env(cls) -> 'CanaryConfig':
+        steps = _getenv('CANARY_STEPS', '10,25,50')
+        return cls(
+            service=_getenv('CANARY_SERVICE', 'app-canary'),
+            stable_server=_getenv('CANARY_STABLE_SERVER', 'app:3000'),
+            canary_server=_getenv('CANARY_SERVER', 'app-canary:3000'),
+            upstream_dir=_getenv('CANARY_UPSTREAM_DIR', '/app/upstreams'),
+            upstream_name=_getenv('CANARY_UPSTREAM_NAME', 'scoliologic_app'),
+            steps=[int(s) for s in steps.split(',') if s.strip()],
+            step_duration=int(_getenv('CANARY_STEP_DURATION', '60')),
+            probes_per_step=int(_getenv('CANARY_PROBES_PER_STEP', '20')),
+            min_probes=int(_getenv('CANARY_MIN_PROBES', '3')),
+            # Пробы шагов идут через upstream nginx (ответ с X-Upstream),
+            # проба готовности - напрямую в canary
+            probe_url=_getenv('CANARY_PROBE_URL', 'http://nginx:8081/api/health'),
+            ready_url=_getenv('CANARY_READY_URL', 'http://app-canary:3000/api/health'),
+            probe_timeout=int(_getenv('CANARY_PROBE_TIMEOUT', '5')),
+            max_error_rate=float(_getenv('CANARY_MAX_ERROR_RATE', '0.05')),
+            max_latency_ms=int(_getenv('CANARY_MAX_LATENCY_MS', '1000'))
+        )
+
+
+@dataclass
+class RegistryConfig:
+    """Конфигурация registry готовых образов"""
+    enabled: bool
+    image: str
+    tag_template: str
+    fallback_build: bool
+    insecure: bool
+    username: Optional[str]
+    password: Optional[str]
+    
+    @classmethod
+    def from_env(cls) -> 'RegistryConfig':
+        return cls(
+            enabled=_getenv('DEPLOY_SOURCE', 'build').lower() == 'registry',
+            image=_getenv('APP_IMAGE', 'scoliologic-app'),
+            tag_template=_getenv('APP_IMAGE_TAG_TEMPLATE', '{sha}'),
+            fallback_build=_getenv('REGISTRY_FALLBACK_BUILD', 'true').lower() == 'true',
+            insecure=_getenv('REGISTRY_INSECURE', 'false').lower() == 'true',
+            username=_getenv('REGISTRY_USERNAME'),
+            password=_getenv('REGISTRY_PASSWORD')
+        )
+
+
+def parse_size(value: str) -> int:
+    """Размер вида '10GB', '512m', '1024' в байтах"""
+    units = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+    value = value.strip().lower().rstrip('ib').rstrip('b')
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+@dataclass
+class GCConfig:
+    """Конфигурация очистки образов и кэша сборки"""
+    enabled: bool
+    interval: int
+    keep_deploys: int
+    build_cache_budget: int
+    build_cache_max_age: str
+    
+    @classmethod
+    def from_env(cls) -> 'GCConfig':
+        return cls(
+            enabled=_getenv('GC_ENABLED', 'true').lower() == 'true',
+            interval=int(_getenv('GC_INTERVAL', '3600')),
+            keep_deploys=int(_getenv('GC_KEEP_DEPLOYS', '5')),
+            build_cache_budget=parse_size(_getenv('GC_BUILD_CACHE_BUDGET', '10GB')),
+            build_cache_max_age=_getenv('GC_BUILD_CACHE_MAX_AGE', '72h')
+        )
+
+
+@dataclass
+class BuildCacheConfig:
+    """Конфигурация общего для хостов кэша сборки"""
+    backend: str  # '' (выключен) | local | registry
+    directory: str
+    keep: int
+    timeout: int
+    
+    @property
+    def enabled(self) -> bool:
+        return bool(self.backend)
+    
+    @classmethod
+    def from_env(cls) -> 'BuildCacheConfig':
+        return cls(
+            backend=_getenv('BUILD_CACHE', '').lower(),
+            directory=_getenv('BUILD_CACHE_DIR', '/app/build-cache'),
+            keep=int(_getenv('BUILD_CACHE_KEEP', '5')),
+            timeout=int(_getenv('BUILD_CACHE_TIMEOUT', '900'))
+        )
+
+
+@dataclass
+class PolicyConfig:
+    """Конфигурация политики деплоя (окна, заморозки, лимит)"""
+    windows: str
+    freeze: str
+    max_per_hour: int
+    timezone: str
+    
+    @classmethod
+    def from_env(cls) -> 'PolicyConfig':
+        return cls(
+            windows=_getenv('DEPLOY_WINDOWS', ''),
+            freeze=_getenv('DEPLOY_FREEZE', ''),
+            max_per_hour=int(_getenv('DEPLOY_MAX_PER_HOUR', '0')),
+            timezone=_getenv('DEPLOY_TIMEZONE', 'Europe/Moscow')
+        )
+
+
+@dataclass
+class ValidationConfig:
+    """Конфигурация проверки коммита перед сборкой"""
+    enabled: bool
+    compose_config: bool
+    lint: bool
+    hadolint: str
+    strict_env: bool
+    timeout: int
+    
+    @classmethod
+    def from_env(cls) -> 'ValidationConfig':
+        return cls(
+            enabled=_getenv('PREDEPLOY_VALIDATION', 'true').lower() == 'true',
+            compose_config=_getenv('PREDEPLOY_COMPOSE_CONFIG', 'true').lower() == 'true',
+            lint=_getenv('PREDEPLOY_LINT', 'true').lower() == 'true',
+            hadolint=_getenv('PREDEPLOY_HADOLINT', 'hadolint'),
+            strict_env=_getenv('PREDEPLOY_STRICT_ENV', 'false').lower() == 'true',
+            timeout=int(_getenv('PREDEPLOY_TIMEOUT', '60'))
+        )
+
+
+@dataclass
+class LogConfig:
+    """Конфигурация логирования"""
+    format: str
+    level: str
+    file: Optional[str]
+    max_bytes: int
+    backup_count: int
+    idle_sample_interval: int
+    
+    @classmethod
+    def from_env(cls) -> 'LogConfig':
+        return cls(
+            format=_getenv('LOG_FORMAT', 'json').lower(),
+            level=_getenv('LOG_LEVEL', 'INFO'),
+            file=os.getenv('LOG_FILE', '/app/data/agent.log') or None,
+            max_bytes=parse_size(_getenv('LOG_MAX_BYTES', '10MB')),
+            backup_count=int(_getenv('LOG_BACKUP_COUNT', '5')),
+            idle_sample_interval=int(_getenv('LOG_IDLE_SAMPLE_INTERVAL', '3600'))
+        )
+
+
+@dataclass
+class MigrationConfig:
+    """Конфигурация этапа миграций БД"""
+    enabled: bool
+    paths: List[str]
+    command: List[str]
+    service: str
+    database_service: str
+    snapshot: bool
+    snapshot_dir: str
+    snapshot_jobs: int
+    snapshot_compression: int
+    snapshot_keep: int
+    timeout: int
+    
+    @classmethod
+    def from_env(cls) -> 'MigrationConfig':
+        return cls(
+            enabled=_getenv('DB_MIGRATIONS', 'true').lower() == 'true',
+            paths=[p.strip() for p in _getenv('MIGRATION_PATHS', 'drizzle/').split(',') if p.strip()],
+            command=_getenv('MIGRATION_COMMAND', 'pnpm exec drizzle-kit migrate').split(),
+            service=_getenv('MIGRATION_SERVICE', 'app'),
+            database_service=_getenv('MIGRATION_DATABASE_SERVICE', 'postgres'),
+            snapshot=_getenv('MIGRATION_SNAPSHOT', 'true').lower() == 'true',
+            snapshot_dir=_getenv('MIGRATION_SNAPSHOT_DIR', '/var/lib/postgresql/data/snapshots'),
+            snapshot_jobs=int(_getenv('MIGRATION_SNAPSHOT_JOBS', '4')),
+            snapshot_compression=int(_getenv('MIGRATION_SNAPSHOT_COMPRESSION', '1')),
+            snapshot_keep=int(_getenv('MIGRATION_SNAPSHOT_KEEP', '3')),
+            timeout=int(_getenv('MIGRATION_TIMEOUT', '600'))
+        )
+
+
+@dataclass
+class WatchdogConfig:
+    """Конфигурация эндпоинта статуса и watchdog"""
+    socket_path: Optional[str]
+    loop_timeout: int
+    stage_timeouts: Dict[str, int]
+    default_timeout: int
+    
+    @classmethod
+    def from_env(cls) -> 'WatchdogConfig':
+        # Формат: stage=секунды,stage=секунды (допустимое время без heartbeat)
+        timeouts = _getenv(
+            'WATCHDOG_STAGE_TIMEOUTS',
+            'check=120,detect=120,fetch=300,validate=900,deploy=1800,migrate=1500,health=900,rollback=2400,gc=1800'
+        )
+        return cls(
+            socket_path=os.getenv('STATUS_SOCKET', '/tmp/pull-agent.sock') or None,
+            loop_timeout=int(_getenv('WATCHDOG_LOOP_TIMEOUT', '30')),
+            stage_timeouts={
+                name.strip(): int(value)
+                for name, value in (t.split('=', 1) for t in timeouts.split(',') if '=' in t)
+            },
+            default_timeout=int(_getenv('WATCHDOG_STAGE_TIMEOUT', '600'))
+        )
+
+
+@dataclass
+class PollingConfig:
+    """Конфигурация адаптивного интервала проверок"""
+    adaptive: bool
+    min_interval: int
+    max_interval: int
+    jitter: float
+    lookback_days: int
+    
+    @classmethod
+    def from_env(cls) -> 'PollingConfig':
+        return cls(
+            adaptive=_getenv('POLL_ADAPTIVE', 'false').lower() == 'true',
+            min_interval=int(_getenv('POLL_MIN_INTERVAL', '60')),
+            max_interval=int(_getenv('POLL_MAX_INTERVAL', '1800')),
+            # Доля интервала: 0.1 - случайный сдвиг до ±10%
+            jitter=float(_getenv('POLL_JITTER', '0.1')),
+            lookback_days=int(_getenv('POLL_LOOKBACK_DAYS', '28'))
+        )
+
+
+@dataclass
+class FleetConfig:
+    """Конфигурация согласованного деплоя на несколько хостов"""
+    enabled: bool
+    db_path: str
+    host_id: str
+    waves: List[List[str]]
+    max_unavailable: int
+    lease_ttl: int
+    host_timeout: int
+    retry_interval: int
+    
+    @classmethod
+    def from_env(cls) -> 'FleetConfig':
+        import socket
+        # Формат: host-1; host-2,host-3; host-4 (волны через ';')
+        waves = _getenv('FLEET_WAVES', '')
+        return cls(
+            enabled=_getenv('FLEET_ENABLED', 'false').lower() == 'true',
+            db_path=_getenv('FLEET_DB', '/app/fleet/fleet.db'),
+            host_id=_getenv('FLEET_HOST_ID') or socket.gethostname(),
+            waves=[
+                [h.strip() for h in wave.split(',') if h.strip()]
+                for wave in waves.split(';') if wave.strip()
+            ],
+            max_unavailable=int(_getenv('FLEET_MAX_UNAVAILABLE', '1')),
+            lease_ttl=int(_getenv('FLEET_LEASE_TTL', '2400')),
+            host_timeout=int(_getenv('FLEET_HOST_TIMEOUT', '900')),
+            retry_interval=int(_getenv('FLEET_RETRY_INTERVAL', '30'))
         )
 
 
@@ -79,22 +452,36 @@ class NotificationConfig:
     email_smtp_port: int
     email_from: Optional[str]
     email_to: Optional[str]
+    # Бот Slack (chat.postMessage/chat.update) - webhook не умеет редактировать
+    slack_bot_token: Optional[str] = None
+    slack_channel: Optional[str] = None
+    # Одно сообщение на деплой, обновляемое по этапам (не чаще live_interval сек)
+    live_updates: bool = False
+    live_interval: float = 5.0
     
     @classmethod
     def from_env(cls) -> 'NotificationConfig':
         return cls(
-            slack_webhook=os.getenv('SLACK_WEBHOOK_URL'),
-            telegram_token=os.getenv('TELEGRAM_BOT_TOKEN'),
-            telegram_chat_id=os.getenv('TELEGRAM_CHAT_ID'),
-            email_smtp_host=os.getenv('EMAIL_SMTP_HOST'),
-            email_smtp_port=int(os.getenv('EMAIL_SMTP_PORT', '587')),
-            email_from=os.getenv('EMAIL_FROM'),
-            email_to=os.getenv('EMAIL_TO')
+            slack_webhook=_getenv('SLACK_WEBHOOK_URL'),
+            telegram_token=_getenv('TELEGRAM_BOT_TOKEN'),
+            telegram_chat_id=_getenv('TELEGRAM_CHAT_ID'),
+            email_smtp_host=_getenv('EMAIL_SMTP_HOST'),
+            email_smtp_port=int(_getenv('EMAIL_SMTP_PORT', '587')),
+            email_from=_getenv('EMAIL_FROM'),
+            email_to=_getenv('EMAIL_TO'),
+            slack_bot_token=_getenv('SLACK_BOT_TOKEN') or None,
+            slack_channel=_getenv('SLACK_CHANNEL') or None,
+            live_updates=_getenv('NOTIFY_LIVE', 'false').lower() == 'true',
+            live_interval=float(_getenv('NOTIFY_LIVE_INTERVAL', '5'))
         )
     
+    @property
+    def has_slack_bot(self) -> bool:
+        return bool(self.slack_bot_token and self.slack_channel)
+    
     @property
     def has_slack(self) -> bool:
-        return bool(self.slack_webhook)
+        return bool(self.slack_webhook) or self.has_slack_bot
     
     @property
     def has_telegram(self) -> bool:
@@ -111,7 +498,20 @@ class AgentConfig:
     git: GitConfig
     docker: DockerConfig
     deploy: DeployConfig
+    warmup: WarmupConfig
     notification: NotificationConfig
+    probe: ProbeConfig
+    canary: CanaryConfig
+    registry: RegistryConfig
+    gc: GCConfig
+    build_cache: BuildCacheConfig
+    validation: ValidationConfig
+    policy: PolicyConfig
+    log: LogConfig
+    migration: MigrationConfig
+    watchdog: WatchdogConfig
+    polling: PollingConfig
+    fleet: FleetConfig
     check_interval: int
     data_dir: str
     
@@ -121,11 +521,259 @@ class AgentConfig:
             git=GitConfig.from_env(),
             docker=DockerConfig.from_env(),
             deploy=DeployConfig.from_env(),
+            warmup=WarmupConfig.from_env(),
             notification=NotificationConfig.from_env(),
-            check_interval=int(os.getenv('CHECK_INTERVAL', '300')),
-            data_dir=os.getenv('DATA_DIR', '/app/data')
+            probe=ProbeConfig.from_env(),
+            canary=CanaryConfig.from_env(),
+            registry=RegistryConfig.from_env(),
+            gc=GCConfig.from_env(),
+            build_cache=BuildCacheConfig.from_env(),
+            validation=ValidationConfig.from_env(),
+            policy=PolicyConfig.from_env(),
+            log=LogConfig.from_env(),
+            migration=MigrationConfig.from_env(),
+            watchdog=WatchdogConfig.from_env(),
+            polling=PollingConfig.from_env(),
+            fleet=FleetConfig.from_env(),
+            check_interval=int(_getenv('CHECK_INTERVAL', '300')),
+            data_dir=_getenv('DATA_DIR', '/app/data')
         )
 
 
-# Глобальный экземпляр конфигурации
-config = AgentConfig.from_env()
+CONFIG_FILE_ENV = 'AGENT_CONFIG_FILE'
+DEFAULT_CONFIG_FILE = '/app/config/agent.yml'
+
+# Переменная окружения для каждого поля файла (перекрывает значение из файла)
+ENV_NAMES: Dict[str, Dict[str, str]] = {
+    'git': {
+        'repo_url': 'GIT_REPO_URL', 'branch': 'GIT_BRANCH', 'token': 'GIT_TOKEN',
+        'local_path': 'GIT_LOCAL_PATH', 'worktrees': 'GIT_WORKTREES', 'worktree_keep': 'GIT_WORKTREE_KEEP'
+    },
+    'docker': {
+        'compose_file': 'DOCKER_COMPOSE_FILE', 'app_container': 'APP_CONTAINER_NAME', 'network': 'DOCKER_NETWORK'
+    },
+    'deploy': {
+        'auto_deploy': 'AUTO_DEPLOY', 'rollback_on_failure': 'ROLLBACK_ON_FAILURE',
+        'health_check_url': 'HEALTH_CHECK_URL', 'health_check_timeout': 'HEALTH_CHECK_TIMEOUT',
+        'health_check_retries': 'HEALTH_CHECK_RETRIES', 'deploy_timeout': 'DEPLOY_TIMEOUT',
+        'strategy': 'DEPLOY_STRATEGY', 'failure_backoff_base': 'FAILURE_BACKOFF_BASE',
+        'failure_backoff_max': 'FAILURE_BACKOFF_MAX', 'services': 'DEPLOY_SERVICES',
+        'parallel_builds': 'DEPLOY_PARALLEL_BUILDS'
+    },
+    'warmup': {
+        'enabled': 'WARMUP_ENABLED', 'urls': 'WARMUP_URLS', 'rounds': 'WARMUP_ROUNDS',
+        'concurrency': 'WARMUP_CONCURRENCY', 'timeout': 'WARMUP_TIMEOUT', 'request_timeout': 'WARMUP_REQUEST_TIMEOUT'
+    },
+    'notification': {
+        'slack_webhook': 'SLACK_WEBHOOK_URL', 'telegram_token': 'TELEGRAM_BOT_TOKEN',
+        'telegram_chat_id': 'TELEGRAM_CHAT_ID', 'email_smtp_host': 'EMAIL_SMTP_HOST',
+        'email_smtp_port': 'EMAIL_SMTP_PORT', 'email_from': 'EMAIL_FROM', 'email_to': 'EMAIL_TO',
+        'slack_bot_token': 'SLACK_BOT_TOKEN', 'slack_channel': 'SLACK_CHANNEL',
+        'live_updates': 'NOTIFY_LIVE', 'live_interval': 'NOTIFY_LIVE_INTERVAL'
+    },
+    'probe': {
+        'services': 'PROBE_SERVICES', 'dependencies': 'PROBE_DEPENDENCIES', 'http_targets': 'PROBE_HTTP_TARGETS',
+        'quorum': 'PROBE_QUORUM', 'timeout': 'PROBE_TIMEOUT', 'max_workers': 'PROBE_MAX_WORKERS'
+    },
+    'canary': {
+        'service': 'CANARY_SERVICE', 'stable_server': 'CANARY_STABLE_SERVER', 'canary_server': 'CANARY_SERVER',
+        'upstream_dir': 'CANARY_UPSTREAM_DIR', 'upstream_name': 'CANARY_UPSTREAM_NAME', 'steps': 'CANARY_STEPS',
+        'step_duration': 'CANARY_STEP_DURATION', 'probes_per_step': 'CANARY_PROBES_PER_STEP',
+        'min_probes': 'CANARY_MIN_PROBES', 'probe_url': 'CANARY_PROBE_URL', 'ready_url': 'CANARY_READY_URL',
+        'probe_timeout': 'CANARY_PROBE_TIMEOUT',
+        'max_error_rate': 'CANARY_MAX_ERROR_RATE', 'max_latency_ms': 'CANARY_MAX_LATENCY_MS'
+    },
+    'registry': {
+        'enabled': 'DEPLOY_SOURCE', 'image': 'APP_IMAGE', 'tag_template': 'APP_IMAGE_TAG_TEMPLATE',
+        'fallback_build': 'REGISTRY_FALLBACK_BUILD', 'insecure': 'REGISTRY_INSECURE',
+        'username': 'REGISTRY_USERNAME', 'password': 'REGISTRY_PASSWORD'
+    },
+    'gc': {
+        'enabled': 'GC_ENABLED', 'interval': 'GC_INTERVAL', 'keep_deploys': 'GC_KEEP_DEPLOYS',
+        'build_cache_budget': 'GC_BUILD_CACHE_BUDGET', 'build_cache_max_age': 'GC_BUILD_CACHE_MAX_AGE'
+    },
+    'build_cache': {
+        'backend': 'BUILD_CACHE', 'directory': 'BUILD_CACHE_DIR', 'keep': 'BUILD_CACHE_KEEP',
+        'timeout': 'BUILD_CACHE_TIMEOUT'
+    },
+    'validation': {
+        'enabled': 'PREDEPLOY_VALIDATION', 'compose_config': 'PREDEPLOY_COMPOSE_CONFIG', 'lint': 'PREDEPLOY_LINT',
+        'hadolint': 'PREDEPLOY_HADOLINT', 'strict_env': 'PREDEPLOY_STRICT_ENV', 'timeout': 'PREDEPLOY_TIMEOUT'
+    },
+    'policy': {
+        'windows': 'DEPLOY_WINDOWS', 'freeze': 'DEPLOY_FREEZE', 'max_per_hour': 'DEPLOY_MAX_PER_HOUR',
+        'timezone': 'DEPLOY_TIMEZONE'
+    },
+    'log': {
+        'format': 'LOG_FORMAT', 'level': 'LOG_LEVEL', 'file': 'LOG_FILE', 'max_bytes': 'LOG_MAX_BYTES',
+        'backup_count': 'LOG_BACKUP_COUNT', 'idle_sample_interval': 'LOG_IDLE_SAMPLE_INTERVAL'
+    },
+    'migration': {
+        'enabled': 'DB_MIGRATIONS', 'paths': 'MIGRATION_PATHS', 'command': 'MIGRATION_COMMAND',
+        'service': 'MIGRATION_SERVICE', 'database_service': 'MIGRATION_DATABASE_SERVICE',
+        'snapshot': 'MIGRATION_SNAPSHOT', 'snapshot_dir': 'MIGRATION_SNAPSHOT_DIR',
+        'snapshot_jobs': 'MIGRATION_SNAPSHOT_JOBS', 'snapshot_compression': 'MIGRATION_SNAPSHOT_COMPRESSION',
+        'snapshot_keep': 'MIGRATION_SNAPSHOT_KEEP', 'timeout': 'MIGRATION_TIMEOUT'
+    },
+    'watchdog': {
+        'socket_path': 'STATUS_SOCKET', 'loop_timeout': 'WATCHDOG_LOOP_TIMEOUT',
+        'stage_timeouts': 'WATCHDOG_STAGE_TIMEOUTS', 'default_timeout': 'WATCHDOG_STAGE_TIMEOUT'
+    },
+    'polling': {
+        'adaptive': 'POLL_ADAPTIVE', 'min_interval': 'POLL_MIN_INTERVAL', 'max_interval': 'POLL_MAX_INTERVAL',
+        'jitter': 'POLL_JITTER', 'lookback_days': 'POLL_LOOKBACK_DAYS'
+    },
+    'fleet': {
+        'enabled': 'FLEET_ENABLED', 'db_path': 'FLEET_DB', 'host_id': 'FLEET_HOST_ID', 'waves': 'FLEET_WAVES',
+        'max_unavailable': 'FLEET_MAX_UNAVAILABLE', 'lease_ttl': 'FLEET_LEASE_TTL',
+        'host_timeout': 'FLEET_HOST_TIMEOUT', 'retry_interval': 'FLEET_RETRY_INTERVAL'
+    },
+    '': {'check_interval': 'CHECK_INTERVAL', 'data_dir': 'DATA_DIR'}
+}
+
+# Размеры допускаются строкой ('10GB')
+SIZE_FIELDS = {('gc', 'build_cache_budget'), ('log', 'max_bytes')}
+
+CHOICES = {
+    ('deploy', 'strategy'): ('recreate', 'canary'),
+    ('log', 'format'): ('json', 'text'),
+    ('build_cache', 'backend'): ('', 'local', 'registry'),
+    ('log', 'level'): ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+}
+
+
+class ConfigError(Exception):
+    """Ошибка файла конфигурации"""
+    pass
+
+
+def _env_is_set(name: str) -> bool:
+    """Переменная перекрывает значение файла, только если она не пустая"""
+    return bool(os.environ.get(name))
+
+
+def config_file_path() -> Optional[str]:
+    """Путь к файлу конфигурации (None - только переменные окружения)"""
+    return os.getenv(CONFIG_FILE_ENV, DEFAULT_CONFIG_FILE) or None
+
+
+def _coerce(value: Any, hint: Any, path: str) -> Any:
+    """Проверка значения по типу поля dataclass"""
+    origin = get_origin(hint)
+    if origin is Union:
+        if value is None:
+            return None
+        inner = [a for a in get_args(hint) if a is not type(None)]
+        return _coerce(value, inner[0], path)
+    if origin in (list, List):
+        if not isinstance(value, list):
+            raise ConfigError(f"{path}: expected a list")
+        return [_coerce(v, get_args(hint)[0], f"{path}[{i}]") for i, v in enumerate(value)]
+    if origin in (dict, Dict):
+        if not isinstance(value, dict):
+            raise ConfigError(f"{path}: expected a mapping")
+        key_type, value_type = get_args(hint)
+        return {
+            _coerce(k, key_type, path): _coerce(v, value_type, f"{path}.{k}")
+            for k, v in value.items()
+        }
+    if hint is bool:
+        if not isinstance(value, bool):
+            raise ConfigError(f"{path}: expected true/false, got {value!r}")
+        return value
+    if hint is int:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ConfigError(f"{path}: expected an integer, got {value!r}")
+        return value
+    if hint is float:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ConfigError(f"{path}: expected a number, got {value!r}")
+        return float(value)
+    if hint is str:
+        if not isinstance(value, str):
+            raise ConfigError(f"{path}: expected a string, got {value!r}")
+        return value
+    raise ConfigError(f"{path}: unsupported type {hint}")
+
+
+def _apply(target: Any, section: str, data: Dict[str, Any], errors: List[str]):
+    """Значения секции файла в dataclass (кроме полей, заданных непустой переменной окружения)"""
+    env_names = ENV_NAMES[section]
+    hints = get_type_hints(type(target))
+    for name, value in data.items():
+        path = f"{section}.{name}" if section else name
+        if name not in env_names:
+            errors.append(f"{path}: unknown option")
+            continue
+        if _env_is_set(env_names[name]):
+            continue
+        try:
+            if (section, name) in SIZE_FIELDS and isinstance(value, str):
+                value = parse_size(value)
+            value = _coerce(value, hints[name], path)
+            choices = CHOICES.get((section, name))
+            if choices and value not in choices:
+                raise ConfigError(f"{path}: must be one of {', '.join(choices)}")
+        except (ConfigError, ValueError) as e:
+            errors.append(str(e))
+            continue
+        setattr(target, name, value)
+
+
+def _check_consistency(config: AgentConfig) -> List[str]:
+    """Проверки, связывающие поля разных секций"""
+    errors = []
+    polling = config.polling
+    # Интенсивность считается по часам недели - нужна хотя бы неделя истории
+    if polling.adaptive and polling.lookback_days < 7:
+        errors.append(f"polling.lookback_days ({polling.lookback_days}) must be at least 7")
+    max_poll = polling.max_interval if polling.adaptive else config.check_interval * (1 + polling.jitter)
+    if config.fleet.enabled and config.fleet.host_timeout <= max_poll:
+        errors.append(
+            f"fleet.host_timeout ({config.fleet.host_timeout}s) must be greater than "
+            f"the maximum poll interval ({max_poll:.0f}s)"
+        )
+    return errors
+
+
+def load_config(path: Optional[str] = None) -> AgentConfig:
+    """
+    Конфигурация из файла и переменных окружения.
+    
+    Raises:
+        ConfigError: файл не читается или не проходит проверку схемы
+    """
+    config = AgentConfig.from_env()
+    path = path or config_file_path()
+    if not path or not os.path.exists(path):
+        errors = _check_consistency(config)
+        if errors:
+            raise ConfigError("Invalid config: " + '; '.join(errors))
+        return config
+    
+    try:
+        with open(path, 'r') as f:
+            data = yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        raise ConfigError(f"Cannot read {path}: {e}")
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path}: top level must be a mapping")
+    
+    errors: List[str] = []
+    top_level = {k: v for k, v in data.items() if k in ENV_NAMES['']}
+    _apply(config, '', top_level, errors)
+    for section, values in data.items():
+        if section in top_level:
+            continue
+        if section not in ENV_NAMES or not section:
+            errors.append(f"{section}: unknown section")
+        elif not isinstance(values, dict):
+            errors.append(f"{section}: expected a mapping")
+        else:
+            _apply(getattr(config, section), section, values, errors)
+    
+    if not errors:
+        errors = _check_consistency(config)
+    if errors:
+        raise ConfigError(f"Invalid config {path}: " + '; '.join(errors))
+    return config
@@ -0,0 +1,127 @@
+"""
+Отслеживание изменений файла конфигурации Pull-агента
+
+inotify (через libc, без внешних зависимостей) на каталог файла:
+событие приходит и при записи на месте, и при атомарной замене
+(rename, обновление ConfigMap/симлинка). Без inotify - опрос mtime.
+
+Поток наблюдателя только выставляет флаг; новая конфигурация
+применяется основным циклом между деплоями (changed()).
+"""
+import os
+import select
+import struct
+import logging
+import threading
+from typing import Optional, Tuple
+
+logger = logging.getLogger('config-watch')
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# struct inotify_event: wd, mask, cookie, len, name[len]
+_EVENT = struct.Struct('iIII')
+
+
+def _inotify_init(directory: str) -> Optional[int]:
+    """Дескриптор inotify с наблюдением за каталогом (None - недоступно)"""
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        if libc.inotify_add_watch(fd, directory.encode(), WATCH_MASK) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+class ConfigWatcher:
+    """Флаг изменения файла конфигурации (inotify или опрос mtime)"""
+
+    def __init__(self, path: str, poll_interval: float = 5.0):
+        self.path = os.path.abspath(path)
+        self.poll_interval = poll_interval
+        self._changed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._fd: Optional[int] = None
+
+    def _stat(self) -> Optional[Tuple[float, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size, st.st_ino
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        self._fd = _inotify_init(directory) if os.path.isdir(directory) else None
+        if self._fd is not None:
+            target, mode = self._watch_inotify, 'inotify'
+        else:
+            target, mode = self._watch_poll, f"polling every {self.poll_interval:g}s"
+        self._thread = threading.Thread(target=target, name='config-watch', daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.path} ({mode})")
+
+    def _watch_inotify(self):
+        name = os.path.basename(self.path).encode()
+        while not self._stopped.is_set():
+            ready, _, _ = select.select([self._fd], [], [], 1.0)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                logger.error(f"inotify read failed, switching to polling: {e}")
+                break
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                _, _, _, length = _EVENT.unpack_from(data, offset)
+                event_name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+                offset += _EVENT.size + length
+                # Kubernetes ConfigMap меняет каталог ..data, а не сам файл
+                if event_name == name or event_name == b'..data':
+                    self._changed.set()
+        else:
+            return
+        self._watch_poll()
+
+    def _watch_poll(self):
+        last = self._stat()
+        while not self._stopped.wait(self.poll_interval):
+            current = self._stat()
+            if current != last:
+                last = current
+                self._changed.set()
+
+    def changed(self) -> bool:
+        """Был ли файл изменён с прошлого вызова"""
+        if self._changed.is_set():
+            self._changed.clear()
+            return True
+        return False
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,217 @@
+"""
+Политика деплоя для Pull-агента: окна, заморозки, лимит частоты
+
+Проверяется до fetch/сборки нового коммита:
+
+- окна деплоя (DEPLOY_WINDOWS): `Mon-Fri 20:00-07:00; Sat,Sun 00:00-24:00`,
+  окно через полночь допускается, без дней - ежедневно
+- периоды заморозки (DEPLOY_FREEZE): `2026-12-30 00:00/2027-01-08 00:00; ...`
+- лимит деплоев в час (DEPLOY_MAX_PER_HOUR) по истории деплоев
+
+Коммит, пришедший вне окна, ставится в очередь: агент запускает проверку
+в момент открытия окна и разворачивает последний коммит ветки.
+"""
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta, tzinfo
+from pathlib import Path
+from typing import List, Optional, Set
+
+from config import PolicyConfig
+
+logger = logging.getLogger('deploy-policy')
+
+DAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+
+def _parse_day(name: str) -> int:
+    key = name.strip().lower()
+    if len(key) < 3 or key[:3] not in DAYS:
+        raise ValueError(f"Unknown day: {name.strip()!r}")
+    return DAYS.index(key[:3])
+
+
+def _parse_days(spec: str) -> Set[int]:
+    """Дни вида 'Mon-Fri,Sun' (пробелы вокруг ',' и '-' допускаются)"""
+    days: Set[int] = set()
+    for part in spec.split(','):
+        if '-' in part:
+            first, last = (_parse_day(d) for d in part.split('-', 1))
+            days.update((first + i) % 7 for i in range((last - first) % 7 + 1))
+        else:
+            days.add(_parse_day(part))
+    return days
+
+
+def _parse_minutes(value: str) -> int:
+    hours, minutes = value.split(':')
+    result = int(hours) * 60 + int(minutes)
+    if not 0 <= result <= 24 * 60:
+        raise ValueError(f"Invalid time: {value}")
+    return result
+
+
+@dataclass
+class DeployWindow:
+    """Окно деплоя: дни недели и интервал времени (минуты от полуночи)"""
+    days: Set[int]
+    start: int
+    end: int
+
+    @classmethod
+    def parse(cls, spec: str) -> 'DeployWindow':
+        """'Mon-Fri 20:00-07:00', 'Sat, Sun 00:00-24:00' или '09:00-18:00' (ежедневно)"""
+        if not spec.strip():
+            raise ValueError("Empty deploy window")
+        *day_parts, hours = spec.split()
+        try:
+            # Время - последнее слово, всё до него - список дней
+            days = _parse_days(' '.join(day_parts)) if day_parts else set(range(7))
+            start, end = hours.split('-')
+            return cls(days=days, start=_parse_minutes(start), end=_parse_minutes(end))
+        except ValueError as e:
+            raise ValueError(f"Invalid deploy window {spec!r}: {e}") from e
+
+    def contains(self, moment: datetime) -> bool:
+        minute = moment.hour * 60 + moment.minute
+        day = moment.weekday()
+        if self.start == self.end:
+            return day in self.days
+        if self.start < self.end:
+            return day in self.days and self.start <= minute < self.end
+        # Окно через полночь: начинается в день из списка, заканчивается на следующий
+        return (day in self.days and minute >= self.start) or ((day - 1) % 7 in self.days and minute < self.end)
+
+    def starts_after(self, moment: datetime, days: int = 8) -> List[datetime]:
+        """Моменты открытия окна в ближайшие days дней"""
+        midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        starts = []
+        for offset in range(days):
+            day = midnight + timedelta(days=offset)
+            if day.weekday() in self.days:
+                start = day + timedelta(minutes=self.start)
+                if start > moment:
+                    starts.append(start)
+        return starts
+
+
+@dataclass
+class FreezePeriod:
+    """Период заморозки деплоев"""
+    start: datetime
+    end: datetime
+
+    @classmethod
+    def parse(cls, spec: str, tz: Optional[tzinfo]) -> 'FreezePeriod':
+        try:
+            start, end = (datetime.fromisoformat(p.strip()).replace(tzinfo=tz) for p in spec.split('/'))
+        except ValueError as e:
+            raise ValueError(f"Invalid freeze period {spec!r}: {e}") from e
+        if end <= start:
+            raise ValueError(f"Invalid freeze period {spec!r}: end is not after start")
+        return cls(start=start, end=end)
+
+    def contains(self, moment: datetime) -> bool:
+        return self.start <= moment < self.end
+
+
+@dataclass
+class PolicyDecision:
+    """Решение политики: можно ли деплоить сейчас"""
+    allowed: bool
+    reason: str = ''
+    next_attempt: Optional[datetime] = None
+
+
+class DeployPolicy:
+    """Проверка окон, заморозок и лимита деплоев"""
+
+    def __init__(self, config: PolicyConfig, history_file: Path):
+        self.config = config
+        self.history_file = history_file
+        self.tz = self._load_timezone(config.timezone)
+        self.windows = [DeployWindow.parse(w.strip()) for w in config.windows.split(';') if w.strip()]
+        self.freezes = [FreezePeriod.parse(f, self.tz) for f in config.freeze.split(';') if f.strip()]
+
+    @staticmethod
+    def _load_timezone(name: str) -> Optional[tzinfo]:
+        if not name:
+            return None
+        try:
+            from zoneinfo import ZoneInfo
+            return ZoneInfo(name)
+        except Exception as e:
+            logger.warning(f"Unknown timezone {name}, using local time: {e}")
+            return None
+
+    def now(self) -> datetime:
+        return datetime.now(self.tz)
+
+    def _in_window(self, moment: datetime) -> bool:
+        return not self.windows or any(w.contains(moment) for w in self.windows)
+
+    def _freeze_at(self, moment: datetime) -> Optional[FreezePeriod]:
+        return next((f for f in self.freezes if f.contains(moment)), None)
+
+    def next_open(self, after: datetime) -> Optional[datetime]:
+        """Ближайший момент, когда деплой разрешён окнами и заморозками"""
+        candidates = {after}
+        for window in self.windows:
+            candidates.update(window.starts_after(after))
+        candidates.update(f.end for f in self.freezes if f.end > after)
+
+        for moment in sorted(candidates):
+            if self._in_window(moment) and not self._freeze_at(moment):
+                return moment
+        return None
+
+    def _recent_deploys(self) -> List[datetime]:
+        """Время деплоев (успешных и неудачных) за последний час"""
+        try:
+            with open(self.history_file, 'r') as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return []
+
+        # История пишется в локальном времени хоста
+        hour_ago = datetime.now() - timedelta(hours=1)
+        times = []
+        for entry in history:
+            if entry.get('status') not in ('success', 'failed'):
+                continue
+            moment = datetime.fromisoformat(entry['timestamp'])
+            if moment > hour_ago:
+                times.append(moment)
+        return sorted(times)
+
+    def evaluate(self) -> PolicyDecision:
+        """Решение для деплоя в текущий момент"""
+        now = self.now()
+
+        freeze = self._freeze_at(now)
+        if freeze:
+            return PolicyDecision(
+                allowed=False,
+                reason=f"deploy freeze until {freeze.end.isoformat(timespec='minutes')}",
+                next_attempt=self.next_open(freeze.end)
+            )
+
+        if not self._in_window(now):
+            return PolicyDecision(
+                allowed=False,
+                reason='outside deploy window',
+                next_attempt=self.next_open(now)
+            )
+
+        if self.config.max_per_hour > 0:
+            recent = self._recent_deploys()
+            if len(recent) >= self.config.max_per_hour:
+                available = recent[-self.config.max_per_hour] + timedelta(hours=1)
+                return PolicyDecision(
+                    allowed=False,
+                    reason=f"deploy budget exhausted ({len(recent)}/{self.config.max_per_hour} per hour)",
+                    next_attempt=self.next_open(now + (available - datetime.now()))
+                )
+
+        return PolicyDecision(allowed=True)
@@ -12,14 +12,25 @@
 - Защита от случайного удаления критических контейнеров
 """
 import os
+import gzip
 import json
 import logging
-from typing import Optional, List, Dict, Any
-from dataclasses import dataclass
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Callable, Set
+from dataclasses import dataclass, field
 from enum import Enum
 import subprocess
+import shlex
 import re
 
+from resources import BuildLimits, LoadGateConfig, HostLoadGate
+from compose_file import ComposeFileCache
+from engine_backend import EngineBackend
+from status_cache import ContainerStateCache
+from lazy_imports import yaml
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('docker-proxy')
 
@@ -27,12 +38,24 @@ logger = logging.getLogger('docker-proxy')
 class DockerOperation(Enum):
     """Разрешённые операции Docker"""
     BUILD = 'build'
+    PULL = 'pull'
     UP = 'up'
     DOWN = 'down'
+    REMOVE = 'remove'
     RESTART = 'restart'
     LOGS = 'logs'
     PS = 'ps'
     HEALTH = 'health'
+    RELOAD = 'reload'
+    RUN = 'run'
+    SNAPSHOT = 'snapshot'
+    RESTORE = 'restore'
+    PUSH = 'push'
+    EXPORT = 'export'
+    IMPORT = 'import'
+    IMAGES = 'images'
+    REMOVE_IMAGE = 'remove_image'
+    PRUNE = 'prune'
 
 
 @dataclass
@@ -44,6 +67,15 @@ class ProxyConfig:
     protected_services: List[str]
     max_log_lines: int = 1000
     operation_timeout: int = 600
+    reverse_proxy_service: Optional[str] = None
+    database_service: Optional[str] = None
+    build_limits: BuildLimits = field(default_factory=BuildLimits)
+    # engine - Engine API (чтение, restart, образы); compose - только
+    # docker-compose CLI (в образе агента - v1, без ps --format json)
+    backend: str = 'engine'
+    docker_host: str = 'unix://var/run/docker.sock'
+    status_cache: bool = True
+    load_gate: LoadGateConfig = field(default_factory=LoadGateConfig)
 
 
 class DockerProxyError(Exception):
@@ -51,6 +83,37 @@ class DockerProxyError(Exception):
     pass
 
 
+class BuildDeferredError(DockerProxyError):
+    """Сборка отложена из-за высокой нагрузки на хост"""
+    pass
+
+
+# ${VAR}, ${VAR:-default}, ${VAR-default}, $VAR
+_INTERPOLATION_RE = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)(?:(:?-)([^}]*))?\}|\$([A-Za-z_][A-Za-z0-9_]*)')
+
+
+def _interpolate(match: re.Match, env: Dict[str, str]) -> str:
+    """Подстановка переменной в стиле compose"""
+    name = match.group(1) or match.group(4)
+    value = env.get(name)
+    if match.group(2) == ':-' and not value:
+        return match.group(3)
+    if match.group(2) == '-' and value is None:
+        return match.group(3)
+    return value or ''
+
+
+def _repository(reference: str) -> str:
+    """Репозиторий из ссылки на образ (registry:5000/app:tag -> registry:5000/app)"""
+    name, _, tag = reference.rpartition(':')
+    return name if name and '/' not in tag else reference
+
+
+def _image_env(image_tag: Optional[str]) -> Dict[str, str]:
+    """Окружение compose с тегом образа приложения (APP_IMAGE_TAG)"""
+    return {'APP_IMAGE_TAG': image_tag} if image_tag else {}
+
+
 class SecureDockerProxy:
     """
     Безопасный прокси для Docker операций.
@@ -62,14 +125,25 @@ class SecureDockerProxy:
     def __init__(self, config: ProxyConfig):
         self.config = config
         self._validate_config()
+        self.load_gate = HostLoadGate(config.load_gate)
+        self.compose_cache = ComposeFileCache(config.compose_file)
+        self._output = threading.local()
+        self.engine: Optional[EngineBackend] = None
+        self.state_cache: Optional[ContainerStateCache] = None
+        if config.backend == 'engine':
+            self.engine = EngineBackend(config.project_name, base_url=config.docker_host)
+            if config.status_cache:
+                self.state_cache = ContainerStateCache(self.engine)
     
     def _validate_config(self):
-        """Валидация конфигурации"""
+        """
+        Валидация конфигурации.
+        
+        Наличие compose-файла проверяется при первой команде: при старте
+        контейнера репозиторий может быть ещё не склонирован.
+        """
         if not self.config.allowed_services:
             raise DockerProxyError("No allowed services specified")
-        
-        if not os.path.exists(self.config.compose_file):
-            raise DockerProxyError(f"Compose file not found: {self.config.compose_file}")
     
     def _is_service_allowed(self, service: str) -> bool:
         """Проверка, разрешён ли сервис"""
@@ -79,28 +153,94 @@ class SecureDockerProxy:
         """Проверка, защищён ли сервис от удаления"""
         return service in self.config.protected_services
     
+    def require_allowed(self, service: str):
+        """Проверка сервиса до постановки фоновой задачи"""
+        if not self._is_service_allowed(service):
+            raise DockerProxyError(f"Service '{service}' is not allowed")
+    
+    @contextmanager
+    def stream_output_to(self, callback: Callable[[str], None]):
+        """
+        Построчная передача вывода docker-compose в callback
+        для команд, выполняемых в текущем потоке.
+        """
+        previous = getattr(self._output, 'callback', None)
+        self._output.callback = callback
+        try:
+            yield
+        finally:
+            self._output.callback = previous
+    
+    def defined_services(self) -> List[str]:
+        """Сервисы, описанные в compose-файле (из кэша)"""
+        return self.compose_cache.get().service_names
+    
+    def _ensure_service_defined(self, service: str):
+        try:
+            services = self.compose_cache.get().services
+        except (OSError, yaml.YAMLError) as e:
+            raise DockerProxyError(f"Cannot read compose file: {e}")
+        
+        if service not in services:
+            raise DockerProxyError(f"Service '{service}' is not defined in compose file")
+    
+    def _engine_call(self, operation: str, func, *args, **kwargs):
+        """
+        Вызов Engine API backend.
+        
+        Returns:
+            Результат вызова или None, если backend отключён или недоступен
+            (тогда операция выполняется через docker-compose)
+        """
+        if self.engine is None:
+            return None
+        try:
+            return func(*args, **kwargs)
+        except DockerProxyError:
+            raise
+        except Exception as e:
+            logger.warning(f"Engine API {operation} failed, falling back to docker-compose: {e}")
+            return None
+    
+    def _compose_command(self, command: List[str]) -> List[str]:
+        return [
+            'docker-compose',
+            '-f', self.config.compose_file,
+            '-p', self.config.project_name,
+        ] + command
+    
     def _run_compose_command(
         self,
         command: List[str],
-        timeout: Optional[int] = None
+        timeout: Optional[int] = None,
+        prefix: Optional[List[str]] = None,
+        env: Optional[Dict[str, str]] = None
     ) -> Dict[str, Any]:
         """Выполнение docker-compose команды"""
-        timeout = timeout or self.config.operation_timeout
+        if not os.path.exists(self.config.compose_file):
+            return {
+                'success': False,
+                'stdout': '',
+                'stderr': f"Compose file not found: {self.config.compose_file}",
+                'returncode': -1
+            }
         
-        full_command = [
-            'docker-compose',
-            '-f', self.config.compose_file,
-            '-p', self.config.project_name,
-        ] + command
+        timeout = timeout or self.config.operation_timeout
+        full_command = (prefix or []) + self._compose_command(command)
         
         logger.info(f"Executing: {' '.join(full_command)}")
         
+        callback = getattr(self._output, 'callback', None)
+        if callback is not None:
+            return self._run_streaming(full_command, timeout, env, callback)
+        
         try:
             result = subprocess.run(
                 full_command,
                 capture_output=True,
                 text=True,
-                timeout=timeout
+                timeout=timeout,
+                env={**os.environ, **env} if env else None
             )
             
             return {
@@ -124,32 +264,302 @@ class SecureDockerProxy:
                 'returncode': -1
             }
     
-    def build(self, service: str, no_cache: bool = False) -> Dict[str, Any]:
+    def _run_streaming(
+        self,
+        full_command: List[str],
+        timeout: int,
+        env: Optional[Dict[str, str]],
+        callback: Callable[[str], None]
+    ) -> Dict[str, Any]:
+        """Выполнение команды с построчной передачей объединённого вывода"""
+        try:
+            process = subprocess.Popen(
+                full_command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                env={**os.environ, **env} if env else None
+            )
+        except Exception as e:
+            return {'success': False, 'stdout': '', 'stderr': str(e), 'returncode': -1}
+        
+        timed_out = threading.Event()
+        
+        def kill_on_timeout():
+            timed_out.set()
+            process.kill()
+        
+        timer = threading.Timer(timeout, kill_on_timeout)
+        timer.start()
+        lines = []
+        try:
+            for line in process.stdout:
+                lines.append(line)
+                callback(line)
+            process.wait()
+        finally:
+            timer.cancel()
+        
+        output = ''.join(lines)
+        if timed_out.is_set():
+            return {'success': False, 'stdout': output, 'stderr': 'Operation timed out', 'returncode': -1}
+        
+        return {
+            'success': process.returncode == 0,
+            'stdout': output,
+            'stderr': '' if process.returncode == 0 else output[-4000:],
+            'returncode': process.returncode
+        }
+    
+    def wait_for_build_capacity(self, max_wait: Optional[int] = None) -> bool:
         """
-        Сборка сервиса.
+        Ожидание снижения нагрузки на хост перед сборкой.
+        
+        Args:
+            max_wait: Максимальное ожидание в секундах (по умолчанию из конфигурации)
+        """
+        return self.load_gate.wait(max_wait)
+    
+    def build(
+        self,
+        service: str,
+        no_cache: bool = False,
+        wait_for_capacity: bool = True,
+        image_tag: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Сборка сервиса с ограничением ресурсов.
         
         Args:
             service: Имя сервиса для сборки
             no_cache: Сборка без кэша
+            wait_for_capacity: Отложить сборку при высокой нагрузке на хост
+            image_tag: Тег собранного образа (APP_IMAGE_TAG)
         """
         if not self._is_service_allowed(service):
             raise DockerProxyError(f"Service '{service}' is not allowed")
         
-        command = ['build']
+        if wait_for_capacity and not self.wait_for_build_capacity():
+            raise BuildDeferredError(f"Build of '{service}' deferred: host is overloaded")
+        
+        limits = self.config.build_limits
+        if limits.limits_cpu:
+            if self.engine is not None:
+                return self._engine_build(service, no_cache=no_cache, image_tag=image_tag)
+            logger.warning("BUILD_CPUSET/BUILD_CPU_SHARES require the engine backend, building without CPU limits")
+        
+        command = ['build'] + limits.build_args()
         if no_cache:
             command.append('--no-cache')
         command.append(service)
         
         logger.info(f"Building service: {service}")
-        return self._run_compose_command(command, timeout=900)  # 15 минут на сборку
+        return self._run_compose_command(
+            command,
+            timeout=900,  # 15 минут на сборку
+            env=_image_env(image_tag)
+        )
     
-    def up(self, service: str, detach: bool = True) -> Dict[str, Any]:
+    def _engine_build(self, service: str, no_cache: bool, image_tag: Optional[str]) -> Dict[str, Any]:
+        """
+        Сборка сервиса через Engine API с лимитами CPU и памяти
+        (у docker-compose build есть только --memory). Контекст, Dockerfile,
+        args и target - из compose-файла, тег - image сервиса.
+        """
+        compose = self.compose_cache.get()
+        build = (compose.service(service) or {}).get('build')
+        if build is None:
+            raise DockerProxyError(f"Service '{service}' has no build section")
+        if isinstance(build, str):
+            build = {'context': build}
+        
+        env = {**os.environ, **_image_env(image_tag)}
+        
+        def interpolate(value: Any) -> str:
+            return _INTERPOLATION_RE.sub(lambda m: _interpolate(m, env), str(value))
+        
+        args = build.get('args') or {}
+        if isinstance(args, list):
+            args = dict(a.split('=', 1) if '=' in a else (a, env.get(a, '')) for a in args)
+        context = os.path.normpath(os.path.join(
+            os.path.dirname(os.path.abspath(self.config.compose_file)), interpolate(build.get('context', '.'))
+        ))
+        # Имя образа по умолчанию - как у docker-compose v1
+        tag = self.image_name(service, image_tag) or f"{self.config.project_name}_{service}"
+        
+        logger.info(f"Building service via Engine API: {service} ({tag}, limits {self.config.build_limits.container_limits()})")
+        try:
+            output = self.engine.build(
+                path=context,
+                tag=tag,
+                dockerfile=interpolate(build['dockerfile']) if build.get('dockerfile') else None,
+                buildargs={k: interpolate(v) if v is not None else env.get(k, '') for k, v in args.items()},
+                target=build.get('target'),
+                nocache=no_cache,
+                container_limits=self.config.build_limits.container_limits(),
+                on_line=getattr(self._output, 'callback', None)
+            )
+        except Exception as e:
+            return {'success': False, 'stdout': '', 'stderr': str(e), 'returncode': -1}
+        return {'success': True, 'stdout': output, 'stderr': '', 'returncode': 0}
+    
+    def _service_image(self, service: str, image_tag: Optional[str] = None) -> Optional[str]:
+        image = self.compose_cache.get().services.get(service, {}).get('image')
+        if not image:
+            return None
+        env = {**os.environ, **_image_env(image_tag)}
+        return _INTERPOLATION_RE.sub(lambda m: _interpolate(m, env), image)
+    
+    def image_name(self, service: str, image_tag: Optional[str] = None) -> Optional[str]:
+        """Имя образа сервиса из compose-файла (с подстановкой переменных окружения)"""
+        if not self._is_service_allowed(service):
+            raise DockerProxyError(f"Service '{service}' is not allowed")
+        return self._service_image(service, image_tag)
+    
+    def _require_image_repository(self, repository: str):
+        """
+        Операции с образами - только для репозиториев образов разрешённых
+        сервисов; репозитории защищённых сервисов запрещены.
+        """
+        def repositories(services: List[str]) -> Set[str]:
+            names = (self._service_image(s) for s in services)
+            return {_repository(n) for n in names if n}
+        
+        if repository in repositories(self.config.protected_services):
+            raise DockerProxyError(f"Images of '{repository}' belong to a protected service")
+        if repository not in repositories(self.config.allowed_services):
+            raise DockerProxyError(f"Images of '{repository}' are not allowed")
+    
+    def _require_engine(self, operation: str) -> EngineBackend:
+        if self.engine is None:
+            raise DockerProxyError(f"Operation '{operation}' requires the engine backend")
+        return self.engine
+    
+    def images(self, repository: str) -> List[Dict[str, Any]]:
+        """Образы репозитория разрешённого сервиса (id, tags, size)"""
+        self._require_image_repository(repository)
+        return self._require_engine('images').images(repository)
+    
+    def image_ids_in_use(self) -> Set[str]:
+        """Образы контейнеров хоста - их не удаляем"""
+        return set(self._require_engine('images').image_ids_in_use())
+    
+    def remove_image(self, reference: str):
+        """Удаление тега образа разрешённого сервиса"""
+        self._require_image_repository(_repository(reference))
+        logger.info(f"Removing image tag: {reference}")
+        self._require_engine('remove_image').remove_image(reference)
+    
+    def prune_images(self) -> int:
+        """
+        Удаление висячих (dangling) образов. У них нет тегов, поэтому
+        образы защищённых сервисов и запущенных контейнеров не затрагиваются.
+        """
+        logger.info("Pruning dangling images")
+        return self._require_engine('prune').prune_dangling_images()
+    
+    def prune_build_cache(self, until: str, keep_storage: int) -> int:
+        """Очистка кэша сборки старше until до бюджета keep_storage"""
+        logger.info(f"Pruning build cache older than {until}, keeping {keep_storage} bytes")
+        return self._require_engine('prune').prune_build_cache(until, keep_storage)
+    
+    def container_times(self, service: str) -> List[Dict[str, Any]]:
+        """
+        Время создания и запуска контейнеров сервиса (ISO-строки Engine API).
+        Только для backend engine, иначе пустой список.
+        """
+        if not self._is_service_allowed(service):
+            raise DockerProxyError(f"Service '{service}' is not allowed")
+        if self.engine is None:
+            return []
+        
+        def inspect_all():
+            times = []
+            for entry in self.engine.containers([service]):
+                info = self.engine.inspect(entry['ID'])
+                times.append({
+                    'id': entry['ID'],
+                    'created': info.get('Created'),
+                    'started': (info.get('State') or {}).get('StartedAt')
+                })
+            return times
+        
+        return self._engine_call('inspect', inspect_all) or []
+    
+    def push(self, service: str, image_tag: Optional[str] = None) -> Dict[str, Any]:
+        """Публикация собранного образа сервиса в registry"""
+        if not self._is_service_allowed(service):
+            raise DockerProxyError(f"Service '{service}' is not allowed")
+        
+        logger.info(f"Pushing image for service: {service} ({image_tag or 'default tag'})")
+        return self._run_compose_command(['push', service], timeout=900, env=_image_env(image_tag))
+    
+    def export_image(self, service: str, image_tag: str, path: str, timeout: int = 900) -> Dict[str, Any]:
+        """
+        Архив образа сервиса (docker save, gzip) для других хостов.
+        Файл появляется атомарно - читатели не видят незаконченный архив.
+        """
+        image = self.image_name(service, image_tag)
+        if not image:
+            raise DockerProxyError(f"Cannot resolve image of '{service}'")
+        
+        logger.info(f"Exporting image {image} to {path}")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            engine = self._require_engine('save')
+            # Быстрое сжатие: архив читается по сети, CPU сборки уже сэкономлен
+            with gzip.open(tmp, 'wb', compresslevel=1) as f:
+                engine.save_image(image, f, timeout=timeout)
+        except Exception as e:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            return {'success': False, 'stdout': '', 'stderr': str(e), 'returncode': -1}
+        
+        os.replace(tmp, path)
+        return {'success': True, 'stdout': image, 'stderr': '', 'returncode': 0}
+    
+    def import_image(self, path: str) -> Dict[str, Any]:
+        """Загрузка архива образа (docker load понимает gzip)"""
+        logger.info(f"Importing image archive {path}")
+        try:
+            engine = self._require_engine('load')
+            with open(path, 'rb') as f:
+                loaded = engine.load_image(f)
+        except Exception as e:
+            return {'success': False, 'stdout': '', 'stderr': str(e), 'returncode': -1}
+        return {'success': True, 'stdout': '\n'.join(loaded), 'stderr': '', 'returncode': 0}
+    
+    def pull(self, service: str, image_tag: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Загрузка готового образа сервиса из registry.
+        
+        Args:
+            service: Имя сервиса
+            image_tag: Тег образа (APP_IMAGE_TAG)
+        """
+        if not self._is_service_allowed(service):
+            raise DockerProxyError(f"Service '{service}' is not allowed")
+        
+        logger.info(f"Pulling image for service: {service} ({image_tag or 'default tag'})")
+        return self._run_compose_command(['pull', service], timeout=600, env=_image_env(image_tag))
+    
+    def up(
+        self,
+        service: str,
+        detach: bool = True,
+        no_build: bool = False,
+        image_tag: Optional[str] = None,
+        no_deps: bool = False
+    ) -> Dict[str, Any]:
         """
         Запуск сервиса.
         
         Args:
             service: Имя сервиса для запуска
             detach: Запуск в фоне
+            no_build: Не собирать образ, использовать загруженный
+            image_tag: Тег образа (APP_IMAGE_TAG)
+            no_deps: Не трогать зависимости из depends_on
         """
         if not self._is_service_allowed(service):
             raise DockerProxyError(f"Service '{service}' is not allowed")
@@ -157,10 +567,14 @@ class SecureDockerProxy:
         command = ['up']
         if detach:
             command.append('-d')
+        if no_build:
+            command.append('--no-build')
+        if no_deps:
+            command.append('--no-deps')
         command.append(service)
         
         logger.info(f"Starting service: {service}")
-        return self._run_compose_command(command, timeout=120)
+        return self._run_compose_command(command, timeout=120, env=_image_env(image_tag))
     
     def down(self, service: str, remove_volumes: bool = False) -> Dict[str, Any]:
         """
@@ -186,6 +600,130 @@ class SecureDockerProxy:
         logger.info(f"Stopping service: {service}")
         return self._run_compose_command(command, timeout=60)
     
+    def remove(self, service: str) -> Dict[str, Any]:
+        """
+        Остановка и удаление контейнера сервиса (без томов).
+        
+        Args:
+            service: Имя сервиса
+        """
+        if not self._is_service_allowed(service):
+            raise DockerProxyError(f"Service '{service}' is not allowed")
+        
+        if self._is_service_protected(service):
+            raise DockerProxyError(f"Cannot remove protected service '{service}'")
+        
+        logger.info(f"Removing service: {service}")
+        return self._run_compose_command(['rm', '--stop', '--force', service], timeout=60)
+    
+    def reload_reverse_proxy(self) -> Dict[str, Any]:
+        """
+        Перечитывание конфигурации reverse proxy (nginx -s reload).
+        
+        Разрешено только для сервиса из reverse_proxy_service.
+        """
+        service = self.config.reverse_proxy_service
+        if not service:
+            raise DockerProxyError("Reverse proxy service is not configured")
+        
+        logger.info(f"Reloading reverse proxy: {service}")
+        return self._run_compose_command(
+            ['exec', '-T', service, 'nginx', '-s', 'reload'],
+            timeout=30
+        )
+    
+    def run_task(
+        self,
+        service: str,
+        command: List[str],
+        timeout: Optional[int] = None,
+        image_tag: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Одноразовый контейнер сервиса (`run --rm --no-deps`), например
+        миграции БД на только что собранном образе.
+        
+        Args:
+            service: Имя сервиса
+            command: Команда внутри контейнера
+            timeout: Таймаут в секундах
+            image_tag: Тег образа (APP_IMAGE_TAG)
+        """
+        if not self._is_service_allowed(service):
+            raise DockerProxyError(f"Service '{service}' is not allowed")
+        if not command:
+            raise DockerProxyError("Empty task command")
+        self._ensure_service_defined(service)
+        
+        logger.info(f"Running task in {service}: {' '.join(command)}")
+        return self._run_compose_command(
+            ['run', '--rm', '--no-deps', '-T', service] + command,
+            timeout=timeout,
+            env=_image_env(image_tag)
+        )
+    
+    def _database_command(self, script: str, timeout: int) -> Dict[str, Any]:
+        """Фиксированный сценарий в контейнере сервиса БД (database_service)"""
+        service = self.config.database_service
+        if not service:
+            raise DockerProxyError("Database service is not configured")
+        self._ensure_service_defined(service)
+        return self._run_compose_command(['exec', '-T', service, 'sh', '-ec', script], timeout=timeout)
+    
+    @staticmethod
+    def _snapshot_path(directory: str, name: str) -> str:
+        if not re.match(r'^[A-Za-z0-9_.-]+$', name) or name.startswith('.'):
+            raise DockerProxyError(f"Invalid snapshot name: {name}")
+        if not directory.startswith('/'):
+            raise DockerProxyError(f"Snapshot directory must be absolute: {directory}")
+        return f"{directory.rstrip('/')}/{name}"
+    
+    def snapshot_database(
+        self,
+        name: str,
+        directory: str,
+        jobs: int = 4,
+        compression: int = 1,
+        keep: int = 3,
+        timeout: int = 1800
+    ) -> Dict[str, Any]:
+        """
+        Снимок БД защищённого сервиса: pg_dump в формате directory,
+        параллельно (jobs) и со сжатием (compression). Остаются keep
+        последних снимков.
+        
+        Args:
+            name: Имя снимка
+            directory: Каталог снимков внутри контейнера БД (на томе данных)
+        """
+        path = self._snapshot_path(directory, name)
+        script = ' && '.join([
+            f"mkdir -p {shlex.quote(directory)}",
+            f"rm -rf {shlex.quote(path)}",
+            f'pg_dump -U "$POSTGRES_USER" -d "$POSTGRES_DB" -Fd -j {int(jobs)} -Z {int(compression)} -f {shlex.quote(path)}',
+            f"cd {shlex.quote(directory)}",
+            f"ls -1t | tail -n +{max(int(keep), 1) + 1} | xargs -r rm -rf"
+        ])
+        
+        logger.info(f"Snapshotting database {self.config.database_service} to {path}")
+        return self._database_command(script, timeout)
+    
+    def restore_database(self, name: str, directory: str, jobs: int = 4, timeout: int = 1800) -> Dict[str, Any]:
+        """
+        Восстановление БД из снимка: база пересоздаётся (активные
+        подключения закрываются), затем параллельный pg_restore.
+        """
+        path = self._snapshot_path(directory, name)
+        script = ' && '.join([
+            f"test -d {shlex.quote(path)}",
+            'dropdb -U "$POSTGRES_USER" --force --if-exists "$POSTGRES_DB"',
+            'createdb -U "$POSTGRES_USER" "$POSTGRES_DB"',
+            f'pg_restore -U "$POSTGRES_USER" -d "$POSTGRES_DB" -j {int(jobs)} {shlex.quote(path)}'
+        ])
+        
+        logger.warning(f"Restoring database {self.config.database_service} from {path}")
+        return self._database_command(script, timeout)
+    
     def restart(self, service: str) -> Dict[str, Any]:
         """
         Перезапуск сервиса.
@@ -197,29 +735,71 @@ class SecureDockerProxy:
             raise DockerProxyError(f"Service '{service}' is not allowed")
         
         logger.info(f"Restarting service: {service}")
+        
+        if self.engine is not None:
+            self._ensure_service_defined(service)
+            restarted = self._engine_call('restart', self.engine.restart, service)
+            if restarted is not None:
+                return {
+                    'success': bool(restarted),
+                    'stdout': '\n'.join(restarted),
+                    'stderr': '' if restarted else 'No containers found',
+                    'returncode': 0 if restarted else 1
+                }
+        
         return self._run_compose_command(['restart', service], timeout=120)
     
-    def logs(self, service: str, lines: int = 100, follow: bool = False) -> Dict[str, Any]:
+    def logs(self, service: str, lines: int = 100) -> Dict[str, Any]:
         """
-        Получение логов сервиса.
+        Получение последних строк логов сервиса.
+        
+        Для слежения за логами используется follow_logs (через LogStreamHub).
         
         Args:
             service: Имя сервиса
             lines: Количество строк
-            follow: Следить за логами (не рекомендуется)
         """
         if not self._is_service_allowed(service):
             raise DockerProxyError(f"Service '{service}' is not allowed")
         
         lines = min(lines, self.config.max_log_lines)
         
-        command = ['logs', '--tail', str(lines)]
-        if follow:
-            command.append('--follow')
-        command.append(service)
+        if self.engine is not None:
+            self._ensure_service_defined(service)
+            output = self._engine_call('logs', self.engine.logs, service, lines)
+            if output is not None:
+                return {'success': True, 'stdout': output, 'stderr': '', 'returncode': 0}
+        
+        return self._run_compose_command(['logs', '--tail', str(lines), service], timeout=30)
+    
+    def follow_logs(self, service: str, tail: int = 0) -> subprocess.Popen:
+        """
+        Запуск `docker-compose logs --follow` для сервиса.
+        
+        Процесс не ограничен по времени; его жизненным циклом управляет
+        вызывающий код (LogStreamHub держит один процесс на сервис).
+        
+        Returns:
+            Процесс с объединённым stdout/stderr
+        """
+        if not self._is_service_allowed(service):
+            raise DockerProxyError(f"Service '{service}' is not allowed")
+        self._ensure_service_defined(service)
+        
+        tail = min(tail, self.config.max_log_lines)
+        command = self._compose_command(['logs', '--follow', '--no-color', '--tail', str(tail), service])
+        logger.info(f"Following logs: {' '.join(command)}")
         
-        timeout = 30 if not follow else 5
-        return self._run_compose_command(command, timeout=timeout)
+        try:
+            return subprocess.Popen(
+                command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1
+            )
+        except OSError as e:
+            raise DockerProxyError(f"Cannot follow logs: {e}")
     
     def ps(self, service: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -234,36 +814,139 @@ class SecureDockerProxy:
                 raise DockerProxyError(f"Service '{service}' is not allowed")
             command.append(service)
         
+        entries = self._engine_containers([service] if service else None)
+        if entries is not None:
+            return {
+                'success': True,
+                'stdout': '\n'.join(json.dumps(e) for e in entries),
+                'stderr': '',
+                'returncode': 0
+            }
+        
         return self._run_compose_command(command, timeout=30)
     
+    def _is_service_observable(self, service: str) -> bool:
+        """Проверка, можно ли читать статус сервиса (разрешённые и защищённые)"""
+        return self._is_service_allowed(service) or self._is_service_protected(service)
+    
+    @staticmethod
+    def _parse_ps_json(stdout: str) -> List[Dict[str, Any]]:
+        """
+        Разбор вывода `ps --format json`.
+        
+        Поддерживает JSON-массив, одиночный объект и построчный JSON
+        (NDJSON, новые версии docker compose).
+        """
+        stdout = stdout.strip()
+        if not stdout:
+            return []
+        
+        try:
+            parsed = json.loads(stdout)
+            return parsed if isinstance(parsed, list) else [parsed]
+        except json.JSONDecodeError:
+            return [json.loads(line) for line in stdout.splitlines() if line.strip()]
+    
+    def _engine_containers(self, services: Optional[List[str]]) -> Optional[List[Dict[str, Any]]]:
+        """Контейнеры через Engine API (None - использовать docker-compose)"""
+        if self.engine is None:
+            return None
+        for service in services or []:
+            self._ensure_service_defined(service)
+        if self.state_cache is not None:
+            entries = self.state_cache.containers(services)
+            if entries is not None:
+                return entries
+        return self._engine_call('ps', self.engine.containers, services)
+    
+    def state_changes(self, since: int = 0, timeout: float = 30) -> Dict[str, Any]:
+        """
+        Изменения состояния контейнеров после версии since (long-poll).
+        
+        Возвращаются только разрешённые и защищённые сервисы.
+        """
+        if self.state_cache is None:
+            raise DockerProxyError("Status cache is disabled (requires engine backend)")
+        
+        result = self.state_cache.wait_for_changes(since, timeout)
+        result['changes'] = [
+            c.to_dict() for c in result['changes'] if self._is_service_observable(c.service)
+        ]
+        if 'containers' in result:
+            result['containers'] = [
+                c for c in result['containers'] if self._is_service_observable(c['Service'])
+            ]
+        return result
+    
+    def containers(self, services: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Все контейнеры (реплики) указанных сервисов одним вызовом `ps`.
+        
+        Без Engine API - `ps --format json` (только docker compose v2;
+        с v1 возвращается ошибка, и health check решает по HTTP).
+        
+        Args:
+            services: Имена сервисов (разрешённые или защищённые)
+        """
+        services = services or self.config.allowed_services
+        for service in services:
+            if not self._is_service_observable(service):
+                raise DockerProxyError(f"Service '{service}' is not allowed")
+        
+        entries = self._engine_containers(services)
+        if entries is None:
+            result = self._run_compose_command(['ps', '--all', '--format', 'json'], timeout=30)
+            if not result['success']:
+                return {'success': False, 'error': result['stderr'], 'containers': {}}
+            
+            try:
+                entries = self._parse_ps_json(result['stdout'])
+            except json.JSONDecodeError:
+                return {'success': False, 'error': 'Unsupported ps output format', 'containers': {}}
+        
+        containers: Dict[str, List[Dict[str, Any]]] = {service: [] for service in services}
+        for entry in entries:
+            service = entry.get('Service')
+            if service in containers:
+                containers[service].append(entry)
+        
+        return {'success': True, 'containers': containers}
+    
+    @staticmethod
+    def container_healthy(container: Dict[str, Any]) -> bool:
+        status = container.get('State', 'unknown')
+        health = container.get('Health') or 'unknown'
+        return status == 'running' and health in ['healthy', 'unknown']
+    
     def health_check(self, service: str) -> Dict[str, Any]:
         """
-        Проверка здоровья сервиса.
+        Проверка здоровья сервиса по всем его репликам.
         
         Args:
             service: Имя сервиса
         """
-        if not self._is_service_allowed(service):
+        if not self._is_service_observable(service):
             raise DockerProxyError(f"Service '{service}' is not allowed")
         
-        # Получаем статус контейнера
-        result = self._run_compose_command(
-            ['ps', '--format', 'json', service],
-            timeout=30
-        )
-        
-        if not result['success']:
-            return {
-                'healthy': False,
-                'status': 'unknown',
-                'error': result['stderr']
-            }
+        # Получаем статус контейнеров
+        containers = self._engine_containers([service])
+        result = None
+        if containers is None:
+            result = self._run_compose_command(
+                ['ps', '--format', 'json', service],
+                timeout=30
+            )
+            
+            if not result['success']:
+                return {
+                    'healthy': False,
+                    'status': 'unknown',
+                    'error': result['stderr']
+                }
         
         try:
-            # Парсим JSON вывод
-            containers = json.loads(result['stdout']) if result['stdout'] else []
-            if isinstance(containers, dict):
-                containers = [containers]
+            if containers is None:
+                containers = self._parse_ps_json(result['stdout'])
             
             if not containers:
                 return {
@@ -272,15 +955,25 @@ class SecureDockerProxy:
                     'error': 'Container not found'
                 }
             
-            container = containers[0]
-            status = container.get('State', 'unknown')
-            health = container.get('Health', 'unknown')
+            replicas = [
+                {
+                    'name': c.get('Name', service),
+                    'status': c.get('State', 'unknown'),
+                    'health': c.get('Health') or 'unknown',
+                    'healthy': self.container_healthy(c)
+                }
+                for c in containers
+            ]
+            healthy_count = sum(1 for r in replicas if r['healthy'])
             
             return {
-                'healthy': status == 'running' and health in ['healthy', 'unknown'],
-                'status': status,
-                'health': health,
-                'name': container.get('Name', service)
+                'healthy': healthy_count == len(replicas),
+                'status': replicas[0]['status'],
+                'health': replicas[0]['health'],
+                'name': replicas[0]['name'],
+                'healthy_replicas': healthy_count,
+                'total_replicas': len(replicas),
+                'replicas': replicas
             }
         except json.JSONDecodeError:
             # Fallback для старых версий docker-compose
@@ -290,13 +983,38 @@ class SecureDockerProxy:
                 'raw': result['stdout']
             }
     
-    def deploy(self, service: str, no_cache: bool = True) -> Dict[str, Any]:
+    @staticmethod
+    def _before_up(before_up: Optional[Callable[[], Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """Результат неудачного этапа before_up (None - можно запускать)"""
+        if before_up is None:
+            return None
+        result = before_up()
+        if result['success']:
+            return None
+        return {
+            'success': False,
+            'stage': result.get('stage', 'before_up'),
+            'error': result.get('error', '')
+        }
+    
+    def deploy(
+        self,
+        service: str,
+        no_cache: bool = True,
+        wait_for_capacity: bool = True,
+        image_tag: Optional[str] = None,
+        before_up: Optional[Callable[[], Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
         """
-        Полный цикл деплоя: build -> up.
+        Полный цикл деплоя: build -> [before_up] -> up.
         
         Args:
             service: Имя сервиса
             no_cache: Сборка без кэша
+            wait_for_capacity: Отложить сборку при высокой нагрузке на хост
+            image_tag: Тег образа (APP_IMAGE_TAG)
+            before_up: Этап между сборкой и запуском (миграции БД);
+                возвращает {'success', 'stage', 'error'}
         """
         if not self._is_service_allowed(service):
             raise DockerProxyError(f"Service '{service}' is not allowed")
@@ -304,7 +1022,12 @@ class SecureDockerProxy:
         logger.info(f"Starting deployment of service: {service}")
         
         # Build
-        build_result = self.build(service, no_cache=no_cache)
+        build_result = self.build(
+            service,
+            no_cache=no_cache,
+            wait_for_capacity=wait_for_capacity,
+            image_tag=image_tag
+        )
         if not build_result['success']:
             return {
                 'success': False,
@@ -312,8 +1035,12 @@ class SecureDockerProxy:
                 'error': build_result['stderr']
             }
         
+        prepared = self._before_up(before_up)
+        if prepared is not None:
+            return prepared
+        
         # Up
-        up_result = self.up(service, detach=True)
+        up_result = self.up(service, detach=True, image_tag=image_tag)
         if not up_result['success']:
             return {
                 'success': False,
@@ -326,6 +1053,144 @@ class SecureDockerProxy:
             'stage': 'complete',
             'message': f'Service {service} deployed successfully'
         }
+    
+    def deploy_services(
+        self,
+        services: List[str],
+        no_cache: bool = True,
+        wait_for_capacity: bool = True,
+        image_tag: Optional[str] = None,
+        before_up: Optional[Callable[[], Dict[str, Any]]] = None,
+        max_parallel: int = 2
+    ) -> Dict[str, Any]:
+        """
+        Деплой нескольких сервисов по графу depends_on:
+        параллельная сборка -> [before_up] -> up по уровням.
+        
+        Сервисы со своей сборкой (build) собираются параллельно, не больше
+        max_parallel одновременно; сервисы только с image образ получают
+        при up. Запуск - в топологическом порядке: сервис стартует после
+        своих зависимостей из того же деплоя; зависимости вне деплоя
+        (в том числе защищённые сервисы) не пересоздаются (--no-deps).
+        
+        Args:
+            services: Изменённые сервисы
+            no_cache: Сборка без кэша
+            wait_for_capacity: Отложить сборку при высокой нагрузке на хост
+            image_tag: Тег образа (APP_IMAGE_TAG)
+            before_up: Этап между сборкой и запуском (миграции БД)
+            max_parallel: Предел одновременных сборок
+        """
+        for service in services:
+            if self._is_service_protected(service):
+                raise DockerProxyError(f"Service '{service}' is protected")
+            if not self._is_service_allowed(service):
+                raise DockerProxyError(f"Service '{service}' is not allowed")
+        
+        try:
+            compose = self.compose_cache.get()
+        except (OSError, yaml.YAMLError) as e:
+            raise DockerProxyError(f"Cannot read compose file: {e}")
+        undefined = [s for s in services if compose.service(s) is None]
+        if undefined:
+            raise DockerProxyError(f"Services not defined in compose file: {', '.join(undefined)}")
+        try:
+            levels = compose.start_order(services)
+        except ValueError as e:
+            return {'success': False, 'stage': 'plan', 'error': str(e)}
+        
+        logger.info(f"Starting deployment of services: {' -> '.join(','.join(level) for level in levels)}")
+        
+        # Одно ожидание нагрузки на все сборки, а не на каждую
+        if wait_for_capacity and not self.wait_for_build_capacity():
+            raise BuildDeferredError(f"Build of {', '.join(services)} deferred: host is overloaded")
+        
+        buildable = [s for s in services if compose.build_context(s) is not None]
+        with ThreadPoolExecutor(max_workers=max(max_parallel, 1), thread_name_prefix='build') as pool:
+            results = dict(zip(buildable, pool.map(
+                lambda s: self.build(s, no_cache=no_cache, wait_for_capacity=False, image_tag=image_tag),
+                buildable
+            )))
+        failed = [s for s in buildable if not results[s]['success']]
+        if failed:
+            return {
+                'success': False,
+                'stage': 'build',
+                'error': '\n'.join(f"{s}: {results[s]['stderr'].strip()}" for s in failed)
+            }
+        
+        prepared = self._before_up(before_up)
+        if prepared is not None:
+            return prepared
+        
+        for level in levels:
+            for service in level:
+                up_result = self.up(
+                    service,
+                    detach=True,
+                    no_build=service in buildable,
+                    image_tag=image_tag,
+                    no_deps=True
+                )
+                if not up_result['success']:
+                    return {
+                        'success': False,
+                        'stage': 'up',
+                        'error': f"{service}: {up_result['stderr']}"
+                    }
+        
+        return {
+            'success': True,
+            'stage': 'complete',
+            'message': f"Services {', '.join(services)} deployed successfully"
+        }
+    
+    def deploy_image(
+        self,
+        service: str,
+        image_tag: str,
+        before_up: Optional[Callable[[], Dict[str, Any]]] = None,
+        pull: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Деплой готового образа без сборки: pull -> [before_up] -> up --no-build.
+        
+        Args:
+            service: Имя сервиса
+            image_tag: Тег образа в registry
+            before_up: Этап между загрузкой и запуском (миграции БД)
+            pull: Загрузить образ из registry (False - образ уже локально)
+        """
+        if not self._is_service_allowed(service):
+            raise DockerProxyError(f"Service '{service}' is not allowed")
+        
+        logger.info(f"Starting image deployment of service: {service} ({image_tag})")
+        
+        pull_result = self.pull(service, image_tag=image_tag) if pull else {'success': True}
+        if not pull_result['success']:
+            return {
+                'success': False,
+                'stage': 'pull',
+                'error': pull_result['stderr']
+            }
+        
+        prepared = self._before_up(before_up)
+        if prepared is not None:
+            return prepared
+        
+        up_result = self.up(service, detach=True, no_build=True, image_tag=image_tag)
+        if not up_result['success']:
+            return {
+                'success': False,
+                'stage': 'up',
+                'error': up_result['stderr']
+            }
+        
+        return {
+            'success': True,
+            'stage': 'complete',
+            'message': f'Service {service} deployed from image {image_tag}'
+        }
 
 
 def create_proxy_from_env() -> SecureDockerProxy:
@@ -334,12 +1199,22 @@ def create_proxy_from_env() -> SecureDockerProxy:
     protected_services = os.environ.get('PROTECTED_SERVICES', 'postgres,redis').split(',')
     compose_file = os.environ.get('DOCKER_COMPOSE_FILE', '/app/repo/docker-compose.yml')
     project_name = os.environ.get('COMPOSE_PROJECT_NAME', 'scoliologic')
+    reverse_proxy_service = os.environ.get('REVERSE_PROXY_SERVICE') or None
+    database_service = os.environ.get('DATABASE_SERVICE') or None
+    backend = os.environ.get('DOCKER_PROXY_BACKEND', 'engine')
+    status_cache = os.environ.get('PROXY_STATUS_CACHE', 'true').lower() == 'true'
     
     config = ProxyConfig(
         allowed_services=[s.strip() for s in allowed_services],
         protected_services=[s.strip() for s in protected_services],
         compose_file=compose_file,
-        project_name=project_name
+        project_name=project_name,
+        reverse_proxy_service=reverse_proxy_service,
+        database_service=database_service,
+        build_limits=BuildLimits.from_env(),
+        load_gate=LoadGateConfig.from_env(),
+        backend=backend,
+        status_cache=status_cache
     )
     
     return SecureDockerProxy(config)
@@ -347,62 +1222,5 @@ def create_proxy_from_env() -> SecureDockerProxy:
 
 # HTTP API для прокси (опционально)
 if __name__ == '__main__':
-    from flask import Flask, request, jsonify
-    
-    app = Flask(__name__)
-    proxy = create_proxy_from_env()
-    
-    @app.route('/health', methods=['GET'])
-    def health():
-        return jsonify({'status': 'ok'})
-    
-    @app.route('/deploy/<service>', methods=['POST'])
-    def deploy(service):
-        try:
-            no_cache = request.args.get('no_cache', 'true').lower() == 'true'
-            result = proxy.deploy(service, no_cache=no_cache)
-            return jsonify(result)
-        except DockerProxyError as e:
-            return jsonify({'success': False, 'error': str(e)}), 403
-    
-    @app.route('/build/<service>', methods=['POST'])
-    def build(service):
-        try:
-            no_cache = request.args.get('no_cache', 'false').lower() == 'true'
-            result = proxy.build(service, no_cache=no_cache)
-            return jsonify(result)
-        except DockerProxyError as e:
-            return jsonify({'success': False, 'error': str(e)}), 403
-    
-    @app.route('/restart/<service>', methods=['POST'])
-    def restart(service):
-        try:
-            result = proxy.restart(service)
-            return jsonify(result)
-        except DockerProxyError as e:
-            return jsonify({'success': False, 'error': str(e)}), 403
-    
-    @app.route('/logs/<service>', methods=['GET'])
-    def logs(service):
-        try:
-            lines = int(request.args.get('lines', 100))
-            result = proxy.logs(service, lines=lines)
-            return jsonify(result)
-        except DockerProxyError as e:
-            return jsonify({'success': False, 'error': str(e)}), 403
-    
-    @app.route('/status/<service>', methods=['GET'])
-    def status(service):
-        try:
-            result = proxy.health_check(service)
-            return jsonify(result)
-        except DockerProxyError as e:
-            return jsonify({'success': False, 'error': str(e)}), 403
-    
-    @app.route('/ps', methods=['GET'])
-    def ps():
-        result = proxy.ps()
-        return jsonify(result)
-    
-    port = int(os.environ.get('PROXY_PORT', 8080))
-    app.run(host='0.0.0.0', port=port)
+    from proxy_api import main
+    main()
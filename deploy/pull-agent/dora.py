@@ -0,0 +1,239 @@
+"""
+Отчёт DORA-метрик по истории деплоев Pull-агента
+
+- deploy frequency - успешные деплои в день
+- lead time - от времени коммита (локальное зеркало git) до успешного
+  деплоя, для каждого коммита, вошедшего в деплой
+- change failure rate - доля неудачных деплоев среди всех попыток
+  (отклонённые проверкой до сборки не считаются)
+- time to restore - от неудачного деплоя до отката или следующего
+  успешного деплоя
+
+История (deploy_history.json) хранит последние 100 записей, поэтому
+новые записи агрегируются инкрементально в дневные корзины
+(dora_state.json): каждая запись обрабатывается один раз, отчёт за
+годы считается по корзинам, без повторного чтения истории и git.
+
+    python pull_agent_secure.py dora [--format json|csv] [--windows 7,30,90] [--series DAYS]
+"""
+import csv
+import sys
+import json
+import logging
+import argparse
+import subprocess
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('dora')
+
+STATE_FILE = 'dora_state.json'
+
+
+@dataclass
+class DayBucket:
+    """Агрегаты за день"""
+    deploys: int = 0
+    failures: int = 0
+    lead_times: List[float] = field(default_factory=list)
+    restore_times: List[float] = field(default_factory=list)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)
+    return round(ordered[index], 1)
+
+
+class DoraAggregator:
+    """Инкрементальная агрегация истории деплоев в дневные корзины"""
+
+    def __init__(self, data_dir: str, repo_dir: str):
+        self.history_file = Path(data_dir) / 'deploy_history.json'
+        self.state_file = Path(data_dir) / STATE_FILE
+        self.repo_dir = repo_dir
+        self.cursor: Optional[str] = None
+        # Сколько записей со временем cursor уже обработано
+        self.cursor_seen = 0
+        self.last_success_commit: Optional[str] = None
+        self.incident_started: Optional[str] = None
+        self.days: Dict[str, DayBucket] = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.cursor = state.get('cursor')
+        self.cursor_seen = state.get('cursor_seen', 1)
+        self.last_success_commit = state.get('last_success_commit')
+        self.incident_started = state.get('incident_started')
+        self.days = {day: DayBucket(**bucket) for day, bucket in state.get('days', {}).items()}
+
+    def _save(self):
+        state = {
+            'cursor': self.cursor,
+            'cursor_seen': self.cursor_seen,
+            'last_success_commit': self.last_success_commit,
+            'incident_started': self.incident_started,
+            'days': {day: vars(bucket) for day, bucket in sorted(self.days.items())}
+        }
+        tmp = self.state_file.with_suffix('.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+        tmp.replace(self.state_file)
+
+    def _new_entries(self) -> Iterator[Tuple[Dict[str, Any], datetime]]:
+        """
+        Записи истории после курсора и их время (ISO-формат сравним строкой).
+
+        Курсор - время последней обработанной записи и число обработанных
+        записей с этим временем: записи с одинаковым временем не теряются.
+        Записи без корректного времени пропускаются.
+        """
+        try:
+            with open(self.history_file, 'r') as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return
+        cursor, cursor_seen = self.cursor, self.cursor_seen
+        same = 0
+        for entry in history:
+            try:
+                stamp = entry['timestamp']
+                moment = datetime.fromisoformat(stamp)
+            except (KeyError, TypeError, ValueError):
+                logger.debug(f"Skipping history entry without a valid timestamp: {entry!r}")
+                continue
+            if cursor is not None:
+                if stamp < cursor:
+                    continue
+                if stamp == cursor:
+                    same += 1
+                    if same <= cursor_seen:
+                        continue
+            yield entry, moment
+
+    def _git_times(self, *args: str) -> List[float]:
+        try:
+            result = subprocess.run(['git', *args], cwd=self.repo_dir, capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"git {args[0]} failed: {e}")
+            return []
+        if result.returncode != 0:
+            return []
+        return [float(line) for line in result.stdout.split()]
+
+    def _commit_times(self, commit: str) -> List[float]:
+        """Время коммитов, вошедших в деплой (после предыдущего успешного)"""
+        if self.last_success_commit:
+            times = self._git_times('log', '--format=%ct', f"{self.last_success_commit}..{commit}")
+            if times:
+                return times
+        # Первый деплой или коммиты недоступны в зеркале - только сам коммит
+        return self._git_times('show', '-s', '--format=%ct', commit)
+
+    def _bucket(self, moment: datetime) -> DayBucket:
+        return self.days.setdefault(moment.date().isoformat(), DayBucket())
+
+    def update(self) -> int:
+        """
+        Агрегация новых записей истории.
+
+        Returns:
+            Число обработанных записей
+        """
+        processed = 0
+        for entry, moment in self._new_entries():
+            status = entry.get('status')
+            commit = entry.get('commit', '')
+
+            if status == 'success':
+                bucket = self._bucket(moment)
+                bucket.deploys += 1
+                deployed_at = moment.timestamp()
+                bucket.lead_times.extend(max(deployed_at - t, 0.0) for t in self._commit_times(commit))
+                self.last_success_commit = commit
+            elif status == 'failed':
+                self._bucket(moment).failures += 1
+                if self.incident_started is None:
+                    self.incident_started = entry['timestamp']
+
+            if status in ('success', 'rolled_back') and self.incident_started is not None:
+                started = datetime.fromisoformat(self.incident_started)
+                self._bucket(moment).restore_times.append((moment - started).total_seconds())
+                self.incident_started = None
+
+            if entry['timestamp'] == self.cursor:
+                self.cursor_seen += 1
+            else:
+                self.cursor, self.cursor_seen = entry['timestamp'], 1
+            processed += 1
+
+        if processed:
+            self._save()
+        return processed
+
+    def window(self, end: date, days: int) -> Dict[str, Any]:
+        """Метрики за days дней, заканчивая end (включительно)"""
+        deploys = failures = 0
+        lead_times: List[float] = []
+        restore_times: List[float] = []
+        for offset in range(days):
+            bucket = self.days.get((end - timedelta(days=offset)).isoformat())
+            if bucket is None:
+                continue
+            deploys += bucket.deploys
+            failures += bucket.failures
+            lead_times.extend(bucket.lead_times)
+            restore_times.extend(bucket.restore_times)
+
+        attempts = deploys + failures
+        return {
+            'end': end.isoformat(),
+            'window_days': days,
+            'deploys': deploys,
+            'failures': failures,
+            'deploy_frequency_per_day': round(deploys / days, 3),
+            'lead_time_p50_seconds': _percentile(lead_times, 0.5),
+            'lead_time_p90_seconds': _percentile(lead_times, 0.9),
+            'change_failure_rate': round(failures / attempts, 3) if attempts else None,
+            'time_to_restore_p50_seconds': _percentile(restore_times, 0.5),
+            'time_to_restore_p90_seconds': _percentile(restore_times, 0.9)
+        }
+
+    def report(self, windows: List[int], series: int = 0, today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Скользящие окна на сегодня (и на каждый из series предыдущих дней)"""
+        today = today or date.today()
+        rows = []
+        for offset in range(series, -1, -1):
+            end = today - timedelta(days=offset)
+            rows.extend(self.window(end, days) for days in windows)
+        return rows
+
+
+def main(argv: List[str], data_dir: str, repo_dir: str):
+    """Команда отчёта: агрегация новых записей и вывод JSON/CSV в stdout"""
+    parser = argparse.ArgumentParser(prog='pull_agent_secure.py dora', description='DORA metrics report')
+    parser.add_argument('--format', choices=['json', 'csv'], default='json')
+    parser.add_argument('--windows', default='7,30,90', help='Rolling windows in days')
+    parser.add_argument('--series', type=int, default=0, help='Also report for each of the previous N days')
+    args = parser.parse_args(argv)
+
+    aggregator = DoraAggregator(data_dir, repo_dir)
+    aggregator.update()
+    rows = aggregator.report([int(w) for w in args.windows.split(',') if w.strip()], series=args.series)
+
+    if args.format == 'csv':
+        writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0].keys()) if rows else [])
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, sys.stdout, indent=2)
+        sys.stdout.write('\n')
@@ -0,0 +1,206 @@
+"""
+Docker Engine API backend для Docker прокси
+
+Операции чтения (ps, health, logs) и restart выполняются через Docker
+Engine API по unix-сокету с постоянным пулом соединений вместо запуска
+docker-compose на каждый вызов. Контейнеры сервиса находятся по меткам
+compose (com.docker.compose.project / com.docker.compose.service).
+
+Проверки разрешённых/защищённых сервисов выполняет SecureDockerProxy
+до обращения к backend.
+"""
+import re
+import time
+import threading
+import logging
+from typing import Callable, List, Dict, Any, Optional
+
+from lazy_imports import docker
+
+logger = logging.getLogger('docker-engine')
+
+PROJECT_LABEL = 'com.docker.compose.project'
+SERVICE_LABEL = 'com.docker.compose.service'
+
+_HEALTH_RE = re.compile(r'\((healthy|unhealthy|health: starting)\)')
+
+
+class EngineBackend:
+    """Клиент Docker Engine API с ленивым подключением"""
+
+    def __init__(
+        self,
+        project_name: str,
+        base_url: str = 'unix://var/run/docker.sock',
+        pool_size: int = 10,
+        timeout: int = 30
+    ):
+        self.project_name = project_name
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._api = None
+        self._lock = threading.Lock()
+
+    @property
+    def api(self):
+        """Низкоуровневый APIClient (создаётся при первом обращении)"""
+        if self._api is None:
+            with self._lock:
+                if self._api is None:
+                    self._api = docker.APIClient(
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_pool_size=self.pool_size
+                    )
+        return self._api
+
+    @staticmethod
+    def _health_from_status(status: str) -> str:
+        match = _HEALTH_RE.search(status or '')
+        if not match:
+            return ''
+        return 'starting' if match.group(1) == 'health: starting' else match.group(1)
+
+    def _to_ps_entry(self, summary: Dict[str, Any]) -> Dict[str, Any]:
+        """Приведение ответа API к формату `docker compose ps --format json`"""
+        labels = summary.get('Labels') or {}
+        names = summary.get('Names') or ['']
+        return {
+            'ID': summary.get('Id', '')[:12],
+            'Name': names[0].lstrip('/'),
+            'Service': labels.get(SERVICE_LABEL, ''),
+            'Project': labels.get(PROJECT_LABEL, ''),
+            'Image': summary.get('Image', ''),
+            'State': summary.get('State', 'unknown'),
+            'Status': summary.get('Status', ''),
+            'Health': self._health_from_status(summary.get('Status', ''))
+        }
+
+    def containers(self, services: Optional[List[str]] = None, all: bool = True) -> List[Dict[str, Any]]:
+        """Контейнеры проекта (одним запросом), опционально по сервисам"""
+        summaries = self.api.containers(
+            all=all,
+            filters={'label': [f'{PROJECT_LABEL}={self.project_name}']}
+        )
+        entries = [self._to_ps_entry(s) for s in summaries]
+        if services is not None:
+            entries = [e for e in entries if e['Service'] in services]
+        return entries
+
+    def container(self, container_id: str) -> Optional[Dict[str, Any]]:
+        """Текущее состояние одного контейнера (None - удалён)"""
+        summaries = self.api.containers(all=True, filters={'id': container_id})
+        return self._to_ps_entry(summaries[0]) if summaries else None
+
+    def inspect(self, container_id: str) -> Dict[str, Any]:
+        """Полное описание контейнера (docker inspect)"""
+        return self.api.inspect_container(container_id)
+
+    def events(self):
+        """Блокирующий поток событий контейнеров проекта"""
+        return self.api.events(
+            decode=True,
+            filters={'type': 'container', 'label': [f'{PROJECT_LABEL}={self.project_name}']}
+        )
+
+    def logs(self, service: str, lines: int) -> str:
+        """Последние строки логов всех контейнеров сервиса"""
+        chunks = []
+        for entry in self.containers([service]):
+            output = self.api.logs(entry['ID'], tail=lines, timestamps=False)
+            chunks.append(output.decode('utf-8', errors='replace'))
+        return ''.join(chunks)
+
+    def build(
+        self,
+        path: str,
+        tag: str,
+        dockerfile: Optional[str] = None,
+        buildargs: Optional[Dict[str, str]] = None,
+        target: Optional[str] = None,
+        nocache: bool = False,
+        container_limits: Optional[Dict[str, Any]] = None,
+        on_line: Optional[Callable[[str], None]] = None,
+        timeout: int = 900
+    ) -> str:
+        """
+        Сборка образа классическим builder dockerd: container_limits
+        (память, cpuset, cpu shares) действуют на контейнеры шагов RUN.
+        Возвращает вывод сборки, ошибка сборки - RuntimeError.
+        """
+        lines = []
+        for event in self.api.build(
+            path=path,
+            tag=tag,
+            dockerfile=dockerfile,
+            buildargs=buildargs,
+            target=target,
+            nocache=nocache,
+            rm=True,
+            forcerm=True,
+            container_limits=container_limits,
+            timeout=timeout,
+            decode=True
+        ):
+            if 'error' in event:
+                raise RuntimeError(event['error'])
+            line = event.get('stream')
+            if line:
+                lines.append(line)
+                if on_line is not None:
+                    on_line(line)
+        return ''.join(lines)
+
+    def images(self, repository: str) -> List[Dict[str, Any]]:
+        """Образы репозитория: id, теги, размер"""
+        return [
+            {'id': i['Id'], 'tags': i.get('RepoTags') or [], 'size': i.get('Size', 0)}
+            for i in self.api.images(name=repository)
+        ]
+
+    def image_ids_in_use(self) -> List[str]:
+        """Образы всех контейнеров хоста (в том числе остановленных)"""
+        return [c.get('ImageID') for c in self.api.containers(all=True)]
+
+    def remove_image(self, reference: str):
+        """Удаление тега (образ удаляется вместе с последним тегом)"""
+        self.api.remove_image(reference)
+
+    def prune_dangling_images(self) -> int:
+        """Удаление образов без тегов; освобождённые байты"""
+        return self.api.prune_images(filters={'dangling': True}).get('SpaceReclaimed') or 0
+
+    def prune_build_cache(self, until: str, keep_storage: int) -> int:
+        """Очистка кэша сборки старше until до бюджета keep_storage; освобождённые байты"""
+        return self.api.prune_builds(filters={'until': until}, keep_storage=keep_storage).get('SpaceReclaimed') or 0
+
+    def save_image(self, image: str, out, timeout: Optional[int] = None) -> int:
+        """Архив образа (docker save) в файловый объект; размер в байтах"""
+        deadline = time.monotonic() + timeout if timeout else None
+        size = 0
+        for chunk in self.api.get_image(image, chunk_size=1024 * 1024):
+            out.write(chunk)
+            size += len(chunk)
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Saving {image} timed out after {timeout}s")
+        return size
+
+    def load_image(self, data) -> List[str]:
+        """Загрузка архива образа (docker load, gzip допускается); загруженные образы"""
+        loaded = []
+        for event in self.api.load_image(data):
+            if 'error' in event:
+                raise RuntimeError(event['error'])
+            stream = event.get('stream', '')
+            if stream.startswith('Loaded image'):
+                loaded.append(stream.split(':', 1)[1].strip())
+        return loaded
+
+    def restart(self, service: str, timeout: int = 10) -> List[str]:
+        """Перезапуск всех контейнеров сервиса"""
+        restarted = []
+        for entry in self.containers([service]):
+            self.api.restart(entry['ID'], timeout=timeout)
+            restarted.append(entry['Name'])
+        return restarted
@@ -0,0 +1,126 @@
+"""
+Журнал неудачных деплоев (карантин коммитов) для Pull-агента
+
+Состояние строится по истории деплоев (deploy_history.json):
+коммит, деплой которого завершился ошибкой, попадает в карантин
+с экспоненциальной задержкой (base, 2*base, 4*base, ... до max) от
+последней неудачи. Коммит, отклонённый проверкой перед сборкой,
+остаётся в карантине до появления нового коммита или ручного повтора.
+
+Ручной повтор: `python pull_agent_secure.py retry [commit]` - запрос
+записывается в файл и обрабатывается агентом на следующей проверке
+(в историю добавляется запись 'retry', счётчик неудач сбрасывается).
+"""
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger('failure-ledger')
+
+RETRY_REQUEST_FILE = 'retry_request.json'
+
+
+@dataclass
+class QuarantineState:
+    """Карантин коммита"""
+    commit: str
+    failures: int
+    last_error: str
+    last_failure: datetime
+    until: Optional[datetime] = None  # None - до ручного повтора
+
+    def active(self, now: Optional[datetime] = None) -> bool:
+        return self.until is None or (now or datetime.now()) < self.until
+
+    def describe(self) -> str:
+        if self.until is None:
+            return f"rejected: {self.last_error}; waiting for a new commit or manual retry"
+        return f"{self.failures} failed deploys, next attempt after {self.until.isoformat(timespec='seconds')}"
+
+
+def _load_history(history_file: Path) -> List[Dict[str, Any]]:
+    try:
+        with open(history_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+class FailureLedger:
+    """Карантин коммитов по истории деплоев"""
+
+    def __init__(self, history_file: Path, backoff_base: int = 900, backoff_max: int = 86400):
+        self.history_file = history_file
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def backoff(self, failures: int) -> timedelta:
+        """Задержка после failures неудач подряд"""
+        seconds = self.backoff_base * 2 ** max(failures - 1, 0)
+        return timedelta(seconds=min(seconds, self.backoff_max))
+
+    def state(self, commit: str) -> Optional[QuarantineState]:
+        """
+        Карантин коммита (неудачи после последнего успеха/ручного повтора).
+
+        Returns:
+            None, если у коммита нет неудач
+        """
+        failures = 0
+        rejected = False
+        last: Optional[Dict[str, Any]] = None
+
+        for entry in reversed(_load_history(self.history_file)):
+            if entry.get('commit') != commit:
+                continue
+            status = entry.get('status')
+            if status in ('success', 'retry'):
+                break
+            if status in ('failed', 'rejected'):
+                failures += 1
+                if last is None:
+                    last = entry
+                    rejected = status == 'rejected'
+
+        if last is None:
+            return None
+
+        last_failure = datetime.fromisoformat(last['timestamp'])
+        return QuarantineState(
+            commit=commit,
+            failures=failures,
+            last_error=last.get('message', ''),
+            last_failure=last_failure,
+            until=None if rejected else last_failure + self.backoff(failures)
+        )
+
+    def quarantine(self, commit: str, now: Optional[datetime] = None) -> Optional[QuarantineState]:
+        """Активный карантин коммита или None, если деплой разрешён"""
+        state = self.state(commit)
+        return state if state is not None and state.active(now) else None
+
+
+def request_retry(data_dir: str, commit: Optional[str] = None) -> Path:
+    """Запрос ручного повтора деплоя (commit=None - текущий удалённый коммит)"""
+    path = Path(data_dir) / RETRY_REQUEST_FILE
+    with open(path, 'w') as f:
+        json.dump({'commit': commit, 'requested_at': datetime.now().isoformat()}, f)
+    return path
+
+
+def take_retry_request(data_dir: str) -> Optional[Dict[str, Any]]:
+    """Чтение и удаление запроса ручного повтора"""
+    path = Path(data_dir) / RETRY_REQUEST_FILE
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r') as f:
+            request = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Invalid retry request: {e}")
+        request = {}
+    path.unlink(missing_ok=True)
+    return request
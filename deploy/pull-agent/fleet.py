@@ -0,0 +1,307 @@
+"""
+Согласованный деплой Pull-агентов на нескольких хостах
+
+Агенты всех хостов делят хранилище аренд (SQLite-файл FLEET_DB на
+общем томе; блокировки файла должны работать - локальный диск или
+NFSv4, не SMB). Перед fetch/сборкой нового коммита агент берёт аренду:
+
+- хосты разбиты на волны (FLEET_WAVES: `app-1; app-2,app-3; app-4`,
+  хосты вне списка - в последней волне); волна начинает, когда все
+  живые хосты предыдущих волн развернули коммит (хост без heartbeat
+  дольше FLEET_HOST_TIMEOUT не ждём)
+- одновременно деплоят (недоступны) не больше FLEET_MAX_UNAVAILABLE
+  хостов; аренда продлевается на каждом этапе и истекает через
+  FLEET_LEASE_TTL, если агент упал
+- первая неудача (сборка, миграция, health check) останавливает
+  выкатку коммита на остальные хосты до нового коммита или ручного
+  повтора (`retry`)
+
+Хост без аренды ставит коммит в очередь и повторяет попытку через
+FLEET_RETRY_INTERVAL.
+
+    python pull_agent_secure.py fleet [--resume COMMIT]
+"""
+import json
+import time
+import logging
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import FleetConfig
+from deploy_policy import PolicyDecision
+
+logger = logging.getLogger('fleet')
+
+KEEPALIVE_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    host TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL,
+    commit_sha TEXT
+);
+CREATE TABLE IF NOT EXISTS rollouts (
+    commit_sha TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    halted INTEGER NOT NULL DEFAULT 0,
+    reason TEXT
+);
+CREATE TABLE IF NOT EXISTS deploys (
+    commit_sha TEXT NOT NULL,
+    host TEXT NOT NULL,
+    status TEXT NOT NULL,
+    lease_until REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (commit_sha, host)
+);
+"""
+
+
+class FleetCoordinator:
+    """Волны и аренды деплоя через общее хранилище"""
+
+    def __init__(self, config: FleetConfig):
+        self.config = config
+        self.host = config.host_id
+        self._db: Optional[sqlite3.Connection] = None
+        self._lease: Optional[str] = None
+        self._beat_at: Optional[float] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            Path(self.config.db_path).parent.mkdir(parents=True, exist_ok=True)
+            # Транзакции управляются явно (BEGIN IMMEDIATE - блокировка на запись)
+            self._db = sqlite3.connect(self.config.db_path, timeout=30, isolation_level=None)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def wave_of(self, host: str) -> int:
+        for index, wave in enumerate(self.config.waves):
+            if host in wave:
+                return index
+        return len(self.config.waves)
+
+    def heartbeat(self, commit: Optional[str]):
+        """Отметка, что агент хоста жив (и какой коммит на нём развёрнут)"""
+        if not self.config.enabled:
+            return
+        self.db.execute(
+            "INSERT INTO members (host, last_seen, commit_sha) VALUES (?, ?, ?) "
+            "ON CONFLICT(host) DO UPDATE SET last_seen = excluded.last_seen, commit_sha = excluded.commit_sha",
+            (self.host, time.time(), commit)
+        )
+        self._beat_at = time.monotonic()
+
+    def keepalive(self):
+        """
+        Heartbeat из основного цикла и этапов деплоя - раз в минуту (чаще,
+        если треть FLEET_HOST_TIMEOUT короче): хост с редкими проверками
+        или недоступным git не выглядит для других волн мёртвым.
+        """
+        if not self.config.enabled:
+            return
+        interval = min(self.config.host_timeout / 3, KEEPALIVE_INTERVAL)
+        if self._beat_at is not None and time.monotonic() - self._beat_at < interval:
+            return
+        try:
+            # Развёрнутый коммит не трогаем: его отмечает heartbeat() после проверки
+            self.db.execute(
+                "INSERT INTO members (host, last_seen) VALUES (?, ?) "
+                "ON CONFLICT(host) DO UPDATE SET last_seen = excluded.last_seen",
+                (self.host, time.time())
+            )
+            self._beat_at = time.monotonic()
+        except sqlite3.Error as e:
+            logger.warning(f"Fleet heartbeat failed: {e}")
+
+    def _blocking_hosts(self, commit: str, now: float) -> List[str]:
+        """Живые хосты предыдущих волн, ещё не развернувшие коммит"""
+        earlier = [h for wave in self.config.waves[:self.wave_of(self.host)] for h in wave if h != self.host]
+        if not earlier:
+            return []
+        marks = ','.join('?' * len(earlier))
+        alive = {
+            host for (host,) in self.db.execute(
+                f"SELECT host FROM members WHERE host IN ({marks}) AND last_seen >= ?",
+                (*earlier, now - self.config.host_timeout)
+            )
+        }
+        done = {
+            host for (host,) in self.db.execute(
+                f"SELECT host FROM deploys WHERE commit_sha = ? AND status = 'success' AND host IN ({marks})",
+                (commit, *earlier)
+            )
+        }
+        return [h for h in earlier if h in alive and h not in done]
+
+    def acquire(self, commit: str, moment: datetime) -> PolicyDecision:
+        """
+        Аренда на деплой коммита этим хостом.
+
+        Args:
+            commit: Разворачиваемый коммит
+            moment: Текущее время политики деплоя (для времени повтора)
+        """
+        if not self.config.enabled:
+            return PolicyDecision(allowed=True)
+
+        retry_at = moment + timedelta(seconds=self.config.retry_interval)
+        now = time.time()
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            rollout = db.execute("SELECT halted, reason FROM rollouts WHERE commit_sha = ?", (commit,)).fetchone()
+            if rollout and rollout[0]:
+                db.execute('ROLLBACK')
+                return PolicyDecision(allowed=False, reason=f"fleet rollout halted ({rollout[1]})")
+
+            blocking = self._blocking_hosts(commit, now)
+            if blocking:
+                db.execute('ROLLBACK')
+                return PolicyDecision(
+                    allowed=False,
+                    reason=f"waiting for earlier wave ({', '.join(blocking)})",
+                    next_attempt=retry_at
+                )
+
+            (deploying,) = db.execute(
+                "SELECT COUNT(*) FROM deploys WHERE status = 'deploying' AND lease_until > ? AND host != ?",
+                (now, self.host)
+            ).fetchone()
+            if deploying >= self.config.max_unavailable:
+                db.execute('ROLLBACK')
+                return PolicyDecision(
+                    allowed=False,
+                    reason=f"{deploying} host(s) deploying, max unavailable {self.config.max_unavailable}",
+                    next_attempt=retry_at
+                )
+
+            db.execute(
+                "INSERT OR IGNORE INTO rollouts (commit_sha, started_at) VALUES (?, ?)",
+                (commit, now)
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO deploys (commit_sha, host, status, lease_until, updated_at) "
+                "VALUES (?, ?, 'deploying', ?, ?)",
+                (commit, self.host, now + self.config.lease_ttl, now)
+            )
+            db.execute('COMMIT')
+        except sqlite3.Error:
+            db.execute('ROLLBACK')
+            raise
+
+        self._lease = commit
+        logger.info(f"Fleet lease for {commit[:8]} acquired (wave {self.wave_of(self.host)})")
+        return PolicyDecision(allowed=True)
+
+    def renew(self):
+        """Продление аренды (на каждом этапе деплоя)"""
+        if self._lease is None:
+            return
+        try:
+            now = time.time()
+            self.db.execute(
+                "UPDATE deploys SET lease_until = ?, updated_at = ? "
+                "WHERE commit_sha = ? AND host = ? AND status = 'deploying'",
+                (now + self.config.lease_ttl, now, self._lease, self.host)
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Fleet lease renewal failed: {e}")
+
+    def _finish(self, status: str):
+        self.db.execute(
+            "UPDATE deploys SET status = ?, lease_until = NULL, updated_at = ? WHERE commit_sha = ? AND host = ?",
+            (status, time.time(), self._lease, self.host)
+        )
+
+    def complete(self):
+        """Коммит развёрнут на хосте: следующая волна может начинать"""
+        if self._lease is None:
+            return
+        self._finish('success')
+        self._lease = None
+
+    def fail(self, reason: str):
+        """Неудачный деплой: остановка выкатки коммита на остальные хосты"""
+        if self._lease is None:
+            return
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        self._finish('failed')
+        db.execute(
+            "UPDATE rollouts SET halted = 1, reason = ? WHERE commit_sha = ?",
+            (f"{self.host}: {reason}", self._lease)
+        )
+        db.execute('COMMIT')
+        logger.warning(f"Fleet rollout of {self._lease[:8]} halted: {reason}")
+        self._lease = None
+
+    def release(self):
+        """Снятие аренды без результата (деплой не начался или прерван)"""
+        if self._lease is None:
+            return
+        try:
+            self.db.execute(
+                "DELETE FROM deploys WHERE commit_sha = ? AND host = ? AND status = 'deploying'",
+                (self._lease, self.host)
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Fleet lease release failed: {e}")
+        self._lease = None
+
+    def resume(self, commit: str) -> int:
+        """Возобновление остановленной выкатки (коммит или его префикс)"""
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        rows = [c for (c,) in db.execute("SELECT commit_sha FROM rollouts WHERE commit_sha LIKE ?", (commit + '%',))]
+        for sha in rows:
+            db.execute("UPDATE rollouts SET halted = 0, reason = NULL WHERE commit_sha = ?", (sha,))
+            db.execute("DELETE FROM deploys WHERE commit_sha = ? AND status = 'failed'", (sha,))
+        db.execute('COMMIT')
+        return len(rows)
+
+    def status(self, limit: int = 5) -> Dict[str, Any]:
+        """Хосты и последние выкатки"""
+        now = time.time()
+        members = [
+            {
+                'host': host,
+                'wave': self.wave_of(host),
+                'commit': sha,
+                'last_seen_seconds': round(now - last_seen, 1),
+                'alive': now - last_seen <= self.config.host_timeout
+            }
+            for host, last_seen, sha in self.db.execute("SELECT host, last_seen, commit_sha FROM members ORDER BY host")
+        ]
+        rollouts = []
+        for sha, started_at, halted, reason in self.db.execute(
+            "SELECT commit_sha, started_at, halted, reason FROM rollouts ORDER BY started_at DESC LIMIT ?", (limit,)
+        ).fetchall():
+            hosts = {host: status for host, status in self.db.execute(
+                "SELECT host, status FROM deploys WHERE commit_sha = ?", (sha,)
+            )}
+            rollouts.append({
+                'commit': sha,
+                'started_at': datetime.fromtimestamp(started_at).isoformat(timespec='seconds'),
+                'halted': bool(halted),
+                'reason': reason,
+                'hosts': hosts
+            })
+        return {'host': self.host, 'members': members, 'rollouts': rollouts}
+
+
+def main(argv: List[str], config: FleetConfig):
+    """Команда состояния флота и возобновления выкатки"""
+    parser = argparse.ArgumentParser(prog='pull_agent_secure.py fleet', description='Fleet rollout status')
+    parser.add_argument('--resume', metavar='COMMIT', help='Resume a halted rollout')
+    args = parser.parse_args(argv)
+
+    coordinator = FleetCoordinator(config)
+    if args.resume:
+        print(f"Resumed {coordinator.resume(args.resume)} rollout(s)")
+        return
+    print(json.dumps(coordinator.status(), indent=2))
@@ -1,16 +1,52 @@
 #!/usr/bin/env python3
 """
 Health check скрипт для Pull-агента
+
+Один запрос GET /health к эндпоинту статуса агента (unix-сокет
+STATUS_SOCKET): ответ из памяти с состоянием watchdog, зависшая сборка
+или планировщик видны сразу по истечении допуска этапа. Если эндпоинта
+нет (pull_agent.py, STATUS_SOCKET пуст) - проверка файла статуса.
 """
 import os
 import sys
 import json
+import socket
 from datetime import datetime, timedelta
 from pathlib import Path
 
 
+def check_endpoint(path: str) -> bool:
+    """Запрос liveness к эндпоинту статуса"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(float(os.getenv('HEALTHCHECK_TIMEOUT', '3')))
+            sock.connect(path)
+            sock.sendall(b'GET /health HTTP/1.0\r\n\r\n')
+            response = b''
+            while chunk := sock.recv(4096):
+                response += chunk
+    except OSError as e:
+        print(f"Status endpoint unavailable: {e}")
+        return False
+    
+    head, _, body = response.partition(b'\r\n\r\n')
+    status_line = head.split(b'\r\n', 1)[0].decode('latin-1')
+    print(f"{status_line}: {body.decode(errors='replace')}")
+    parts = status_line.split()
+    return len(parts) > 1 and parts[1] == '200'
+
+
 def check_health() -> bool:
     """Проверка здоровья агента"""
+    socket_path = os.getenv('STATUS_SOCKET', '/tmp/pull-agent.sock')
+    if socket_path and os.path.exists(socket_path):
+        return check_endpoint(socket_path)
+    
+    return check_status_file()
+
+
+def check_status_file() -> bool:
+    """Проверка по файлу статуса (агент без эндпоинта статуса)"""
     data_dir = Path(os.getenv('DATA_DIR', '/app/data'))
     status_file = data_dir / 'agent_status.json'
     
@@ -0,0 +1,164 @@
+"""
+Сборка мусора образов и кэша сборки для Pull-агента
+
+- Сохраняются образы последних N успешных деплоев (по истории деплоев),
+  образы запущенных контейнеров и тег latest
+- Остальные теги образа приложения удаляются
+- Удаляются висячие (dangling) слои
+- Кэш BuildKit старше заданного возраста чистится до бюджета по размеру
+
+Работает только с репозиторием образа приложения (APP_IMAGE) и только
+через SecureDockerProxy: прокси проверяет, что репозиторий принадлежит
+разрешённому сервису, образы защищённых сервисов не затрагиваются.
+"""
+import json
+import time
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Set, Optional, Dict, Any, Callable
+
+from config import GCConfig
+from docker_proxy import SecureDockerProxy
+from metrics import MetricsStore
+
+logger = logging.getLogger('image-gc')
+
+
+@dataclass
+class GCResult:
+    """Итог сборки мусора"""
+    removed_tags: List[str] = field(default_factory=list)
+    images_bytes: int = 0
+    dangling_bytes: int = 0
+    build_cache_bytes: int = 0
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def freed_bytes(self) -> int:
+        return self.images_bytes + self.dangling_bytes + self.build_cache_bytes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'removed_tags': self.removed_tags,
+            'freed_bytes': self.freed_bytes,
+            'images_bytes': self.images_bytes,
+            'dangling_bytes': self.dangling_bytes,
+            'build_cache_bytes': self.build_cache_bytes,
+            'duration': round(self.duration, 3),
+            'error': self.error
+        }
+
+
+def successful_commits(history_file: Path, limit: int) -> List[str]:
+    """Последние limit уникальных успешно развёрнутых коммитов (новые первыми)"""
+    try:
+        with open(history_file, 'r') as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        return []
+
+    commits: List[str] = []
+    for entry in reversed(history):
+        commit = entry.get('commit')
+        if entry.get('status') == 'success' and commit and commit not in commits:
+            commits.append(commit)
+            if len(commits) >= limit:
+                break
+    return commits
+
+
+class ImageGarbageCollector:
+    """Очистка образов приложения и кэша сборки через безопасный прокси"""
+
+    def __init__(
+        self,
+        config: GCConfig,
+        docker_proxy: SecureDockerProxy,
+        image_repository: str,
+        tag_for: Callable[[str], str],
+        history_file: Path,
+        metrics: MetricsStore
+    ):
+        self.config = config
+        self.docker_proxy = docker_proxy
+        self.image_repository = image_repository
+        self.tag_for = tag_for
+        self.history_file = history_file
+        self.metrics = metrics
+
+    def _keep_tags(self, extra_commits: List[str]) -> Set[str]:
+        commits = successful_commits(self.history_file, self.config.keep_deploys)
+        tags = {self.tag_for(c) for c in commits + [c for c in extra_commits if c]}
+        tags.add('latest')
+        return tags
+
+    def _remove_old_images(self, keep_tags: Set[str], result: GCResult):
+        in_use = self.docker_proxy.image_ids_in_use()
+
+        for image in self.docker_proxy.images(self.image_repository):
+            if image['id'] in in_use:
+                continue
+
+            own_tags = [t for t in image['tags'] if t.rsplit(':', 1)[0] == self.image_repository]
+            stale = [t for t in own_tags if t.rsplit(':', 1)[1] not in keep_tags]
+            if not stale:
+                continue
+
+            for tag in stale:
+                self.docker_proxy.remove_image(tag)
+                result.removed_tags.append(tag)
+
+            # Место освобождается, только когда у образа не осталось тегов
+            if len(stale) == len(image['tags']):
+                result.images_bytes += image['size']
+
+    def _prune_dangling(self, result: GCResult):
+        result.dangling_bytes = self.docker_proxy.prune_images()
+
+    def _prune_build_cache(self, result: GCResult):
+        result.build_cache_bytes = self.docker_proxy.prune_build_cache(
+            self.config.build_cache_max_age,
+            self.config.build_cache_budget
+        )
+
+    def _record_metrics(self, result: GCResult):
+        self.metrics.set('gc_last_run_timestamp', time.time(), help='Unix time of the last GC run')
+        self.metrics.set('gc_duration_seconds', result.duration, help='Duration of the last GC run')
+        self.metrics.set('gc_freed_bytes', result.freed_bytes, help='Bytes freed by the last GC run')
+        self.metrics.inc('gc_freed_bytes_total', result.freed_bytes, help='Bytes freed by GC since start')
+        self.metrics.inc('gc_removed_images_total', len(result.removed_tags), help='Image tags removed by GC')
+        self.metrics.inc('gc_runs_total', labels={'status': 'error' if result.error else 'ok'}, help='GC runs')
+        self.metrics.write()
+
+    def run(self, extra_commits: Optional[List[str]] = None) -> GCResult:
+        """
+        Запуск сборки мусора.
+
+        Args:
+            extra_commits: Коммиты, образы которых нужно сохранить
+                (например, текущий развёрнутый)
+        """
+        started = time.monotonic()
+        result = GCResult()
+
+        try:
+            keep_tags = self._keep_tags(extra_commits or [])
+            logger.info(f"Running image GC, keeping tags: {sorted(keep_tags)}")
+
+            self._remove_old_images(keep_tags, result)
+            self._prune_dangling(result)
+            self._prune_build_cache(result)
+        except Exception as e:
+            logger.error(f"Image GC failed: {e}")
+            result.error = str(e)
+
+        result.duration = time.monotonic() - started
+        self._record_metrics(result)
+
+        logger.info(
+            f"Image GC finished in {result.duration:.1f}s: "
+            f"freed {result.freed_bytes} bytes, removed {len(result.removed_tags)} tags"
+        )
+        return result
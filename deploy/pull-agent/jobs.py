@@ -0,0 +1,157 @@
+"""
+Фоновые задачи Docker прокси
+
+Длительные операции (build, deploy, restart) выполняются в пуле потоков
+и сразу возвращают идентификатор задачи. Клиент опрашивает задачу или
+подписывается на поток её вывода. Для одного ключа (сервиса) в каждый
+момент выполняется не более одной задачи.
+"""
+import uuid
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger('proxy-jobs')
+
+
+class JobConflictError(Exception):
+    """Для ключа уже выполняется задача"""
+
+    def __init__(self, job: 'Job'):
+        super().__init__(f"Job {job.id} is already {job.status} for '{job.key}'")
+        self.job = job
+
+
+@dataclass
+class Job:
+    """Фоновая задача"""
+    id: str
+    operation: str
+    key: str
+    status: str = 'queued'
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    output: List[str] = field(default_factory=list)
+    _changed: threading.Condition = field(default_factory=threading.Condition, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ('succeeded', 'failed')
+
+    def append_output(self, line: str):
+        """Добавление строки вывода и пробуждение подписчиков"""
+        with self._changed:
+            self.output.append(line.rstrip('\n'))
+            self._changed.notify_all()
+
+    def _set_status(self, status: str, **fields):
+        with self._changed:
+            self.status = status
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._changed.notify_all()
+
+    def wait_for_output(self, offset: int, timeout: float) -> List[str]:
+        """Ожидание новых строк после offset (или завершения задачи)"""
+        with self._changed:
+            if len(self.output) <= offset and not self.done:
+                self._changed.wait(timeout)
+            return self.output[offset:]
+
+    def to_dict(self, output_offset: Optional[int] = None) -> Dict[str, Any]:
+        data = {
+            'id': self.id,
+            'operation': self.operation,
+            'key': self.key,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'error': self.error,
+            'output_lines': len(self.output)
+        }
+        if output_offset is not None:
+            data['output'] = self.output[output_offset:]
+        return data
+
+
+class JobManager:
+    """Очередь фоновых задач с ограничением по ключу"""
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_jobs: int = 100,
+        runner: Optional[Callable[[Job, Callable[[], Dict[str, Any]]], Dict[str, Any]]] = None
+    ):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='proxy-job')
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._active: Dict[str, Job] = {}
+        self._max_jobs = max_jobs
+        self._runner = runner or (lambda job, func: func())
+        self._lock = threading.Lock()
+
+    def submit(self, operation: str, key: str, func: Callable[[], Dict[str, Any]]) -> Job:
+        """
+        Постановка задачи в очередь.
+
+        Raises:
+            JobConflictError: для ключа уже есть незавершённая задача
+        """
+        with self._lock:
+            active = self._active.get(key)
+            if active and not active.done:
+                raise JobConflictError(active)
+
+            job = Job(id=uuid.uuid4().hex[:12], operation=operation, key=key)
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._evict()
+
+        self._executor.submit(self._run, job, func)
+        logger.info(f"Job {job.id} queued: {operation} {key}")
+        return job
+
+    def _evict(self):
+        """Удаление старых завершённых задач сверх лимита"""
+        while len(self._jobs) > self._max_jobs:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.done:
+                break
+            del self._jobs[oldest_id]
+
+    def _run(self, job: Job, func: Callable[[], Dict[str, Any]]):
+        job._set_status('running', started_at=datetime.now().isoformat())
+        try:
+            result = self._runner(job, func)
+            status = 'succeeded' if result.get('success') else 'failed'
+            job._set_status(
+                status,
+                result=result,
+                error=None if status == 'succeeded' else result.get('error') or result.get('stderr'),
+                finished_at=datetime.now().isoformat()
+            )
+        except Exception as e:
+            logger.error(f"Job {job.id} crashed: {e}")
+            job._set_status('failed', error=str(e), finished_at=datetime.now().isoformat())
+
+        logger.info(f"Job {job.id} {job.status}: {job.operation} {job.key}")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait)
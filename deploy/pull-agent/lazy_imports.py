@@ -0,0 +1,48 @@
+"""
+Отложенный импорт тяжёлых зависимостей Pull-агента
+
+Модуль импортируется при первом обращении к атрибуту, а не при
+загрузке агента: запуск агента и вспомогательных команд (retry, dora,
+startup) не платит за requests, yaml, docker SDK и smtplib, пока они
+не нужны. Все отложенные импорты агента - только здесь:
+
+    from lazy_imports import requests
+
+    requests.get(url)  # requests импортируется здесь
+"""
+import importlib
+import threading
+from types import ModuleType
+from typing import Optional
+
+
+class LazyModule:
+    """Модуль, импортируемый при первом обращении к атрибуту"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+requests = LazyModule('requests')
+yaml = LazyModule('yaml')
+docker = LazyModule('docker')
+schedule = LazyModule('schedule')
+smtplib = LazyModule('smtplib')
+mime_text = LazyModule('email.mime.text')
+mime_multipart = LazyModule('email.mime.multipart')
@@ -0,0 +1,224 @@
+"""
+Потоковая передача логов сервисов для Docker прокси
+
+На каждый сервис запускается не более одного процесса
+`docker-compose logs --follow`; его строки раздаются всем подписчикам.
+Последние строки хранятся в кольцевом буфере и отдаются подключившимся
+позже. У каждого подписчика ограниченная очередь: если клиент не успевает
+читать, новые строки для него пропускаются (с уведомлением о пропуске),
+а при слишком большом отставании подписка закрывается. Медленный клиент
+не замедляет чтение логов и остальных подписчиков.
+"""
+import queue
+import threading
+import logging
+import subprocess
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set
+
+from docker_proxy import SecureDockerProxy
+
+logger = logging.getLogger('log-stream')
+
+
+class LogSubscriber:
+    """Подписка клиента на логи сервиса"""
+
+    def __init__(self, service: str, backlog: List[str], max_pending: int):
+        self.service = service
+        self.backlog = backlog
+        self.max_pending = max_pending
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        self._queue: 'queue.Queue[Optional[str]]' = queue.Queue(maxsize=max_pending)
+        self._dropped = 0
+        self._dropped_total = 0
+        self._lock = threading.Lock()
+
+    def offer(self, line: str) -> bool:
+        """
+        Передача строки без блокировки читателя логов.
+
+        Returns:
+            False, если подписчик отстал слишком сильно и должен быть отключён
+        """
+        try:
+            self._queue.put_nowait(line)
+            return True
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+                self._dropped_total += 1
+                return self._dropped_total <= self.max_pending
+
+    def take_dropped(self) -> int:
+        """Число пропущенных строк с последнего вызова"""
+        with self._lock:
+            dropped, self._dropped = self._dropped, 0
+            return dropped
+
+    def get(self, timeout: float) -> Optional[str]:
+        """Следующая строка или None по таймауту (и после закрытия)"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self, reason: str):
+        self.closed = True
+        self.close_reason = reason
+        try:
+            self._queue.put_nowait(None)  # пробуждение ожидающего get()
+        except queue.Full:
+            pass
+
+
+class LogFollower:
+    """Один процесс `logs --follow` для сервиса и его подписчики"""
+
+    def __init__(
+        self,
+        service: str,
+        open_stream: Callable[[int], subprocess.Popen],
+        buffer_lines: int = 500,
+        max_pending: int = 1000,
+        idle_timeout: float = 30.0
+    ):
+        self.service = service
+        self._open_stream = open_stream
+        self._buffer: deque = deque(maxlen=buffer_lines)
+        self._max_pending = max_pending
+        self._idle_timeout = idle_timeout
+        self._subscribers: Set[LogSubscriber] = set()
+        self._process: Optional[subprocess.Popen] = None
+        self._idle_timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, backlog: int) -> LogSubscriber:
+        """Подписка с выдачей последних backlog строк из буфера"""
+        with self._lock:
+            if self._process is None:
+                self._process = self._open_stream(self._buffer.maxlen)
+                threading.Thread(
+                    target=self._pump,
+                    args=(self._process,),
+                    name=f'log-follow-{self.service}',
+                    daemon=True
+                ).start()
+
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+
+            recent = list(self._buffer)[-backlog:] if backlog > 0 else []
+            subscriber = LogSubscriber(self.service, recent, self._max_pending)
+            self._subscribers.add(subscriber)
+
+        return subscriber
+
+    def unsubscribe(self, subscriber: LogSubscriber):
+        """Отписка; процесс останавливается после простоя без подписчиков"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            if not self._subscribers and self._process is not None and self._idle_timer is None:
+                self._idle_timer = threading.Timer(self._idle_timeout, self._stop_if_idle)
+                self._idle_timer.daemon = True
+                self._idle_timer.start()
+
+    def _stop_if_idle(self):
+        with self._lock:
+            self._idle_timer = None
+            if self._subscribers or self._process is None:
+                return
+            process = self._process
+
+        logger.info(f"No log subscribers for {self.service}, stopping follower")
+        process.kill()
+
+    def _pump(self, process: subprocess.Popen):
+        """Чтение вывода процесса и раздача строк подписчикам"""
+        for raw in process.stdout:
+            line = raw.rstrip('\n')
+            with self._lock:
+                self._buffer.append(line)
+                subscribers = list(self._subscribers)
+
+            for subscriber in subscribers:
+                if not subscriber.offer(line):
+                    logger.warning(f"Disconnecting slow log subscriber for {self.service}")
+                    subscriber.close('slow reader')
+                    with self._lock:
+                        self._subscribers.discard(subscriber)
+
+        process.wait()
+        with self._lock:
+            if self._process is process:
+                self._process = None
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+
+        for subscriber in subscribers:
+            subscriber.close(f'log stream ended (exit code {process.returncode})')
+        logger.info(f"Log follower for {self.service} stopped")
+
+
+class LogStreamHub:
+    """Реестр LogFollower по сервисам"""
+
+    def __init__(
+        self,
+        proxy: SecureDockerProxy,
+        buffer_lines: int = 500,
+        max_pending: int = 1000,
+        idle_timeout: float = 30.0
+    ):
+        self.proxy = proxy
+        self.buffer_lines = buffer_lines
+        self.max_pending = max_pending
+        self.idle_timeout = idle_timeout
+        self._followers: Dict[str, LogFollower] = {}
+        self._lock = threading.Lock()
+
+    def _follower(self, service: str) -> LogFollower:
+        with self._lock:
+            follower = self._followers.get(service)
+            if follower is None:
+                follower = LogFollower(
+                    service,
+                    lambda tail: self.proxy.follow_logs(service, tail=tail),
+                    buffer_lines=self.buffer_lines,
+                    max_pending=self.max_pending,
+                    idle_timeout=self.idle_timeout
+                )
+                self._followers[service] = follower
+            return follower
+
+    def subscribe(self, service: str, backlog: int = 100) -> LogSubscriber:
+        """
+        Подписка на логи сервиса.
+
+        Raises:
+            DockerProxyError: сервис не разрешён или не описан в compose-файле
+        """
+        self.proxy.require_allowed(service)
+        return self._follower(service).subscribe(min(backlog, self.buffer_lines))
+
+    def unsubscribe(self, subscriber: LogSubscriber):
+        follower = self._followers.get(subscriber.service)
+        if follower is not None:
+            follower.unsubscribe(subscriber)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {
+                service: {'running': follower.running, 'subscribers': follower.subscriber_count}
+                for service, follower in self._followers.items()
+            }
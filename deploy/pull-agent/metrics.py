@@ -0,0 +1,74 @@
+"""
+Метрики Pull-агента
+
+Значения хранятся в памяти и сбрасываются в файл в текстовом формате
+Prometheus (textfile collector node_exporter или чтение напрямую).
+"""
+import os
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger('metrics')
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class MetricsStore:
+    """Простое хранилище gauge/counter метрик с выгрузкой в файл"""
+
+    def __init__(self, path: Path, prefix: str = 'pull_agent'):
+        self.path = Path(path)
+        self.prefix = prefix
+        self._values: Dict[str, Dict[LabelKey, float]] = {}
+        self._meta: Dict[str, Tuple[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Optional[Dict[str, str]]) -> LabelKey:
+        return tuple(sorted((labels or {}).items()))
+
+    def set(self, name: str, value: float, labels: Optional[Dict[str, str]] = None, help: str = ''):
+        """Установка gauge"""
+        with self._lock:
+            self._meta.setdefault(name, ('gauge', help))
+            self._values.setdefault(name, {})[self._key(labels)] = float(value)
+
+    def inc(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None, help: str = ''):
+        """Увеличение counter"""
+        with self._lock:
+            self._meta.setdefault(name, ('counter', help))
+            series = self._values.setdefault(name, {})
+            key = self._key(labels)
+            series[key] = series.get(key, 0.0) + value
+
+    def get(self, name: str, labels: Optional[Dict[str, str]] = None) -> Optional[float]:
+        with self._lock:
+            return self._values.get(name, {}).get(self._key(labels))
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus"""
+        lines = []
+        with self._lock:
+            for name in sorted(self._values):
+                full_name = f"{self.prefix}_{name}"
+                metric_type, help_text = self._meta[name]
+                if help_text:
+                    lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {metric_type}")
+                for labels, value in sorted(self._values[name].items()):
+                    label_str = ','.join(f'{k}="{v}"' for k, v in labels)
+                    series = f"{full_name}{{{label_str}}}" if label_str else full_name
+                    lines.append(f"{series} {int(value) if value.is_integer() else value}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        """Атомарная запись метрик в файл"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.path.with_suffix('.tmp')
+            with open(tmp_file, 'w') as f:
+                f.write(self.render())
+            os.replace(tmp_file, self.path)
+        except Exception as e:
+            logger.error(f"Failed to write metrics: {e}")
@@ -0,0 +1,181 @@
+"""
+Этап миграций БД (Drizzle) для Pull-агента
+
+Миграции запускаются, только если между развёрнутым и новым коммитом
+изменились файлы миграций (MIGRATION_PATHS, по умолчанию drizzle/):
+после сборки (или загрузки) образа и до запуска новой версии, в
+одноразовом контейнере `run --rm --no-deps app <MIGRATION_COMMAND>`.
+Схема не обновляется при старте приложения и не съедает время
+health check.
+
+Перед миграцией снимается снимок защищённого сервиса postgres
+(pg_dump -Fd: параллельно и со сжатием). Если миграция не удалась,
+база восстанавливается из снимка при откате. Длительности снимка
+и миграции пишутся в метрики и историю деплоев.
+"""
+import time
+import logging
+import subprocess
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from config import MigrationConfig
+from docker_proxy import SecureDockerProxy, DockerProxyError
+from metrics import MetricsStore
+
+logger = logging.getLogger('migrations')
+
+
+@dataclass
+class MigrationResult:
+    """Итог этапа миграций"""
+    success: bool
+    snapshot: Optional[str] = None
+    snapshot_seconds: float = 0.0
+    migration_seconds: float = 0.0
+    error: Optional[str] = None
+
+    def describe(self) -> str:
+        parts = [f"migration {self.migration_seconds:.1f}s"]
+        if self.snapshot:
+            parts.append(f"snapshot {self.snapshot} {self.snapshot_seconds:.1f}s")
+        return ', '.join(parts)
+
+
+class MigrationRunner:
+    """Снимок БД, миграции и восстановление при неудаче"""
+
+    def __init__(
+        self,
+        config: MigrationConfig,
+        docker_proxy: SecureDockerProxy,
+        repo_dir: str,
+        metrics: Optional[MetricsStore] = None
+    ):
+        self.config = config
+        self.docker_proxy = docker_proxy
+        self.repo_dir = Path(repo_dir)
+        self.metrics = metrics
+
+    def changed_files(self, old_commit: str, new_commit: str) -> Optional[List[str]]:
+        """Изменённые файлы миграций между коммитами (None - git недоступен)"""
+        try:
+            result = subprocess.run(
+                ['git', 'diff', '--name-only', old_commit, new_commit, '--', *self.config.paths],
+                cwd=self.repo_dir,
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"git diff failed: {e}")
+            return None
+        if result.returncode != 0:
+            logger.warning(f"git diff failed: {result.stderr.strip()}")
+            return None
+        return [line for line in result.stdout.splitlines() if line]
+
+    def needed(self, old_commit: Optional[str], new_commit: str) -> bool:
+        """
+        Нужны ли миграции для перехода old_commit -> new_commit.
+
+        Без предыдущего коммита или при ошибке git миграции запускаются
+        (drizzle-kit migrate пропускает уже применённые).
+        """
+        if not self.config.enabled:
+            return False
+        if not old_commit:
+            return True
+        changed = self.changed_files(old_commit, new_commit)
+        if changed is None:
+            return True
+        if changed:
+            logger.info(f"Migration files changed: {changed}")
+        return bool(changed)
+
+    def _record(self, name: str, value: float, help: str):
+        if self.metrics is not None:
+            self.metrics.set(name, value, help=help)
+            self.metrics.write()
+
+    def _snapshot(self, commit: str, result: MigrationResult) -> bool:
+        name = f"{datetime.now():%Y%m%d-%H%M%S}-{commit[:12]}"
+        started = time.monotonic()
+        snapshot = self.docker_proxy.snapshot_database(
+            name,
+            self.config.snapshot_dir,
+            jobs=self.config.snapshot_jobs,
+            compression=self.config.snapshot_compression,
+            keep=self.config.snapshot_keep,
+            timeout=self.config.timeout
+        )
+        result.snapshot_seconds = round(time.monotonic() - started, 2)
+        self._record('db_snapshot_duration_seconds', result.snapshot_seconds, 'Duration of the pre-migration database snapshot')
+
+        if not snapshot['success']:
+            result.error = f"Database snapshot failed: {snapshot['stderr'].strip()}"
+            return False
+
+        result.snapshot = name
+        logger.info(f"Database snapshot {name} taken in {result.snapshot_seconds:.1f}s")
+        return True
+
+    def run(self, commit: str, service: Optional[str] = None, image_tag: Optional[str] = None) -> MigrationResult:
+        """
+        Снимок БД и миграции на образе нового коммита.
+
+        При неудачном снимке миграции не запускаются (схема не тронута).
+        """
+        result = MigrationResult(success=False)
+        service = service or self.config.service
+
+        try:
+            if self.config.snapshot and not self._snapshot(commit, result):
+                return result
+
+            started = time.monotonic()
+            migration = self.docker_proxy.run_task(
+                service,
+                self.config.command,
+                timeout=self.config.timeout,
+                image_tag=image_tag
+            )
+            result.migration_seconds = round(time.monotonic() - started, 2)
+            self._record('migration_duration_seconds', result.migration_seconds, 'Duration of the database migration stage')
+        except DockerProxyError as e:
+            result.error = str(e)
+            return result
+
+        if not migration['success']:
+            output = (migration['stderr'] or migration['stdout']).strip()
+            result.error = f"Migration failed: {output[-2000:]}"
+            return result
+
+        result.success = True
+        logger.info(f"Migrations applied in {result.migration_seconds:.1f}s")
+        return result
+
+    def restore(self, snapshot: str) -> bool:
+        """Восстановление БД из снимка"""
+        started = time.monotonic()
+        try:
+            restored = self.docker_proxy.restore_database(
+                snapshot,
+                self.config.snapshot_dir,
+                jobs=self.config.snapshot_jobs,
+                timeout=self.config.timeout
+            )
+        except DockerProxyError as e:
+            logger.error(f"Database restore failed: {e}")
+            return False
+
+        duration = round(time.monotonic() - started, 2)
+        self._record('db_restore_duration_seconds', duration, 'Duration of the database restore from snapshot')
+        if not restored['success']:
+            logger.error(f"Database restore from {snapshot} failed: {restored['stderr'].strip()}")
+            return False
+
+        logger.info(f"Database restored from {snapshot} in {duration:.1f}s")
+        return True
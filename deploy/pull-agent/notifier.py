@@ -1,27 +1,215 @@
 """
 Модуль уведомлений для Pull-агента
 Поддерживает Slack, Telegram и Email
+
+Живое сообщение деплоя (NOTIFY_LIVE): между begin_live() и end_live()
+уведомления в Telegram и Slack (бот) не создают новые сообщения, а
+редактируют одно (editMessageText / chat.update) - заголовок и уровень
+последнего события, журнал событий и текущий этап. Правки не чаще
+NOTIFY_LIVE_INTERVAL: промежуточные состояния схлопываются, последнее
+отправляется таймером или при end_live(). Ответ 429 (Telegram
+retry_after, Slack Retry-After) сдвигает следующую правку; последнее
+состояние после end_live() повторяется отдельно (до FINAL_RETRIES раз).
+Email и Slack webhook получают уведомления как обычно.
 """
 import json
+import time
 import logging
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Optional
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
-import requests
-
 from config import NotificationConfig
+from lazy_imports import requests, smtplib, mime_text, mime_multipart
 
 logger = logging.getLogger(__name__)
 
+SLACK_API = 'https://slack.com/api'
+
+# Повторы последней правки живого сообщения после ответа 429
+FINAL_RETRIES = 3
+
+TELEGRAM_EMOJI = {
+    'info': 'ℹ️',
+    'warning': '⚠️',
+    'error': '❌',
+    'success': '✅'
+}
+
+
+class RateLimitedError(Exception):
+    """Ответ 429 API мессенджера: повтор не раньше retry_after секунд"""
+
+    def __init__(self, method: str, retry_after: float):
+        super().__init__(f"{method}: rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+@dataclass
+class LiveMessage:
+    """Состояние живого сообщения деплоя"""
+    title: str
+    message: str
+    level: str
+    details: Dict[str, Any]
+    events: List[str] = field(default_factory=list)
+    stage: Optional[str] = None
+    telegram_id: Optional[int] = None
+    slack: Optional[Tuple[str, str]] = None  # (channel, ts)
+    pushed_at: float = 0.0
+    dirty: bool = False
+    final_retries: int = 0
+    
+    def render(self) -> Tuple[str, str]:
+        """Заголовок и текст сообщения"""
+        lines = [self.message, '']
+        lines += self.events
+        if self.stage and self.level == 'info':
+            lines.append(f"⏳ Этап: {self.stage}")
+        return self.title, '\n'.join(lines).strip()
+
 
 class Notifier:
     """Класс для отправки уведомлений"""
     
     def __init__(self, config: NotificationConfig):
         self.config = config
+        self._live: Optional[LiveMessage] = None
+        # Состояние живого сообщения; HTTP-запросы - вне этой блокировки
+        self._live_lock = threading.RLock()
+        # Правки одного сообщения уходят по очереди (id сообщения известен до правки)
+        self._live_send_lock = threading.Lock()
+        self._live_timer: Optional[threading.Timer] = None
+    
+    @property
+    def _live_channels(self) -> bool:
+        return self.config.has_telegram or self.config.has_slack_bot
+    
+    def begin_live(self, title: str, message: str, details: Optional[dict] = None) -> bool:
+        """
+        Начало живого сообщения деплоя (без NOTIFY_LIVE - обычное info).
+        
+        Returns:
+            True если сообщение отправлено хотя бы в один канал
+        """
+        if not (self.config.live_updates and self._live_channels):
+            return self.info(title, message, details)
+        
+        self.end_live()
+        with self._live_lock:
+            live = LiveMessage(title=title, message=message, level='info', details=dict(details or {}))
+            live.events.append(f"{datetime.now():%H:%M:%S} {title}")
+            live.dirty = True
+            self._live = live
+        self._flush_live(live)
+        
+        # Каналы без редактирования - как обычно
+        self._send_static(title, message, 'info', details)
+        return True
+    
+    def stage(self, name: str):
+        """Текущий этап деплоя в живом сообщении"""
+        with self._live_lock:
+            live = self._live
+            if live is None or live.stage == name:
+                return
+            live.stage = name
+            push = self._schedule_live()
+        if push:
+            self._flush_live(live)
+    
+    def end_live(self):
+        """Отправка последнего состояния и завершение живого сообщения"""
+        with self._live_lock:
+            if self._live_timer is not None:
+                self._live_timer.cancel()
+                self._live_timer = None
+            live, self._live = self._live, None
+        if live is not None:
+            self._flush_live(live)
+    
+    def _update_live(self, title: str, message: str, level: str, details: Optional[dict]) -> bool:
+        """Новое событие в живом сообщении (под _live_lock); True - отправить сразу"""
+        live = self._live
+        live.title = title
+        live.message = message
+        live.level = level
+        live.details.update(details or {})
+        live.events.append(f"{datetime.now():%H:%M:%S} {TELEGRAM_EMOJI.get(level, '')} {title}")
+        return self._schedule_live()
+    
+    def _schedule_live(self) -> bool:
+        """
+        Правка сразу или таймером по истечении интервала (троттлинг).
+        Вызывается под _live_lock; True - вызывающий отправляет правку
+        сам, после снятия блокировки.
+        """
+        live = self._live
+        live.dirty = True
+        wait = self.config.live_interval - (time.monotonic() - live.pushed_at)
+        if wait <= 0:
+            return True
+        self._start_live_timer(wait)
+        return False
+    
+    def _start_live_timer(self, wait: float):
+        if self._live_timer is None:
+            self._live_timer = threading.Timer(wait, self._on_live_timer)
+            self._live_timer.daemon = True
+            self._live_timer.start()
+    
+    def _on_live_timer(self):
+        with self._live_lock:
+            self._live_timer = None
+            live = self._live
+        if live is not None:
+            self._flush_live(live)
+    
+    def _flush_live(self, live: LiveMessage):
+        """Отправка правки: текст собирается под _live_lock, запросы - без неё"""
+        with self._live_send_lock:
+            with self._live_lock:
+                if not live.dirty:
+                    return
+                live.dirty = False
+                live.pushed_at = time.monotonic()
+                title, text = live.render()
+                level, details = live.level, dict(live.details)
+                telegram_id, slack = live.telegram_id, live.slack
+            
+            retry_after = 0.0
+            if self.config.has_telegram:
+                try:
+                    telegram_id = self._telegram_live(telegram_id, title, text, level, details)
+                except RateLimitedError as e:
+                    retry_after = max(retry_after, e.retry_after)
+            if self.config.has_slack_bot:
+                try:
+                    slack = self._slack_live(slack, title, text, level, details)
+                except RateLimitedError as e:
+                    retry_after = max(retry_after, e.retry_after)
+            
+            with self._live_lock:
+                live.telegram_id, live.slack = telegram_id, slack
+                if not retry_after:
+                    return
+                # Ответ 429 сдвигает следующую правку
+                live.dirty = True
+                live.pushed_at = time.monotonic() + retry_after
+                if self._live is live:
+                    self._start_live_timer(retry_after)
+                    return
+                if live.final_retries >= FINAL_RETRIES:
+                    logger.error("Live message final state not delivered: rate limited")
+                    return
+                live.final_retries += 1
+            
+            # После end_live() таймер живого сообщения не действует - отдельный повтор
+            logger.warning(f"Live message rate limited, retrying final state in {retry_after}s")
+            retry = threading.Timer(retry_after, self._flush_live, args=(live,))
+            retry.daemon = True
+            retry.start()
     
     def send(
         self,
@@ -42,6 +230,15 @@ class Notifier:
         Returns:
             True если хотя бы одно уведомление отправлено
         """
+        with self._live_lock:
+            live = self._live
+            push = live is not None and self._update_live(title, message, level, details)
+        if live is not None:
+            if push:
+                self._flush_live(live)
+            self._send_static(title, message, level, details)
+            return True
+        
         success = False
         
         if self.config.has_slack:
@@ -58,6 +255,15 @@ class Notifier:
         
         return success
     
+    def _send_static(self, title: str, message: str, level: str, details: Optional[dict]) -> bool:
+        """Каналы без живого сообщения: Slack webhook (без бота) и Email"""
+        success = False
+        if self.config.slack_webhook and not self.config.has_slack_bot:
+            success = self._send_slack(title, message, level, details) or success
+        if self.config.has_email:
+            success = self._send_email(title, message, level, details) or success
+        return success
+    
     def _send_slack(
         self,
         title: str,
@@ -65,63 +271,13 @@ class Notifier:
         level: str,
         details: Optional[dict]
     ) -> bool:
-        """Отправка в Slack"""
+        """Отправка в Slack (webhook или бот)"""
         try:
-            color_map = {
-                'info': '#36a64f',
-                'warning': '#ff9800',
-                'error': '#f44336',
-                'success': '#4caf50'
-            }
-            
-            emoji_map = {
-                'info': ':information_source:',
-                'warning': ':warning:',
-                'error': ':x:',
-                'success': ':white_check_mark:'
-            }
-            
-            payload = {
-                'attachments': [{
-                    'color': color_map.get(level, '#36a64f'),
-                    'blocks': [
-                        {
-                            'type': 'header',
-                            'text': {
-                                'type': 'plain_text',
-                                'text': f"{emoji_map.get(level, '')} {title}",
-                                'emoji': True
-                            }
-                        },
-                        {
-                            'type': 'section',
-                            'text': {
-                                'type': 'mrkdwn',
-                                'text': message
-                            }
-                        },
-                        {
-                            'type': 'context',
-                            'elements': [{
-                                'type': 'mrkdwn',
-                                'text': f"🕐 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Scoliologic Pull Agent"
-                            }]
-                        }
-                    ]
-                }]
-            }
-            
-            if details:
-                fields = []
-                for key, value in details.items():
-                    fields.append({
-                        'type': 'mrkdwn',
-                        'text': f"*{key}:* {value}"
-                    })
-                payload['attachments'][0]['blocks'].insert(2, {
-                    'type': 'section',
-                    'fields': fields
-                })
+            payload = {'attachments': self._slack_attachments(title, message, level, details)}
+            if self.config.has_slack_bot and not self.config.slack_webhook:
+                self._slack_api('chat.postMessage', {'channel': self.config.slack_channel, **payload})
+                logger.info("Slack notification sent")
+                return True
             
             response = requests.post(
                 self.config.slack_webhook,
@@ -136,6 +292,102 @@ class Notifier:
             logger.error(f"Failed to send Slack notification: {e}")
             return False
     
+    def _slack_api(self, method: str, payload: dict) -> dict:
+        """Вызов Slack Web API (ошибки приходят с кодом 200 и ok=false)"""
+        response = requests.post(
+            f"{SLACK_API}/{method}",
+            json=payload,
+            headers={'Authorization': f"Bearer {self.config.slack_bot_token}"},
+            timeout=10
+        )
+        if response.status_code == 429:
+            # Лимит Slack (Tier 3 для chat.update): повтор не раньше Retry-After
+            raise RateLimitedError(method, float(response.headers.get('Retry-After', 1)))
+        response.raise_for_status()
+        data = response.json()
+        if not data.get('ok'):
+            raise RuntimeError(f"Slack {method}: {data.get('error')}")
+        return data
+    
+    def _slack_live(
+        self,
+        message: Optional[Tuple[str, str]],
+        title: str,
+        text: str,
+        level: str,
+        details: dict
+    ) -> Optional[Tuple[str, str]]:
+        """Создание или правка живого сообщения в Slack; (channel, ts)"""
+        payload = {'attachments': self._slack_attachments(title, text, level, details)}
+        try:
+            if message is None:
+                data = self._slack_api('chat.postMessage', {'channel': self.config.slack_channel, **payload})
+                return data['channel'], data['ts']
+            self._slack_api('chat.update', {'channel': message[0], 'ts': message[1], **payload})
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to update Slack live message: {e}")
+        return message
+    
+    @staticmethod
+    def _slack_attachments(title: str, message: str, level: str, details: Optional[dict]) -> List[dict]:
+        color_map = {
+            'info': '#36a64f',
+            'warning': '#ff9800',
+            'error': '#f44336',
+            'success': '#4caf50'
+        }
+        
+        emoji_map = {
+            'info': ':information_source:',
+            'warning': ':warning:',
+            'error': ':x:',
+            'success': ':white_check_mark:'
+        }
+        
+        attachments = [{
+            'color': color_map.get(level, '#36a64f'),
+            'blocks': [
+                {
+                    'type': 'header',
+                    'text': {
+                        'type': 'plain_text',
+                        'text': f"{emoji_map.get(level, '')} {title}",
+                        'emoji': True
+                    }
+                },
+                {
+                    'type': 'section',
+                    'text': {
+                        'type': 'mrkdwn',
+                        'text': message
+                    }
+                },
+                {
+                    'type': 'context',
+                    'elements': [{
+                        'type': 'mrkdwn',
+                        'text': f"🕐 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} | Scoliologic Pull Agent"
+                    }]
+                }
+            ]
+        }]
+        
+        if details:
+            fields = []
+            for key, value in details.items():
+                fields.append({
+                    'type': 'mrkdwn',
+                    'text': f"*{key}:* {value}"
+                })
+            attachments[0]['blocks'].insert(2, {
+                'type': 'section',
+                'fields': fields
+            })
+        
+        return attachments
+    
     def _send_telegram(
         self,
         title: str,
@@ -145,32 +397,7 @@ class Notifier:
     ) -> bool:
         """Отправка в Telegram"""
         try:
-            emoji_map = {
-                'info': 'ℹ️',
-                'warning': '⚠️',
-                'error': '❌',
-                'success': '✅'
-            }
-            
-            text = f"{emoji_map.get(level, 'ℹ️')} *{title}*\n\n{message}"
-            
-            if details:
-                text += "\n\n📋 *Детали:*"
-                for key, value in details.items():
-                    text += f"\n• {key}: `{value}`"
-            
-            text += f"\n\n🕐 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            
-            url = f"https://api.telegram.org/bot{self.config.telegram_token}/sendMessage"
-            payload = {
-                'chat_id': self.config.telegram_chat_id,
-                'text': text,
-                'parse_mode': 'Markdown',
-                'disable_web_page_preview': True
-            }
-            
-            response = requests.post(url, json=payload, timeout=10)
-            response.raise_for_status()
+            self._telegram_api('sendMessage', self._telegram_payload(title, message, level, details))
             logger.info("Telegram notification sent")
             return True
             
@@ -178,6 +405,54 @@ class Notifier:
             logger.error(f"Failed to send Telegram notification: {e}")
             return False
     
+    def _telegram_payload(self, title: str, message: str, level: str, details: Optional[dict]) -> dict:
+        text = f"{TELEGRAM_EMOJI.get(level, 'ℹ️')} *{title}*\n\n{message}"
+        
+        if details:
+            text += "\n\n📋 *Детали:*"
+            for key, value in details.items():
+                text += f"\n• {key}: `{value}`"
+        
+        text += f"\n\n🕐 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        
+        return {
+            'chat_id': self.config.telegram_chat_id,
+            'text': text,
+            'parse_mode': 'Markdown',
+            'disable_web_page_preview': True
+        }
+    
+    def _telegram_api(self, method: str, payload: dict) -> dict:
+        url = f"https://api.telegram.org/bot{self.config.telegram_token}/{method}"
+        response = requests.post(url, json=payload, timeout=10)
+        if response.status_code == 429:
+            # Лимит Telegram: следующая правка не раньше retry_after
+            raise RateLimitedError(method, response.json().get('parameters', {}).get('retry_after', 1))
+        response.raise_for_status()
+        return response.json()
+    
+    def _telegram_live(
+        self,
+        message_id: Optional[int],
+        title: str,
+        text: str,
+        level: str,
+        details: dict
+    ) -> Optional[int]:
+        """Создание или правка живого сообщения в Telegram; message_id"""
+        payload = self._telegram_payload(title, text, level, details)
+        try:
+            if message_id is None:
+                return self._telegram_api('sendMessage', payload)['result']['message_id']
+            self._telegram_api('editMessageText', {**payload, 'message_id': message_id})
+        except RateLimitedError:
+            raise
+        except Exception as e:
+            # 400 "message is not modified" - текст не изменился, не ошибка
+            if 'not modified' not in str(getattr(getattr(e, 'response', None), 'text', '')):
+                logger.error(f"Failed to update Telegram live message: {e}")
+        return message_id
+    
     def _send_email(
         self,
         title: str,
@@ -187,7 +462,7 @@ class Notifier:
     ) -> bool:
         """Отправка Email"""
         try:
-            msg = MIMEMultipart('alternative')
+            msg = mime_multipart.MIMEMultipart('alternative')
             msg['Subject'] = f"[Scoliologic] {title}"
             msg['From'] = self.config.email_from
             msg['To'] = self.config.email_to
@@ -239,8 +514,8 @@ class Notifier:
             </html>
             """
             
-            msg.attach(MIMEText(text_content, 'plain'))
-            msg.attach(MIMEText(html_content, 'html'))
+            msg.attach(mime_text.MIMEText(text_content, 'plain'))
+            msg.attach(mime_text.MIMEText(html_content, 'html'))
             
             with smtplib.SMTP(self.config.email_smtp_host, self.config.email_smtp_port) as server:
                 server.starttls()
@@ -0,0 +1,154 @@
+"""
+Адаптивный интервал проверок Pull-агента
+
+Интенсивность коммитов по часам недели (в часовом поясе политики
+деплоя) оценивается за POLL_LOOKBACK_DAYS (не меньше 7) по времени
+коммитов ветки в локальном зеркале git и по истории деплоев (коммиты,
+которых в зеркале ещё нет). Интервал обратно пропорционален активности часа:
+
+- час вдвое активнее среднего - проверки вдвое чаще CHECK_INTERVAL,
+  час без коммитов - POLL_MAX_INTERVAL
+- после нового коммита в течение BURST_WINDOW - POLL_MIN_INTERVAL
+  (коммиты приходят сериями)
+- случайный сдвиг ±POLL_JITTER, чтобы агенты многих хостов не
+  опрашивали git одновременно
+
+Итог всегда в пределах POLL_MIN_INTERVAL..POLL_MAX_INTERVAL. Без
+POLL_ADAPTIVE интервал - CHECK_INTERVAL со сдвигом.
+"""
+import json
+import time
+import random
+import logging
+import subprocess
+from datetime import datetime, tzinfo
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import PollingConfig
+
+logger = logging.getLogger('poll-schedule')
+
+HOURS_PER_WEEK = 7 * 24
+# Меньше коммитов за период - оценке не доверяем, интервал CHECK_INTERVAL
+MIN_SAMPLES = 10
+BURST_WINDOW = 3600
+LEARN_INTERVAL = 3600
+
+
+class AdaptivePoller:
+    """Интервал до следующей проверки по истории коммитов"""
+
+    def __init__(
+        self,
+        config: PollingConfig,
+        check_interval: int,
+        repo_dir: str,
+        branch: str,
+        history_file: Path,
+        tz: Optional[tzinfo] = None
+    ):
+        self.config = config
+        self.check_interval = check_interval
+        self.repo_dir = repo_dir
+        self.branch = branch
+        self.history_file = history_file
+        self.tz = tz
+        self._rates: Optional[List[float]] = None
+        self._mean_rate = 0.0
+        self._learned_at = 0.0
+        self._last_remote: Optional[str] = None
+        self._last_change: Optional[float] = None
+
+    def _git_commit_times(self, since: float) -> Dict[str, float]:
+        try:
+            result = subprocess.run(
+                ['git', 'log', f'--since={int(since)}', '--format=%H %ct', f'origin/{self.branch}'],
+                cwd=self.repo_dir, capture_output=True, text=True, timeout=30
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"git log failed: {e}")
+            return {}
+        if result.returncode != 0:
+            return {}
+        times = {}
+        for line in result.stdout.splitlines():
+            sha, _, moment = line.partition(' ')
+            if moment:
+                times[sha] = float(moment)
+        return times
+
+    def _history_commit_times(self, since: float) -> Dict[str, float]:
+        """Первое появление коммита в истории деплоев"""
+        try:
+            with open(self.history_file) as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        times: Dict[str, float] = {}
+        for entry in history:
+            try:
+                moment = datetime.fromisoformat(entry['timestamp']).timestamp()
+            except (KeyError, TypeError, ValueError):
+                continue
+            commit = entry.get('commit')
+            if commit and moment >= since and commit not in times:
+                times[commit] = moment
+        return times
+
+    def learn(self):
+        """Интенсивность коммитов (в час) для каждого часа недели"""
+        now = time.time()
+        since = now - self.config.lookback_days * 86400
+        times = {**self._history_commit_times(since), **self._git_commit_times(since)}
+        self._learned_at = now
+
+        if len(times) < MIN_SAMPLES:
+            self._rates = None
+            logger.debug(f"Not enough commits to learn polling ({len(times)})")
+            return
+
+        counts = [0] * HOURS_PER_WEEK
+        for moment in times.values():
+            local = datetime.fromtimestamp(moment, self.tz)
+            counts[local.weekday() * 24 + local.hour] += 1
+
+        # POLL_LOOKBACK_DAYS не меньше недели (проверка конфигурации)
+        weeks = self.config.lookback_days / 7
+        # Сглаживание соседними часами: граница часа не должна менять интервал скачком
+        self._rates = [
+            (counts[h - 1] + 2 * counts[h] + counts[(h + 1) % HOURS_PER_WEEK]) / 4 / weeks
+            for h in range(HOURS_PER_WEEK)
+        ]
+        # Среднее тех же часовых оценок - за тот же период
+        self._mean_rate = sum(self._rates) / HOURS_PER_WEEK
+        logger.info(f"Learned commit activity from {len(times)} commits over {self.config.lookback_days} days")
+
+    def observe(self, remote_commit: str):
+        """Коммит ветки на текущей проверке (новый - начало серии)"""
+        if self._last_remote is not None and remote_commit != self._last_remote:
+            self._last_change = time.time()
+        self._last_remote = remote_commit
+
+    def _adaptive_interval(self) -> float:
+        if self._last_change is not None and time.time() - self._last_change < BURST_WINDOW:
+            return self.config.min_interval
+
+        if time.time() - self._learned_at >= LEARN_INTERVAL:
+            self.learn()
+        if self._rates is None:
+            return self.check_interval
+
+        local = datetime.now(self.tz)
+        rate = self._rates[local.weekday() * 24 + local.hour]
+        if rate <= 0:
+            return self.config.max_interval
+        return self.check_interval * self._mean_rate / rate
+
+    def next_interval(self) -> float:
+        """Секунды до следующей проверки"""
+        interval = self._adaptive_interval() if self.config.adaptive else self.check_interval
+        interval *= 1 + random.uniform(-self.config.jitter, self.config.jitter)
+        if self.config.adaptive:
+            interval = min(max(interval, self.config.min_interval), self.config.max_interval)
+        return max(interval, 1.0)
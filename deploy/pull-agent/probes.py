@@ -0,0 +1,184 @@
+"""
+Параллельные проверки здоровья для Pull-агента
+
+Все реплики приложения и зависимые сервисы (postgres, redis, ollama)
+обнаруживаются одним вызовом `ps`, после чего проверяются одновременно:
+состояние контейнера (running + Docker healthcheck) и, если для сервиса
+задан HTTP-адрес, запрос к каждой реплике. Результат по сервису
+считается успешным при доле здоровых реплик не ниже кворума.
+
+Исход проверки решают только PROBE_SERVICES (по умолчанию app).
+Зависимости (PROBE_DEPENDENCIES) попадают в отчёт и лог, но деплой не
+откатывают: деплой app не чинит упавший ollama или redis.
+"""
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+from config import ProbeConfig
+from docker_proxy import SecureDockerProxy
+from lazy_imports import requests
+
+logger = logging.getLogger('probes')
+
+
+@dataclass
+class ReplicaProbe:
+    """Результат проверки одной реплики"""
+    service: str
+    name: str
+    state: str
+    health: str
+    healthy: bool
+    http_status: Optional[int] = None
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class ServiceProbe:
+    """Агрегированный результат по сервису"""
+    service: str
+    replicas: List[ReplicaProbe] = field(default_factory=list)
+    required: int = 1
+
+    @property
+    def healthy_count(self) -> int:
+        return sum(1 for r in self.replicas if r.healthy)
+
+    @property
+    def healthy(self) -> bool:
+        return bool(self.replicas) and self.healthy_count >= self.required
+
+
+@dataclass
+class ProbeReport:
+    """Итог проверки всех сервисов"""
+    services: Dict[str, ServiceProbe] = field(default_factory=dict)
+    dependencies: Dict[str, ServiceProbe] = field(default_factory=dict)
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.error is None and all(s.healthy for s in self.services.values())
+
+    @property
+    def failing(self) -> List[str]:
+        return [name for name, s in self.services.items() if not s.healthy]
+
+    @property
+    def degraded_dependencies(self) -> List[str]:
+        return [name for name, s in self.dependencies.items() if not s.healthy]
+
+    @staticmethod
+    def _services_dict(services: Dict[str, ServiceProbe]) -> Dict[str, Any]:
+        return {
+            name: {
+                'healthy': s.healthy,
+                'healthy_replicas': s.healthy_count,
+                'total_replicas': len(s.replicas),
+                'required': s.required,
+                'replicas': [r.__dict__ for r in s.replicas]
+            }
+            for name, s in services.items()
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'healthy': self.healthy,
+            'duration': round(self.duration, 3),
+            'error': self.error,
+            'services': self._services_dict(self.services),
+            'dependencies': self._services_dict(self.dependencies)
+        }
+
+
+class ProbeEngine:
+    """Одновременная проверка всех реплик и зависимостей"""
+
+    def __init__(self, config: ProbeConfig, docker_proxy: SecureDockerProxy):
+        self.config = config
+        self.docker_proxy = docker_proxy
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """HTTP-сессия проб (requests импортируется при первой проверке)"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = requests.Session()
+        return self._session
+
+    def _required(self, total: int) -> int:
+        return max(1, math.ceil(total * self.config.quorum))
+
+    def _probe_replica(self, service: str, container: Dict[str, Any]) -> ReplicaProbe:
+        name = container.get('Name', service)
+        probe = ReplicaProbe(
+            service=service,
+            name=name,
+            state=container.get('State', 'unknown'),
+            health=container.get('Health') or 'unknown',
+            healthy=SecureDockerProxy.container_healthy(container)
+        )
+
+        target = self.config.http_targets.get(service)
+        if not probe.healthy or not target:
+            return probe
+
+        url = target.format(name=name, service=service)
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, timeout=self.config.timeout)
+            probe.http_status = response.status_code
+            probe.healthy = response.status_code == 200
+        except requests.RequestException as e:
+            probe.error = str(e)
+            probe.healthy = False
+        probe.latency_ms = round((time.monotonic() - started) * 1000, 1)
+
+        return probe
+
+    def run(self, services: Optional[List[str]] = None) -> ProbeReport:
+        """Проверка сервисов (по умолчанию из конфигурации) и зависимостей"""
+        started = time.monotonic()
+        services = services or self.config.services
+        dependencies = [s for s in self.config.dependencies if s not in services]
+        report = ProbeReport(
+            services={s: ServiceProbe(service=s) for s in services},
+            dependencies={s: ServiceProbe(service=s) for s in dependencies}
+        )
+        targets = {**report.services, **report.dependencies}
+
+        discovered = self.docker_proxy.containers(services + dependencies)
+        if not discovered['success']:
+            report.error = discovered['error']
+            report.duration = time.monotonic() - started
+            return report
+
+        jobs = [
+            (service, container)
+            for service, containers in discovered['containers'].items()
+            for container in containers
+        ]
+
+        if jobs:
+            workers = min(self.config.max_workers, len(jobs))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(lambda job: self._probe_replica(*job), jobs))
+
+            for probe in results:
+                targets[probe.service].replicas.append(probe)
+
+        for service_probe in targets.values():
+            service_probe.required = self._required(len(service_probe.replicas))
+
+        report.duration = time.monotonic() - started
+        return report
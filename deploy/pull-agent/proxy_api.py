@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+HTTP API Docker прокси
+
+- Длительные операции (deploy, build, restart) выполняются фоновыми
+  задачами: ответ 202 с идентификатором задачи, статус в /jobs/<id>,
+  поток вывода (Server-Sent Events) в /jobs/<id>/stream
+- Операции чтения (status, logs, ps) выполняются сразу и не ждут сборок
+- Логи сервиса в реальном времени (Server-Sent Events) в /logs/<service>/stream
+- Изменения состояния контейнеров: long-poll /events?since=<version>
+  и поток /events/stream
+- Многопоточный WSGI сервер (waitress, при отсутствии - threaded werkzeug)
+- Потоки и long-poll занимают поток сервера на всё время ответа: их
+  не больше PROXY_MAX_STREAMS (по умолчанию PROXY_THREADS - 4), сверх
+  лимита - 503 с Retry-After, чтобы status, health и постановка задач
+  не ждали свободного потока
+"""
+import os
+import json
+import math
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from flask import Flask, Response, request, jsonify
+
+from docker_proxy import SecureDockerProxy, DockerProxyError, BuildDeferredError, create_proxy_from_env
+from jobs import JobManager, JobConflictError
+from log_stream import LogStreamHub
+
+logger = logging.getLogger('docker-proxy-api')
+
+
+def _error_response(e: DockerProxyError):
+    status = 503 if isinstance(e, BuildDeferredError) else 403
+    return jsonify({'success': False, 'error': str(e)}), status
+
+
+class BadArgumentError(ValueError):
+    """Неверный параметр запроса (ответ 400)"""
+    pass
+
+
+def _number_arg(name: str, default: Any, cast: Callable[[str], Any] = int) -> Any:
+    """Неотрицательное число из query-параметра"""
+    value = request.args.get(name)
+    if value is None:
+        return default
+    try:
+        number = cast(value)
+    except ValueError:
+        raise BadArgumentError(f"Query parameter '{name}' must be a number")
+    if not math.isfinite(number) or number < 0:
+        raise BadArgumentError(f"Query parameter '{name}' must be a non-negative number")
+    return number
+
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def _busy_response():
+    response = jsonify({'success': False, 'error': 'Too many open streams, retry later'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '5'
+    return response
+
+
+def create_app(proxy: SecureDockerProxy, jobs: JobManager, log_hub: LogStreamHub, max_streams: int = 12) -> Flask:
+    """
+    Создание Flask-приложения прокси
+
+    Args:
+        max_streams: Одновременных потоков SSE и long-poll /events
+    """
+    app = Flask(__name__)
+    stream_slots = threading.BoundedSemaphore(max_streams)
+
+    def stream_response(events: Callable[[], Any], release: Optional[Callable[[], None]] = None) -> Response:
+        """Поток SSE; слот (и подписка) освобождаются при закрытии ответа сервером"""
+        response = Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+        response.call_on_close(stream_slots.release)
+        if release is not None:
+            response.call_on_close(release)
+        return response
+
+    @app.errorhandler(BadArgumentError)
+    def bad_argument(e: BadArgumentError):
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    def submit(operation: str, service: str, func: Callable[[], Dict[str, Any]]):
+        """Постановка задачи; ?wait=true - синхронный ответ (совместимость)"""
+        try:
+            proxy.require_allowed(service)
+            job = jobs.submit(operation, service, func)
+        except DockerProxyError as e:
+            return _error_response(e)
+        except JobConflictError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'job_id': e.job.id,
+                'status_url': f'/jobs/{e.job.id}'
+            }), 409
+
+        if request.args.get('wait', 'false').lower() == 'true':
+            while not job.done:
+                job.wait_for_output(len(job.output), 5)
+            return jsonify(job.result or {'success': False, 'error': job.error})
+
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': f'/jobs/{job.id}',
+            'stream_url': f'/jobs/{job.id}/stream'
+        }), 202
+
+    @app.route('/health', methods=['GET'])
+    def health():
+        return jsonify({'status': 'ok'})
+
+    @app.route('/deploy/<service>', methods=['POST'])
+    def deploy(service):
+        no_cache = request.args.get('no_cache', 'true').lower() == 'true'
+        return submit('deploy', service, lambda: proxy.deploy(service, no_cache=no_cache))
+
+    @app.route('/build/<service>', methods=['POST'])
+    def build(service):
+        no_cache = request.args.get('no_cache', 'false').lower() == 'true'
+        return submit('build', service, lambda: proxy.build(service, no_cache=no_cache))
+
+    @app.route('/restart/<service>', methods=['POST'])
+    def restart(service):
+        return submit('restart', service, lambda: proxy.restart(service))
+
+    @app.route('/jobs', methods=['GET'])
+    def list_jobs():
+        return jsonify({'jobs': [job.to_dict() for job in jobs.list()]})
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        job = jobs.get(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        offset = _number_arg('since', 0)
+        return jsonify(job.to_dict(output_offset=offset))
+
+    @app.route('/jobs/<job_id>/stream', methods=['GET'])
+    def stream_job(job_id):
+        job = jobs.get(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+
+        start_offset = _number_arg('since', 0)
+        if not stream_slots.acquire(blocking=False):
+            return _busy_response()
+
+        def events():
+            offset = start_offset
+            while True:
+                lines = job.wait_for_output(offset, 15)
+                for line in lines:
+                    yield _sse({'line': line})
+                offset += len(lines)
+
+                if job.done and offset >= len(job.output):
+                    yield _sse(job.to_dict(), event='done')
+                    return
+                if not lines:
+                    yield ": keepalive\n\n"
+
+        return stream_response(events)
+
+    @app.route('/logs/<service>', methods=['GET'])
+    def logs(service):
+        if request.args.get('follow', 'false').lower() == 'true':
+            return stream_logs(service)
+        try:
+            lines = _number_arg('lines', 100)
+            result = proxy.logs(service, lines=lines)
+            return jsonify(result)
+        except DockerProxyError as e:
+            return _error_response(e)
+
+    @app.route('/logs/<service>/stream', methods=['GET'])
+    def stream_logs(service):
+        backlog = _number_arg('lines', 100)
+        if not stream_slots.acquire(blocking=False):
+            return _busy_response()
+        try:
+            subscriber = log_hub.subscribe(service, backlog=backlog)
+        except DockerProxyError as e:
+            stream_slots.release()
+            return _error_response(e)
+
+        def events():
+            for line in subscriber.backlog:
+                yield _sse({'line': line})
+            while True:
+                dropped = subscriber.take_dropped()
+                if dropped:
+                    yield _sse({'count': dropped}, event='dropped')
+
+                line = subscriber.get(15)
+                if line is not None:
+                    yield _sse({'line': line})
+                elif subscriber.closed:
+                    yield _sse({'reason': subscriber.close_reason}, event='end')
+                    return
+                else:
+                    yield ": keepalive\n\n"
+
+        return stream_response(events, lambda: log_hub.unsubscribe(subscriber))
+
+    @app.route('/status/<service>', methods=['GET'])
+    def status(service):
+        try:
+            result = proxy.health_check(service)
+            return jsonify(result)
+        except DockerProxyError as e:
+            return _error_response(e)
+
+    @app.route('/events', methods=['GET'])
+    def state_events():
+        since = _number_arg('since', 0)
+        timeout = min(_number_arg('timeout', 30, float), 60)
+        if not stream_slots.acquire(blocking=False):
+            return _busy_response()
+        try:
+            return jsonify(proxy.state_changes(since, timeout))
+        except DockerProxyError as e:
+            return jsonify({'success': False, 'error': str(e)}), 404
+        finally:
+            stream_slots.release()
+
+    @app.route('/events/stream', methods=['GET'])
+    def stream_state_events():
+        if proxy.state_cache is None:
+            return jsonify({'success': False, 'error': 'Status cache is disabled'}), 404
+
+        start_version = _number_arg('since', 0)
+        if not stream_slots.acquire(blocking=False):
+            return _busy_response()
+
+        def events():
+            since = start_version
+            while True:
+                result = proxy.state_changes(since, 15)
+                if result['reset']:
+                    yield _sse(result, event='snapshot')
+                for change in result['changes']:
+                    yield _sse(change, event='change')
+                if result['version'] == since:
+                    yield ": keepalive\n\n"
+                since = result['version']
+
+        return stream_response(events)
+
+    @app.route('/ps', methods=['GET'])
+    def ps():
+        result = proxy.ps()
+        return jsonify(result)
+
+    return app
+
+
+def create_job_manager(proxy: SecureDockerProxy) -> JobManager:
+    """Менеджер задач, передающий вывод docker-compose в задачу"""
+    def runner(job, func):
+        with proxy.stream_output_to(job.append_output):
+            return func()
+
+    return JobManager(
+        max_workers=int(os.environ.get('PROXY_JOB_WORKERS', 2)),
+        max_jobs=int(os.environ.get('PROXY_MAX_JOBS', 100)),
+        runner=runner
+    )
+
+
+def main():
+    """Запуск HTTP API прокси"""
+    logging.basicConfig(level=logging.INFO)
+
+    proxy = create_proxy_from_env()
+    log_hub = LogStreamHub(
+        proxy,
+        buffer_lines=int(os.environ.get('PROXY_LOG_BUFFER_LINES', 500)),
+        max_pending=int(os.environ.get('PROXY_LOG_MAX_PENDING', 1000))
+    )
+    host = os.environ.get('PROXY_HOST', '0.0.0.0')
+    port = int(os.environ.get('PROXY_PORT', 8080))
+    threads = int(os.environ.get('PROXY_THREADS', 16))
+    # Хотя бы несколько потоков сервера остаются коротким запросам
+    max_streams = int(os.environ.get('PROXY_MAX_STREAMS', max(threads - 4, 1)))
+    if max_streams >= threads:
+        logger.warning(f"PROXY_MAX_STREAMS={max_streams} leaves no threads for short requests, using {max(threads - 1, 1)}")
+        max_streams = max(threads - 1, 1)
+    app = create_app(proxy, create_job_manager(proxy), log_hub, max_streams=max_streams)
+
+    try:
+        from waitress import serve
+    except ImportError:
+        logger.warning("waitress is not installed, using threaded werkzeug server")
+        app.run(host=host, port=port, threaded=True)
+        return
+
+    logger.info(f"Docker proxy API listening on {host}:{port} ({threads} threads)")
+    serve(app, host=host, port=port, threads=threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,10 +10,14 @@ Scoliologic Patient App
 - Автоматический rollback при ошибках
 - Уведомления в Slack/Telegram/Email
 """
+import time
+
+# Отсчёт времени старта до импорта зависимостей
+STARTED_AT = time.monotonic()
+
 import os
 import sys
 import json
-import time
 import signal
 import logging
 import subprocess
@@ -22,11 +26,8 @@ from pathlib import Path
 from typing import Optional, Tuple
 import hashlib
 
-import docker
-import requests
-import schedule
-
-from config import config, AgentConfig
+from config import AgentConfig, load_config
+from lazy_imports import docker, requests, schedule
 from notifier import Notifier
 
 # Настройка логирования
@@ -47,7 +48,7 @@ class PullAgent:
     def __init__(self, config: AgentConfig):
         self.config = config
         self.notifier = Notifier(config.notification)
-        self.docker_client = docker.from_env()
+        self._docker_client = None
         self.running = True
         self.last_commit: Optional[str] = None
         self.consecutive_errors = 0
@@ -63,6 +64,16 @@ class PullAgent:
         # Обработка сигналов
         signal.signal(signal.SIGTERM, self._handle_signal)
         signal.signal(signal.SIGINT, self._handle_signal)
+        
+        self.startup_seconds = round(time.monotonic() - STARTED_AT, 4)
+        logger.info(f"Agent ready in {self.startup_seconds:.3f}s")
+    
+    @property
+    def docker_client(self):
+        """Клиент Docker SDK (создаётся при первом обращении)"""
+        if self._docker_client is None:
+            self._docker_client = docker.from_env()
+        return self._docker_client
     
     def _handle_signal(self, signum, frame):
         """Обработка сигналов остановки"""
@@ -88,7 +99,8 @@ class PullAgent:
                 'last_commit': self.last_commit,
                 'status': status,
                 'consecutive_errors': self.consecutive_errors,
-                'error': error
+                'error': error,
+                'startup_seconds': self.startup_seconds
             }
             with open(self.status_file, 'w') as f:
                 json.dump(state, f, indent=2)
@@ -298,8 +310,8 @@ class PullAgent:
                 self._save_state('ok')
                 return
             
-            # Уведомляем о начале деплоя
-            self.notifier.info(
+            # Уведомляем о начале деплоя (NOTIFY_LIVE - одно обновляемое сообщение)
+            self.notifier.begin_live(
                 "Начало деплоя",
                 f"Обнаружен новый коммит. Начинаю развёртывание...",
                 {'Коммит': remote_commit[:8], 'Ветка': self.config.git.branch}
@@ -397,6 +409,8 @@ class PullAgent:
                 f"Произошла непредвиденная ошибка: {e}",
                 {'Ошибок подряд': self.consecutive_errors}
             )
+        finally:
+            self.notifier.end_live()
     
     def run(self):
         """Запуск агента"""
@@ -440,7 +454,7 @@ class PullAgent:
 
 def main():
     """Точка входа"""
-    agent = PullAgent(config)
+    agent = PullAgent(load_config())
     agent.run()
 
 
@@ -12,35 +12,65 @@ Scoliologic Patient App
 - Автоматический rollback при ошибках
 - Уведомления в Slack/Telegram/Email
 """
+import time
+
+# Отсчёт времени старта до импорта зависимостей
+STARTED_AT = time.monotonic()
+
 import os
 import sys
 import json
-import time
+import uuid
 import signal
 import logging
-from datetime import datetime
+from dataclasses import asdict
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Tuple, Dict, Any
+from typing import Callable, Optional, Tuple, Dict, Any, List
 import subprocess
 
-import requests
-import schedule
-
-from config import config, AgentConfig
+from config import AgentConfig, ConfigError, config_file_path, load_config
 from notifier import Notifier
 from docker_proxy import SecureDockerProxy, ProxyConfig, DockerProxyError
+from canary import CanaryDeployer
+from resources import BuildLimits, LoadGateConfig
+from registry import ImageRegistry
+from image_gc import ImageGarbageCollector
+from metrics import MetricsStore
+from probes import ProbeEngine
+from validation import PreDeployValidator
+from worktrees import WorktreeManager, WorktreeError
+from failure_ledger import FailureLedger, request_retry, take_retry_request
+from deploy_policy import DeployPolicy, PolicyDecision
+from migrations import MigrationRunner, MigrationResult
+from status_server import StatusServer, Watchdog
+from dora import DoraAggregator
+from config_watch import ConfigWatcher
+from fleet import FleetCoordinator
+from build_cache import SharedBuildCache
+from warmup import ColdStartProfiler, ColdStart
+from poll_schedule import AdaptivePoller
+from lazy_imports import requests, schedule, yaml
+
+from structured_logging import setup_logging, log_context, update_context
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('/app/data/agent.log')
-    ]
-)
 logger = logging.getLogger('pull-agent-secure')
 
+IMPORTED_AT = time.monotonic()
+
+# Поля, которые применяются только при перезапуске агента (секция целиком - None)
+RESTART_ONLY = {
+    'git': None,
+    'docker': None,
+    'data_dir': None,
+    'log': ('format', 'file', 'max_bytes', 'backup_count', 'idle_sample_interval'),
+    'watchdog': ('socket_path',),
+    'deploy': ('strategy', 'services'),
+    'canary': ('service',),
+    'migration': ('enabled', 'database_service'),
+    'build_cache': ('backend', 'directory')
+}
+
 
 class SecurePullAgent:
     """
@@ -51,35 +81,272 @@ class SecurePullAgent:
     
     def __init__(self, config: AgentConfig):
         self.config = config
-        self.notifier = Notifier(config.notification)
         self.running = True
         self.last_commit: Optional[str] = None
+        self.queued_commit: Optional[str] = None
+        self.queued_until: Optional[datetime] = None
+        self.deploy_services: List[str] = ['app']
+        self.next_check_at: Optional[float] = None
         self.consecutive_errors = 0
         self.status_file = Path(config.data_dir) / 'agent_status.json'
         self.history_file = Path(config.data_dir) / 'deploy_history.json'
-        
-        # Инициализация безопасного Docker прокси
-        proxy_config = ProxyConfig(
-            allowed_services=['app'],  # Только app сервис
-            protected_services=['postgres', 'redis', 'ollama'],  # Защищённые сервисы
-            compose_file=config.docker.compose_file,
-            project_name='scoliologic'
-        )
-        self.docker_proxy = SecureDockerProxy(proxy_config)
-        
-        # Создаём директорию данных
-        Path(config.data_dir).mkdir(parents=True, exist_ok=True)
+        self.metrics = MetricsStore(Path(config.data_dir) / 'metrics.prom')
+        self.dora = DoraAggregator(config.data_dir, config.git.local_path)
+        self.watchdog = Watchdog(config.watchdog)
+        self.status_server: Optional[StatusServer] = None
+        self.state: Dict[str, Any] = {'status': 'starting'}
         
         # Загружаем последний известный коммит
         self._load_state()
         
+        # Рабочие копии по коммитам; compose-файл читается через ссылку current
+        # (активная копия выбирается в _start)
+        self.worktrees: Optional[WorktreeManager] = None
+        compose_file = config.docker.compose_file
+        if config.git.worktrees:
+            self.worktrees = WorktreeManager(
+                config.git.local_path,
+                str(Path(config.data_dir) / 'worktrees'),
+                keep=config.git.worktree_keep
+            )
+            relative = os.path.relpath(config.docker.compose_file, config.git.local_path)
+            compose_file = str(self.worktrees.active_path() / relative)
+        
+        self.docker_proxy = self._create_docker_proxy(compose_file)
+        self.migration_result: Optional[MigrationResult] = None
+        self.cold_start: Optional[ColdStart] = None
+        
+        # Компоненты, зависящие от перечитываемой конфигурации
+        self._apply_components(self._build_components(config))
+        if self.queued_until is not None:
+            self.queued_until = self._policy_time(self.queued_until)
+        
+        # Файл конфигурации: изменения применяются между деплоями
+        self.config_path = config_file_path()
+        self.config_watcher: Optional[ConfigWatcher] = None
+        
+        logger.info("Secure Pull Agent initialized")
+        logger.info(f"Allowed services: {self.docker_proxy.config.allowed_services}")
+        logger.info(f"Protected services: {self.docker_proxy.config.protected_services}")
+        logger.info(f"Deploy strategy: {config.deploy.strategy}")
+        logger.info(f"Deploy source: {'registry ' + config.registry.image if config.registry.enabled else 'local build'}")
+        
+        self.startup: Dict[str, float] = {
+            'import_seconds': round(IMPORTED_AT - STARTED_AT, 4),
+            'init_seconds': round(time.monotonic() - IMPORTED_AT, 4),
+            'startup_seconds': round(time.monotonic() - STARTED_AT, 4)
+        }
+        logger.info(f"Agent ready in {self.startup['startup_seconds']:.3f}s", extra=self.startup)
+    
+    def _create_docker_proxy(self, compose_file: str) -> SecureDockerProxy:
+        """Безопасный Docker прокси для compose-файла"""
+        protected_services = ['postgres', 'redis', 'ollama']  # Защищённые сервисы
+        allowed_services = ['app']  # app и сервисы из DEPLOY_SERVICES
+        for service in self.config.deploy.services:
+            if service in protected_services:
+                logger.error(f"Service '{service}' is protected and will not be deployed")
+            elif service not in allowed_services:
+                allowed_services.append(service)
+        reverse_proxy_service = None
+        if self.config.deploy.is_canary:
+            allowed_services.append(self.config.canary.service)
+            reverse_proxy_service = os.getenv('REVERSE_PROXY_SERVICE', 'nginx')
+        
+        return SecureDockerProxy(ProxyConfig(
+            allowed_services=allowed_services,
+            protected_services=protected_services,
+            compose_file=compose_file,
+            project_name='scoliologic',
+            reverse_proxy_service=reverse_proxy_service,
+            database_service=self.config.migration.database_service if self.config.migration.enabled else None,
+            build_limits=BuildLimits.from_env(),
+            load_gate=LoadGateConfig.from_env(),
+            backend=os.getenv('DOCKER_PROXY_BACKEND', 'engine')
+        ))
+    
+    def _start(self):
+        """
+        Действия при запуске (не в конструкторе: команда startup создаёт
+        агента только для замера и ничего не меняет): каталог данных,
+        активная рабочая копия, сигналы, метрика времени старта.
+        """
+        Path(self.config.data_dir).mkdir(parents=True, exist_ok=True)
+        if self.worktrees is not None:
+            self._init_worktrees()
+        
         # Обработка сигналов
         signal.signal(signal.SIGTERM, self._handle_signal)
         signal.signal(signal.SIGINT, self._handle_signal)
         
-        logger.info("Secure Pull Agent initialized")
-        logger.info(f"Allowed services: {proxy_config.allowed_services}")
-        logger.info(f"Protected services: {proxy_config.protected_services}")
+        self.metrics.set('startup_seconds', self.startup['startup_seconds'], help='Time from process start to agent ready')
+        self.metrics.write()
+    
+    def _build_components(self, config: AgentConfig) -> Dict[str, Any]:
+        """Компоненты агента для конфигурации (docker proxy и worktrees общие)"""
+        registry = ImageRegistry(config.registry)
+        policy = DeployPolicy(config.policy, self.history_file)
+        return {
+            'notifier': Notifier(config.notification),
+            'failure_ledger': FailureLedger(
+                self.history_file,
+                backoff_base=config.deploy.failure_backoff_base,
+                backoff_max=config.deploy.failure_backoff_max
+            ),
+            'policy': policy,
+            'poller': AdaptivePoller(
+                config.polling,
+                config.check_interval,
+                repo_dir=config.git.local_path,
+                branch=config.git.branch,
+                history_file=self.history_file,
+                tz=policy.tz
+            ),
+            'canary': CanaryDeployer(config.canary, self.docker_proxy, stable_service='app'),
+            'registry': registry,
+            'probe_engine': ProbeEngine(config.probe, self.docker_proxy),
+            'migrations': MigrationRunner(
+                config.migration,
+                self.docker_proxy,
+                repo_dir=config.git.local_path,
+                metrics=self.metrics
+            ),
+            'validator': PreDeployValidator(
+                config.validation,
+                repo_dir=config.git.local_path,
+                compose_file=config.docker.compose_file,
+                required_services=list(self.docker_proxy.config.allowed_services),
+                work_dir=str(Path(config.data_dir) / 'validate')
+            ),
+            'image_gc': ImageGarbageCollector(
+                config.gc,
+                self.docker_proxy,
+                image_repository=config.registry.image,
+                tag_for=registry.tag_for,
+                history_file=self.history_file,
+                metrics=self.metrics
+            ),
+            'fleet': FleetCoordinator(config.fleet),
+            'profiler': ColdStartProfiler(config.warmup, config.deploy, self.docker_proxy, metrics=self.metrics),
+            'build_cache': SharedBuildCache(config.build_cache, self.docker_proxy, registry, metrics=self.metrics)
+        }
+    
+    def _apply_components(self, components: Dict[str, Any]):
+        """Подмена компонентов, собранных _build_components"""
+        self.notifier: Notifier = components['notifier']
+        self.failure_ledger: FailureLedger = components['failure_ledger']
+        self.policy: DeployPolicy = components['policy']
+        self.poller: AdaptivePoller = components['poller']
+        self.canary: CanaryDeployer = components['canary']
+        self.registry: ImageRegistry = components['registry']
+        self.probe_engine: ProbeEngine = components['probe_engine']
+        self.migrations: MigrationRunner = components['migrations']
+        self.validator: PreDeployValidator = components['validator']
+        self.image_gc: ImageGarbageCollector = components['image_gc']
+        self.fleet: FleetCoordinator = components['fleet']
+        self.profiler: ColdStartProfiler = components['profiler']
+        self.build_cache: SharedBuildCache = components['build_cache']
+    
+    def _reload_config(self) -> bool:
+        """
+        Перечитывание файла конфигурации между деплоями.
+        
+        Новая конфигурация применяется целиком (все компоненты собираются
+        заранее и подменяются разом) или не применяется вовсе: при ошибке
+        схемы агент продолжает работать со старой.
+        """
+        try:
+            new_config = load_config(self.config_path)
+            components = self._build_components(self._keep_restart_only(new_config))
+        except (ConfigError, ValueError) as e:
+            logger.error(f"Config reload rejected, keeping current config: {e}")
+            self.notifier.warning("Конфигурация не применена", str(e))
+            return False
+        
+        old_config = self.config
+        self._apply_components(components)
+        self.config = new_config
+        self.watchdog.config = new_config.watchdog
+        logging.getLogger().setLevel(new_config.log.level.upper())
+        if (
+            new_config.check_interval != old_config.check_interval
+            or new_config.polling != old_config.polling
+            or new_config.gc != old_config.gc
+        ):
+            self._schedule_jobs()
+        
+        changed = [
+            name for name in vars(new_config)
+            if getattr(new_config, name) != getattr(old_config, name)
+        ]
+        logger.info(f"Config reloaded from {self.config_path}: changed {changed or 'nothing'}")
+        return True
+    
+    def _keep_restart_only(self, new_config: AgentConfig) -> AgentConfig:
+        """Значения, требующие перезапуска, остаются прежними (с предупреждением)"""
+        for section, fields in RESTART_ONLY.items():
+            if fields is None:
+                old, new = getattr(self.config, section), getattr(new_config, section)
+                if old != new:
+                    logger.warning(f"Config {section} changed, restart the agent to apply it")
+                    setattr(new_config, section, old)
+                continue
+            for name in fields:
+                old_section, new_section = getattr(self.config, section), getattr(new_config, section)
+                if getattr(old_section, name) != getattr(new_section, name):
+                    logger.warning(f"Config {section}.{name} changed, restart the agent to apply it")
+                    setattr(new_section, name, getattr(old_section, name))
+        return new_config
+    
+    def _schedule_jobs(self):
+        """Плановые проверки и очистка по текущей конфигурации"""
+        schedule.clear()
+        self._schedule_check()
+        if self.config.gc.enabled:
+            schedule.every(self.config.gc.interval).seconds.do(self.run_gc)
+    
+    def _schedule_check(self):
+        """Следующая проверка через интервал адаптивного планировщика"""
+        interval = self.poller.next_interval()
+        self.next_check_at = time.monotonic() + interval
+        self.metrics.set('poll_interval_seconds', round(interval, 1), help='Interval until the next check')
+        self.metrics.write()
+        logger.debug(f"Next check in {interval:.0f}s")
+    
+    def _init_worktrees(self):
+        """
+        Активная рабочая копия при старте. Если worktree недоступны,
+        деплой идёт из основной копии: прокси и компоненты пересоздаются
+        для её compose-файла.
+        """
+        try:
+            if self.worktrees.active_commit() is None:
+                self.worktrees.activate(self.last_commit or 'HEAD')
+        except WorktreeError as e:
+            logger.error(f"Worktrees unavailable, deploying from {self.config.git.local_path}: {e}")
+            self.worktrees = None
+            self.docker_proxy = self._create_docker_proxy(self.config.docker.compose_file)
+            self._apply_components(self._build_components(self.config))
+    
+    def _stage(self, name: str):
+        """Переход к этапу: поле stage в логах и heartbeat watchdog"""
+        update_context(stage=name)
+        self.watchdog.beat(name)
+        self.fleet.renew()
+        self.fleet.keepalive()
+        self.notifier.stage(name)
+    
+    def _status(self) -> Dict[str, Any]:
+        """Состояние для эндпоинта статуса (последняя проверка и текущие поля)"""
+        return {
+            **self.state,
+            'last_commit': self.last_commit,
+            'queued_commit': self.queued_commit,
+            'consecutive_errors': self.consecutive_errors,
+            'next_check_seconds': (
+                round(self.next_check_at - time.monotonic(), 1) if self.next_check_at is not None else None
+            ),
+            'startup': self.startup
+        }
     
     def _handle_signal(self, signum, frame):
         """Обработка сигналов остановки"""
@@ -93,27 +360,34 @@ class SecurePullAgent:
                 with open(self.status_file, 'r') as f:
                     state = json.load(f)
                     self.last_commit = state.get('last_commit')
-                    logger.info(f"Loaded state: last_commit={self.last_commit}")
+                    # Отложенный деплой ждёт окна и после перезапуска
+                    self.queued_commit = state.get('queued_commit')
+                    if self.queued_commit and state.get('queued_until'):
+                        self.queued_until = datetime.fromisoformat(state['queued_until'])
+                    logger.info(f"Loaded state: last_commit={self.last_commit}, queued_commit={self.queued_commit}")
         except Exception as e:
             logger.warning(f"Failed to load state: {e}")
     
     def _save_state(self, status: str = 'ok', error: Optional[str] = None):
-        """Сохранение состояния в файл"""
+        """Сохранение состояния в память (эндпоинт статуса) и в файл"""
+        self.state = {
+            'last_check': datetime.now().isoformat(),
+            'last_commit': self.last_commit,
+            'queued_commit': self.queued_commit,
+            'queued_until': self.queued_until.isoformat() if self.queued_until else None,
+            'status': status,
+            'consecutive_errors': self.consecutive_errors,
+            'error': error,
+            'startup': self.startup,
+            'mode': 'secure'  # Отметка о безопасном режиме
+        }
         try:
-            state = {
-                'last_check': datetime.now().isoformat(),
-                'last_commit': self.last_commit,
-                'status': status,
-                'consecutive_errors': self.consecutive_errors,
-                'error': error,
-                'mode': 'secure'  # Отметка о безопасном режиме
-            }
             with open(self.status_file, 'w') as f:
-                json.dump(state, f, indent=2)
+                json.dump(self.state, f, indent=2)
         except Exception as e:
             logger.error(f"Failed to save state: {e}")
     
-    def _add_to_history(self, commit: str, status: str, message: str):
+    def _add_to_history(self, commit: str, status: str, message: str, details: Optional[Dict[str, Any]] = None):
         """Добавление записи в историю деплоев"""
         try:
             history = []
@@ -126,7 +400,8 @@ class SecurePullAgent:
                 'commit': commit,
                 'status': status,
                 'message': message,
-                'mode': 'secure'
+                'mode': 'secure',
+                **(details or {})
             })
             
             # Храним последние 100 записей
@@ -134,6 +409,9 @@ class SecurePullAgent:
             
             with open(self.history_file, 'w') as f:
                 json.dump(history, f, indent=2)
+            
+            # DORA-агрегаты до того, как запись вытеснится из истории
+            self.dora.update()
         except Exception as e:
             logger.error(f"Failed to add to history: {e}")
     
@@ -170,7 +448,10 @@ class SecurePullAgent:
             return None
     
     def _get_local_commit(self) -> Optional[str]:
-        """Получение хэша текущего локального коммита"""
+        """Получение хэша текущего локального (активного) коммита"""
+        if self.worktrees is not None:
+            return self.worktrees.active_commit()
+        
         try:
             cmd = ['git', 'rev-parse', 'HEAD']
             code, stdout, stderr = self._run_command(cmd, timeout=10)
@@ -183,38 +464,130 @@ class SecurePullAgent:
             logger.error(f"Error getting local commit: {e}")
             return None
     
-    def _pull_changes(self) -> bool:
-        """Получение изменений из репозитория"""
-        try:
-            logger.info("Pulling changes from remote...")
-            
-            # Fetch
-            cmd = ['git', 'fetch', 'origin', self.config.git.branch]
-            code, stdout, stderr = self._run_command(cmd, timeout=60)
-            if code != 0:
-                logger.error(f"Git fetch failed: {stderr}")
-                return False
-            
-            # Reset to remote
-            cmd = ['git', 'reset', '--hard', f'origin/{self.config.git.branch}']
-            code, stdout, stderr = self._run_command(cmd, timeout=30)
-            if code != 0:
-                logger.error(f"Git reset failed: {stderr}")
+    def _fetch_changes(self) -> bool:
+        """Получение объектов из репозитория без изменения рабочей копии"""
+        logger.info("Fetching changes from remote...")
+        cmd = ['git', 'fetch', 'origin', self.config.git.branch]
+        code, stdout, stderr = self._run_command(cmd, timeout=60)
+        if code != 0:
+            logger.error(f"Git fetch failed: {stderr}")
+            return False
+        return True
+    
+    def _checkout_commit(self, commit: str) -> bool:
+        """Переключение рабочей копии на проверенный коммит"""
+        if self.worktrees is not None:
+            try:
+                self.worktrees.activate(commit)
+                return True
+            except WorktreeError as e:
+                logger.error(f"Worktree switch failed: {e}")
                 return False
-            
-            logger.info("Successfully pulled changes")
-            return True
-        except Exception as e:
-            logger.error(f"Error pulling changes: {e}")
+        
+        cmd = ['git', 'reset', '--hard', commit]
+        code, stdout, stderr = self._run_command(cmd, timeout=30)
+        if code != 0:
+            logger.error(f"Git reset failed: {stderr}")
             return False
+        
+        logger.info(f"Working tree is at {commit[:8]}")
+        return True
+    
+    def _apply_retry_request(self, remote_commit: str):
+        """Ручной повтор деплоя: снятие карантина записью 'retry' в истории"""
+        request = take_retry_request(self.config.data_dir)
+        if request is None:
+            return
+        
+        commit = request.get('commit') or remote_commit
+        if remote_commit.startswith(commit):
+            commit = remote_commit
+        logger.info(f"Manual retry requested for {commit[:8]}")
+        self._add_to_history(commit, 'retry', 'Manual retry requested')
+        if self.config.fleet.enabled:
+            self.fleet.resume(commit)
+    
+    def _policy_time(self, moment: datetime) -> datetime:
+        """Время в часовом поясе политики (сравнимое с policy.now())"""
+        if self.policy.tz is None:
+            return moment.astimezone().replace(tzinfo=None) if moment.tzinfo else moment
+        return moment.astimezone(self.policy.tz) if moment.tzinfo else moment.replace(tzinfo=self.policy.tz)
+    
+    def _queue_deploy(self, commit: str, decision: PolicyDecision):
+        """Постановка коммита в очередь до разрешения политикой деплоя"""
+        first = commit != self.queued_commit
+        self.queued_commit = commit
+        self.queued_until = decision.next_attempt
+        when = decision.next_attempt.isoformat(timespec='minutes') if decision.next_attempt else 'unknown'
+        
+        logger.info(f"Deploy of {commit[:8]} queued: {decision.reason}, next attempt at {when}", extra={'sample': 'idle'})
+        self._save_state('ok', f'Deploy queued: {decision.reason}')
+        
+        if first:
+            self.notifier.info(
+                "Деплой отложен",
+                f"Коммит поставлен в очередь: {decision.reason}.",
+                {'Коммит': commit[:8], 'Следующая попытка': when}
+            )
+    
+    def _validate_commit(self, commit: str) -> bool:
+        """Проверка коммита до reset и сборки; плохой коммит запоминается"""
+        if not self.config.validation.enabled:
+            return True
+        
+        report = self.validator.validate(commit)
+        self.metrics.set('validation_duration_seconds', report.duration)
+        if report.ok:
+            return True
+        
+        self._save_state('error', 'Commit rejected by pre-deploy validation')
+        self._add_to_history(commit, 'rejected', report.summary())
+        self.notifier.error(
+            "Коммит отклонён",
+            f"Коммит не прошёл проверку перед сборкой:\n{report.summary()}",
+            {'Коммит': commit[:8], 'Ветка': self.config.git.branch}
+        )
+        return False
     
-    def _build_and_deploy(self) -> bool:
-        """Сборка и развёртывание приложения через безопасный прокси"""
+    def _build_and_deploy(
+        self,
+        wait_for_capacity: bool = True,
+        image_tag: Optional[str] = None,
+        before_up: Optional[Callable[[], Dict[str, Any]]] = None,
+        services: Optional[List[str]] = None
+    ) -> bool:
+        """
+        Сборка и развёртывание приложения через безопасный прокси
+        
+        Args:
+            wait_for_capacity: Ждать снижения нагрузки на хост перед сборкой
+                (при откате не ждём)
+            image_tag: Тег собранного образа
+            before_up: Этап между сборкой и запуском (миграции БД)
+            services: Изменённые сервисы (несколько - параллельная сборка
+                и запуск по depends_on)
+        """
         try:
             logger.info("Building and deploying application via secure proxy...")
             
             # Используем безопасный прокси для деплоя
-            result = self.docker_proxy.deploy('app', no_cache=True)
+            if services and services != ['app']:
+                result = self.docker_proxy.deploy_services(
+                    services,
+                    no_cache=True,
+                    wait_for_capacity=wait_for_capacity,
+                    image_tag=image_tag,
+                    before_up=before_up,
+                    max_parallel=self.config.deploy.parallel_builds
+                )
+            else:
+                result = self.docker_proxy.deploy(
+                    'app',
+                    no_cache=True,
+                    wait_for_capacity=wait_for_capacity,
+                    image_tag=image_tag,
+                    before_up=before_up
+                )
             
             if not result['success']:
                 logger.error(f"Deploy failed at stage '{result.get('stage', 'unknown')}': {result.get('error', 'Unknown error')}")
@@ -230,29 +603,249 @@ class SecurePullAgent:
             logger.error(f"Error during build/deploy: {e}")
             return False
     
-    def _health_check(self) -> bool:
-        """Проверка здоровья приложения после деплоя"""
-        logger.info("Running health check...")
+    def _deploy_image(self, commit: str, before_up: Optional[Callable[[], Dict[str, Any]]] = None) -> Optional[bool]:
+        """
+        Деплой готового образа коммита из registry (без сборки).
         
-        # Сначала проверяем через Docker прокси
+        Returns:
+            True/False - результат деплоя, None - образа нет в registry
+        """
         try:
-            docker_health = self.docker_proxy.health_check('app')
-            if not docker_health.get('healthy', False):
-                logger.warning(f"Docker health check: {docker_health}")
+            if self.registry.has_image(commit) is False:
+                logger.info(f"Image {self.registry.image_for(commit)} not found in registry")
+                return None
+            
+            logger.info(f"Deploying prebuilt image {self.registry.image_for(commit)}...")
+            result = self.docker_proxy.deploy_image('app', self.registry.tag_for(commit), before_up=before_up)
+            
+            if result['success']:
+                logger.info("Image deploy completed successfully")
+                return True
+            
+            if result['stage'] == 'pull':
+                logger.warning(f"Image pull failed: {result.get('error', 'Unknown error')}")
+                return None
+            
+            logger.error(f"Image deploy failed at stage '{result['stage']}': {result.get('error', 'Unknown error')}")
+            return False
+            
+        except DockerProxyError as e:
+            logger.error(f"Docker proxy error: {e}")
+            return False
+    
+    def _deploy_commit(
+        self,
+        commit: str,
+        wait_for_capacity: bool = True,
+        before_up: Optional[Callable[[], Dict[str, Any]]] = None,
+        services: Optional[List[str]] = None
+    ) -> bool:
+        """
+        Развёртывание коммита: готовый образ из registry (если включено)
+        либо локальная сборка.
+        
+        Готовый образ есть только у app: если изменились и другие
+        сервисы (services), все они собираются локально.
+        """
+        if services and services != ['app']:
+            return self._build_and_deploy(
+                wait_for_capacity=wait_for_capacity,
+                image_tag=self.registry.tag_for(commit),
+                before_up=before_up,
+                services=services
+            )
+        
+        if self.config.registry.enabled:
+            result = self._deploy_image(commit, before_up=before_up)
+            if result is not None:
+                return result
+            
+            if not self.config.registry.fallback_build:
+                logger.error("Image is not available and fallback build is disabled")
+                return False
+            
+            logger.info("Falling back to local build")
+        
+        # Образ, уже собранный другим хостом флота
+        if self.build_cache.enabled:
+            result = self._deploy_cached_image(commit, before_up=before_up)
+            if result is not None:
+                return result
+        
+        deployed = self._build_and_deploy(
+            wait_for_capacity=wait_for_capacity,
+            image_tag=self.registry.tag_for(commit),
+            before_up=before_up
+        )
+        if deployed and self.build_cache.enabled:
+            self.build_cache.publish(commit)
+        return deployed
+    
+    def _deploy_cached_image(self, commit: str, before_up: Optional[Callable[[], Dict[str, Any]]] = None) -> Optional[bool]:
+        """
+        Деплой образа коммита из общего кэша сборки.
+        
+        Returns:
+            True/False - результат деплоя, None - образа в кэше нет
+        """
+        restored = self.build_cache.restore(commit)
+        if restored is False:
+            return None
+        
+        try:
+            result = self.docker_proxy.deploy_image(
+                'app',
+                self.registry.tag_for(commit),
+                before_up=before_up,
+                pull=restored is None
+            )
+        except DockerProxyError as e:
+            logger.error(f"Docker proxy error: {e}")
+            return False
+        
+        if result['success']:
+            logger.info(f"Deployed {commit[:8]} from shared build cache")
+            return True
+        if result['stage'] == 'pull':
+            logger.warning(f"Cached image pull failed: {result.get('error', 'Unknown error')}")
+            return None
+        
+        logger.error(f"Cached image deploy failed at stage '{result['stage']}': {result.get('error', 'Unknown error')}")
+        return False
+    
+    def _changed_services(self, local_commit: Optional[str], remote_commit: str) -> List[str]:
+        """
+        Сервисы DEPLOY_SERVICES, затронутые коммитом: изменилось описание
+        сервиса в compose-файле или файлы в его контексте сборки.
+        app входит всегда (образ приложения - на каждый коммит).
+        """
+        candidates = ['app'] + [s for s in self.docker_proxy.config.allowed_services if s in self.config.deploy.services]
+        candidates = list(dict.fromkeys(candidates))
+        if len(candidates) == 1 or not local_commit:
+            return candidates
+        
+        repo = self.config.git.local_path
+        compose_path = os.path.relpath(self.config.docker.compose_file, repo)
+        code, stdout, stderr = self._run_command(['git', 'diff', '--name-only', local_commit, remote_commit], timeout=30)
+        if code != 0:
+            logger.warning(f"Cannot diff {local_commit[:8]}..{remote_commit[:8]}, deploying all services: {stderr}")
+            return candidates
+        changed_paths = stdout.split()
+        
+        definitions = []
+        for commit in (local_commit, remote_commit):
+            code, stdout, _ = self._run_command(['git', 'show', f'{commit}:{compose_path}'], timeout=10)
+            try:
+                services = (yaml.safe_load(stdout) or {}).get('services') or {} if code == 0 else {}
+            except yaml.YAMLError:
+                services = {}
+            definitions.append(services)
+        
+        compose = self.docker_proxy.compose_cache.get()
+        compose_dir = os.path.dirname(compose_path)
+        selected = ['app']
+        for service in candidates[1:]:
+            context = compose.build_context(service)
+            prefix = os.path.normpath(os.path.join(compose_dir, context)) if context is not None else None
+            touched = prefix is not None and any(
+                prefix == '.' or path == prefix or path.startswith(prefix + '/') for path in changed_paths
+            )
+            if touched or definitions[0].get(service) != definitions[1].get(service):
+                selected.append(service)
+        return selected
+    
+    def _migration_stage(
+        self,
+        commit: str,
+        service: Optional[str] = None,
+        image_tag: Optional[str] = None
+    ) -> Callable[[], Dict[str, Any]]:
+        """Этап миграций БД для before_up (результат - в migration_result)"""
+        def stage() -> Dict[str, Any]:
+            self._stage('migrate')
+            self.migration_result = self.migrations.run(commit, service=service, image_tag=image_tag)
+            return {
+                'success': self.migration_result.success,
+                'stage': 'migrate',
+                'error': self.migration_result.error
+            }
+        return stage
+    
+    def _migration_failed(self) -> bool:
+        return self.migration_result is not None and not self.migration_result.success
+    
+    def _deploy_details(self) -> Optional[Dict[str, Any]]:
+        """Длительности миграции и холодного старта для истории деплоев"""
+        details = {}
+        if self.migration_result is not None:
+            details['migration'] = asdict(self.migration_result)
+        if self.cold_start is not None:
+            details['cold_start'] = self.cold_start.breakdown()
+        return details or None
+    
+    def _canary_deploy(self, before_up: Optional[Callable[[], Dict[str, Any]]] = None) -> Tuple[bool, bool, str]:
+        """
+        Canary-деплой через безопасный прокси.
+        
+        Returns:
+            (успех, затронута ли стабильная версия, описание результата)
+        """
+        try:
+            result = self.canary.run(no_cache=True, before_up=before_up, wait_for_capacity=False)
+            
+            if not result.success:
+                logger.error(f"Canary failed at stage '{result.stage}': {result.error}")
+                return False, result.stable_affected, result.error or 'Canary failed'
+            
+            logger.info(f"Canary promoted after steps: {result.steps}")
+            return True, True, 'Canary promoted'
+            
+        except DockerProxyError as e:
+            logger.error(f"Docker proxy error: {e}")
+            return False, False, str(e)
         except Exception as e:
-            logger.warning(f"Docker health check failed: {e}")
+            logger.error(f"Error during canary deploy: {e}")
+            return False, False, str(e)
+    
+    def _health_check(self) -> bool:
+        """
+        Проверка здоровья приложения после деплоя
+        
+        На каждой попытке все реплики app и зависимые сервисы проверяются
+        параллельно (ProbeEngine), затем проверяется HTTP endpoint. Попытку
+        проваливает только кворум PROBE_SERVICES ниже порога (зависимости
+        только в лог): если контейнеры не удалось найти (ошибка Docker),
+        решает HTTP endpoint.
+        """
+        logger.info("Running health check...")
         
-        # Затем проверяем HTTP endpoint
         for attempt in range(self.config.deploy.health_check_retries):
             try:
-                response = requests.get(
-                    self.config.deploy.health_check_url,
-                    timeout=self.config.deploy.health_check_timeout
-                )
-                if response.status_code == 200:
-                    logger.info(f"Health check passed on attempt {attempt + 1}")
-                    return True
-                logger.warning(f"Health check returned {response.status_code}")
+                try:
+                    report = self.probe_engine.run()
+                    probe_error = report.error
+                except DockerProxyError as e:
+                    report, probe_error = None, str(e)
+                if probe_error:
+                    logger.warning(f"Health probes unavailable on attempt {attempt + 1}, checking HTTP only: {probe_error}")
+                if probe_error or report.healthy:
+                    response = requests.get(
+                        self.config.deploy.health_check_url,
+                        timeout=self.config.deploy.health_check_timeout
+                    )
+                    if response.status_code == 200:
+                        probes = f" (probes: {report.duration:.2f}s)" if report is not None else ''
+                        if report is not None and report.degraded_dependencies:
+                            logger.warning(f"Unhealthy dependencies (not blocking the deploy): {report.degraded_dependencies}")
+                        logger.info(f"Health check passed on attempt {attempt + 1}{probes}")
+                        return True
+                    logger.warning(f"Health check returned {response.status_code}")
+                else:
+                    details = {
+                        name: f"{report.services[name].healthy_count}/{len(report.services[name].replicas)}"
+                        for name in report.failing
+                    }
+                    logger.warning(f"Health probes below quorum on attempt {attempt + 1}: {details}")
             except requests.RequestException as e:
                 logger.warning(f"Health check attempt {attempt + 1} failed: {e}")
             
@@ -262,20 +855,45 @@ class SecurePullAgent:
         logger.error("Health check failed after all retries")
         return False
     
-    def _rollback(self, previous_commit: str) -> bool:
-        """Откат к предыдущей версии"""
+    def _rollback(self, previous_commit: str, rebuild: bool = True) -> bool:
+        """
+        Откат к предыдущей версии
+        
+        Args:
+            previous_commit: Коммит, к которому откатываемся
+            rebuild: Пересобрать приложение (не нужно, если стабильная
+                версия не была затронута, например при отказе canary)
+        """
+        self._stage('rollback')
         try:
             logger.warning(f"Rolling back to {previous_commit}...")
             
-            # Checkout предыдущего коммита
-            cmd = ['git', 'checkout', previous_commit]
-            code, stdout, stderr = self._run_command(cmd, timeout=30)
-            if code != 0:
-                logger.error(f"Git checkout failed: {stderr}")
-                return False
+            # Неудачная миграция - база из снимка, снятого перед ней
+            migration = self.migration_result
+            if migration is not None and not migration.success and migration.snapshot:
+                if not self.migrations.restore(migration.snapshot):
+                    return False
             
-            # Пересборка через безопасный прокси
-            if not self._build_and_deploy():
+            # Checkout предыдущего коммита (с worktree - переключение ссылки)
+            if self.worktrees is not None:
+                if not self._checkout_commit(previous_commit):
+                    return False
+            else:
+                cmd = ['git', 'checkout', previous_commit]
+                code, stdout, stderr = self._run_command(cmd, timeout=30)
+                if code != 0:
+                    logger.error(f"Git checkout failed: {stderr}")
+                    return False
+            
+            if not rebuild:
+                logger.info("Rollback completed without rebuild")
+                return True
+            
+            # Пересборка (или готовый образ) через безопасный прокси;
+            # сервисы, которых в предыдущем коммите не было, не трогаем
+            defined = self.docker_proxy.defined_services()
+            services = [s for s in self.deploy_services if s in defined]
+            if not self._deploy_commit(previous_commit, wait_for_capacity=False, services=services):
                 return False
             
             # Проверка после отката
@@ -288,10 +906,48 @@ class SecurePullAgent:
             logger.error(f"Rollback failed: {e}")
             return False
     
+    def _handle_deploy_failure(
+        self,
+        remote_commit: str,
+        local_commit: Optional[str],
+        error: str,
+        title: str,
+        message: str,
+        rebuild: bool = True
+    ):
+        """Фиксация неудачного деплоя и откат с уведомлениями"""
+        self.consecutive_errors += 1
+        self._save_state('error', error)
+        self._add_to_history(remote_commit, 'failed', error, details=self._deploy_details())
+        # Остальные хосты не начинают деплой этого коммита
+        self.fleet.fail(error)
+        
+        # Пытаемся откатиться
+        if self.config.deploy.rollback_on_failure and local_commit:
+            self.notifier.warning(title, message, {'Коммит': remote_commit[:8]})
+            if self._rollback(local_commit, rebuild=rebuild):
+                self._add_to_history(local_commit, 'rolled_back', f'Rolled back from {remote_commit[:8]}')
+                self.notifier.success(
+                    "Откат выполнен",
+                    "Успешно откатились к предыдущей версии",
+                    {'Версия': local_commit[:8]}
+                )
+            else:
+                self.notifier.error(
+                    "Откат не удался",
+                    "Критическая ошибка! Требуется ручное вмешательство.",
+                    {'Коммит': remote_commit[:8]}
+                )
+    
     def check_and_deploy(self):
         """Основной цикл проверки и деплоя"""
+        with log_context():
+            self.watchdog.beat('check')
+            self._check_and_deploy()
+    
+    def _check_and_deploy(self):
         try:
-            logger.info("Checking for updates...")
+            logger.info("Checking for updates...", extra={'sample': 'idle'})
             
             # Получаем удалённый коммит
             remote_commit = self._get_remote_commit()
@@ -299,19 +955,32 @@ class SecurePullAgent:
                 self.consecutive_errors += 1
                 self._save_state('error', 'Failed to get remote commit')
                 return
+            self.poller.observe(remote_commit)
             
             # Получаем локальный коммит
             local_commit = self._get_local_commit()
+            self.fleet.heartbeat(local_commit)
             
             # Проверяем, есть ли изменения
             if remote_commit == local_commit:
-                logger.info("No changes detected")
+                logger.info("No changes detected", extra={'sample': 'idle'})
                 self.consecutive_errors = 0
                 self._save_state('ok')
                 return
             
+            update_context(deploy_id=uuid.uuid4().hex[:12], commit=remote_commit[:12])
+            self._stage('detect')
             logger.info(f"New commit detected: {remote_commit[:8]} (was: {local_commit[:8] if local_commit else 'none'})")
             
+            # Коммит в карантине после неудач - ждём новый коммит, истечения
+            # задержки или ручного повтора
+            self._apply_retry_request(remote_commit)
+            quarantine = self.failure_ledger.quarantine(remote_commit)
+            if quarantine:
+                logger.info(f"Commit {remote_commit[:8]} is quarantined: {quarantine.describe()}", extra={'sample': 'idle'})
+                self._save_state('error', f'Commit quarantined: {quarantine.describe()}')
+                return
+            
             # Автодеплой отключен - только уведомляем
             if not self.config.deploy.auto_deploy:
                 self.notifier.info(
@@ -322,15 +991,57 @@ class SecurePullAgent:
                 self._save_state('ok')
                 return
             
+            # Политика деплоя: окна, заморозки, лимит частоты
+            decision = self.policy.evaluate()
+            if not decision.allowed:
+                self._queue_deploy(remote_commit, decision)
+                return
+            
+            # Перегруженный хост: деплой в очередь с повтором через
+            # BUILD_LOAD_POLL_INTERVAL. Проверка без ожидания - этап detect
+            # не блокируется дольше допуска watchdog; единственная проверка
+            # нагрузки на пути деплоя - до аренды флота, fetch и уведомления
+            overload = self.docker_proxy.load_gate.check()
+            if overload:
+                retry_at = self.policy.now() + timedelta(seconds=self.docker_proxy.load_gate.config.poll_interval)
+                self._queue_deploy(remote_commit, PolicyDecision(False, f"host is overloaded ({overload})", retry_at))
+                return
+            
+            # Волны и число одновременно недоступных хостов флота
+            decision = self.fleet.acquire(remote_commit, self.policy.now())
+            if not decision.allowed:
+                self._queue_deploy(remote_commit, decision)
+                return
+            self.queued_commit = None
+            self.queued_until = None
+            
+            # Fetch без изменения рабочей копии
+            self._stage('fetch')
+            if not self._fetch_changes():
+                self.consecutive_errors += 1
+                self._save_state('error', 'Failed to pull changes')
+                self.notifier.error(
+                    "Ошибка pull",
+                    "Не удалось получить изменения из репозитория",
+                    {'Коммит': remote_commit[:8]}
+                )
+                return
+            
+            # Проверка коммита до reset и сборки
+            self._stage('validate')
+            if not self._validate_commit(remote_commit):
+                return
+            
             # Уведомляем о начале деплоя
-            self.notifier.info(
+            # Одно сообщение на деплой, обновляемое по этапам (NOTIFY_LIVE)
+            self.notifier.begin_live(
                 "Начало деплоя (Secure Mode)",
                 f"Обнаружен новый коммит. Начинаю развёртывание через безопасный прокси...",
                 {'Коммит': remote_commit[:8], 'Ветка': self.config.git.branch, 'Режим': 'Secure'}
             )
             
-            # Pull изменений
-            if not self._pull_changes():
+            # Переключение рабочей копии на проверенный коммит
+            if not self._checkout_commit(remote_commit):
                 self.consecutive_errors += 1
                 self._save_state('error', 'Failed to pull changes')
                 self.notifier.error(
@@ -340,65 +1051,87 @@ class SecurePullAgent:
                 )
                 return
             
-            # Сборка и деплой через безопасный прокси
-            if not self._build_and_deploy():
-                self.consecutive_errors += 1
-                self._save_state('error', 'Build/deploy failed')
-                self._add_to_history(remote_commit, 'failed', 'Build/deploy failed')
-                
-                # Пытаемся откатиться
-                if self.config.deploy.rollback_on_failure and local_commit:
-                    self.notifier.warning(
+            # Сборка и деплой через безопасный прокси; миграции БД - между
+            # сборкой и запуском, только если изменились файлы миграций
+            self._stage('deploy')
+            deploy_started = time.time()
+            self.migration_result = None
+            self.cold_start = None
+            # Canary - только app
+            self.deploy_services = (
+                ['app'] if self.config.deploy.is_canary else self._changed_services(local_commit, remote_commit)
+            )
+            if self.deploy_services != ['app']:
+                logger.info(f"Services to deploy: {', '.join(self.deploy_services)}")
+            before_up = None
+            if self.migrations.needed(local_commit, remote_commit):
+                before_up = self._migration_stage(
+                    remote_commit,
+                    service=self.config.canary.service if self.config.deploy.is_canary else None,
+                    image_tag=None if self.config.deploy.is_canary else self.registry.tag_for(remote_commit)
+                )
+            
+            if self.config.deploy.is_canary:
+                ok, stable_affected, error = self._canary_deploy(before_up)
+                if not ok:
+                    self._handle_deploy_failure(
+                        remote_commit, local_commit, error,
+                        "Canary отклонён - откат",
+                        f"Новая версия не прошла canary-проверку: {error}",
+                        rebuild=stable_affected
+                    )
+                    return
+            elif not self._deploy_commit(
+                remote_commit,
+                wait_for_capacity=False,
+                before_up=before_up,
+                services=self.deploy_services
+            ):
+                if self._migration_failed():
+                    # Новая версия не запускалась - откат схемы без пересборки
+                    self._handle_deploy_failure(
+                        remote_commit, local_commit, 'Migration failed',
+                        "Ошибка миграции БД - откат",
+                        f"Миграция не удалась: {self.migration_result.error}. Восстанавливаю базу из снимка...",
+                        rebuild=False
+                    )
+                else:
+                    self._handle_deploy_failure(
+                        remote_commit, local_commit, 'Build/deploy failed',
                         "Ошибка деплоя - откат",
-                        "Сборка не удалась. Выполняю откат...",
-                        {'Коммит': remote_commit[:8]}
+                        "Сборка не удалась. Выполняю откат..."
                     )
-                    if self._rollback(local_commit):
-                        self.notifier.success(
-                            "Откат выполнен",
-                            "Успешно откатились к предыдущей версии",
-                            {'Версия': local_commit[:8]}
-                        )
-                    else:
-                        self.notifier.error(
-                            "Откат не удался",
-                            "Критическая ошибка! Требуется ручное вмешательство.",
-                            {'Коммит': remote_commit[:8]}
-                        )
                 return
             
+            # Профиль холодного старта и прогрев до health check
+            if self.config.warmup.enabled:
+                self._stage('warmup')
+                self.cold_start = self.profiler.run('app', deploy_started)
+            
             # Health check
+            self._stage('health')
             if not self._health_check():
-                self.consecutive_errors += 1
-                self._save_state('error', 'Health check failed')
-                self._add_to_history(remote_commit, 'failed', 'Health check failed')
-                
-                # Пытаемся откатиться
-                if self.config.deploy.rollback_on_failure and local_commit:
-                    self.notifier.warning(
-                        "Health check не пройден - откат",
-                        "Приложение не отвечает после деплоя. Выполняю откат...",
-                        {'Коммит': remote_commit[:8]}
-                    )
-                    if self._rollback(local_commit):
-                        self.notifier.success(
-                            "Откат выполнен",
-                            "Успешно откатились к предыдущей версии",
-                            {'Версия': local_commit[:8]}
-                        )
-                    else:
-                        self.notifier.error(
-                            "Откат не удался",
-                            "Критическая ошибка! Требуется ручное вмешательство.",
-                            {'Коммит': remote_commit[:8]}
-                        )
+                self._handle_deploy_failure(
+                    remote_commit, local_commit, 'Health check failed',
+                    "Health check не пройден - откат",
+                    "Приложение не отвечает после деплоя. Выполняю откат..."
+                )
                 return
             
             # Успешный деплой
+            self._stage('done')
             self.last_commit = remote_commit
             self.consecutive_errors = 0
             self._save_state('ok')
-            self._add_to_history(remote_commit, 'success', 'Deployed successfully (secure mode)')
+            self._add_to_history(
+                remote_commit, 'success', 'Deployed successfully (secure mode)',
+                details=self._deploy_details()
+            )
+            self.fleet.complete()
+            
+            # Старые рабочие копии (предыдущая версия остаётся для отката)
+            if self.worktrees is not None:
+                self.worktrees.evict(protect=[local_commit])
             
             self.notifier.success(
                 "Деплой успешен (Secure Mode)",
@@ -422,26 +1155,109 @@ class SecurePullAgent:
                 f"Произошла непредвиденная ошибка: {e}",
                 {'Ошибок подряд': self.consecutive_errors}
             )
+        finally:
+            # Деплой не начался или прерван ошибкой - аренда флота свободна
+            self.fleet.release()
+            self.notifier.end_live()
+    
+    def run_gc(self):
+        """Плановая очистка образов и кэша сборки"""
+        self.watchdog.beat('gc')
+        try:
+            self.image_gc.run(extra_commits=[self.last_commit, self._get_local_commit()])
+        except Exception as e:
+            logger.error(f"Error in image GC: {e}")
     
     def run(self):
         """Запуск агента"""
-        logger.info(f"Starting Secure Pull Agent (check interval: {self.config.deploy.check_interval}s)")
+        self._start()
+        
+        polling = self.config.polling
+        logger.info(
+            f"Starting Secure Pull Agent (check interval: {self.config.check_interval}s"
+            + (f", adaptive {polling.min_interval}-{polling.max_interval}s" if polling.adaptive else '')
+            + ')'
+        )
+        
+        # Статус и liveness из памяти для healthcheck.py
+        if self.config.watchdog.socket_path:
+            try:
+                self.status_server = StatusServer(self.config.watchdog.socket_path, self.watchdog, self._status)
+                self.status_server.start()
+            except OSError as e:
+                logger.error(f"Cannot start status endpoint: {e}")
+                self.status_server = None
         
         # Первая проверка сразу
         self.check_and_deploy()
         
         # Планируем регулярные проверки
-        schedule.every(self.config.deploy.check_interval).seconds.do(self.check_and_deploy)
+        self._schedule_jobs()
+        
+        # Каталог, а не файл: файл может появиться или замениться позже
+        if self.config_path and os.path.isdir(os.path.dirname(self.config_path)):
+            self.config_watcher = ConfigWatcher(self.config_path)
+            self.config_watcher.start()
         
         while self.running:
+            self.watchdog.beat()
+            self.fleet.keepalive()
+            # Деплои идут в этом же потоке - здесь ни один не выполняется
+            if self.config_watcher is not None and self.config_watcher.changed():
+                self._reload_config()
             schedule.run_pending()
+            if self.next_check_at is not None and time.monotonic() >= self.next_check_at:
+                self.check_and_deploy()
+                self._schedule_check()
+            # Открылось окно для коммита из очереди - не ждём следующей проверки
+            if self.queued_until is not None and self.policy.now() >= self.queued_until:
+                self.queued_until = None
+                self.check_and_deploy()
             time.sleep(1)
         
+        if self.config_watcher is not None:
+            self.config_watcher.stop()
+        if self.status_server is not None:
+            self.status_server.stop()
         logger.info("Secure Pull Agent stopped")
 
 
 def main():
     """Точка входа"""
+    # Конфигурация читается здесь, а не при импорте: модули агента
+    # импортируются без agent.yml и без ConfigError
+    try:
+        config = load_config()
+    except ConfigError as e:
+        sys.exit(f"Invalid configuration: {e}")
+    # Настройка логирования (JSON, очередь, ротация, сэмплирование холостых проверок)
+    setup_logging(config.log)
+    
+    # Ручной повтор деплоя коммита из карантина: retry [commit]
+    if len(sys.argv) > 1 and sys.argv[1] == 'retry':
+        commit = sys.argv[2] if len(sys.argv) > 2 else None
+        path = request_retry(config.data_dir, commit)
+        print(f"Retry requested for {commit or 'the current remote commit'} ({path})")
+        return
+    
+    # Отчёт DORA-метрик по истории деплоев: dora [--format csv] [--windows 7,30,90]
+    if len(sys.argv) > 1 and sys.argv[1] == 'dora':
+        from dora import main as dora_main
+        dora_main(sys.argv[2:], config.data_dir, config.git.local_path)
+        return
+    
+    # Состояние выкатки по хостам флота: fleet [--resume COMMIT]
+    if len(sys.argv) > 1 and sys.argv[1] == 'fleet':
+        from fleet import main as fleet_main
+        fleet_main(sys.argv[2:], config.fleet)
+        return
+    
+    # Замер времени старта без запуска проверок и записи состояния: startup
+    if len(sys.argv) > 1 and sys.argv[1] == 'startup':
+        agent = SecurePullAgent(config)
+        print(json.dumps(agent.startup))
+        return
+    
     agent = SecurePullAgent(config)
     agent.run()
 
@@ -0,0 +1,84 @@
+"""
+Работа с registry готовых образов для Pull-агента
+
+Коммит отображается в тег образа (по умолчанию полный SHA), наличие
+тега проверяется через Registry HTTP API v2 (HEAD манифеста) без
+скачивания слоёв.
+"""
+import logging
+from typing import Optional
+
+from config import RegistryConfig
+from lazy_imports import requests
+
+logger = logging.getLogger('registry')
+
+MANIFEST_ACCEPT = ', '.join([
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.oci.image.manifest.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+])
+
+
+class ImageRegistry:
+    """Разрешение коммитов в образы registry"""
+
+    def __init__(self, config: RegistryConfig):
+        self.config = config
+
+    def tag_for(self, commit: str) -> str:
+        """Тег образа для коммита"""
+        return self.config.tag_template.format(sha=commit, short=commit[:8])
+
+    def image_for(self, commit: str) -> str:
+        """Полная ссылка на образ для коммита"""
+        return f"{self.config.image}:{self.tag_for(commit)}"
+
+    @property
+    def _registry_host(self) -> Optional[str]:
+        """Хост registry из имени образа (None для Docker Hub)"""
+        first = self.config.image.split('/', 1)[0]
+        if '/' in self.config.image and ('.' in first or ':' in first or first == 'localhost'):
+            return first
+        return None
+
+    @property
+    def _repository(self) -> str:
+        host = self._registry_host
+        return self.config.image[len(host) + 1:] if host else self.config.image
+
+    def has_image(self, commit: str) -> Optional[bool]:
+        """
+        Проверка наличия образа для коммита.
+
+        Returns:
+            True/False, либо None если registry не удалось опросить
+            (тогда решение принимает docker-compose pull)
+        """
+        host = self._registry_host
+        if not host:
+            return None
+
+        scheme = 'http' if self.config.insecure else 'https'
+        url = f"{scheme}://{host}/v2/{self._repository}/manifests/{self.tag_for(commit)}"
+        auth = (self.config.username, self.config.password) if self.config.username else None
+
+        try:
+            response = requests.head(
+                url,
+                headers={'Accept': MANIFEST_ACCEPT},
+                auth=auth,
+                timeout=10
+            )
+        except requests.RequestException as e:
+            logger.warning(f"Registry is unreachable: {e}")
+            return None
+
+        if response.status_code == 200:
+            return True
+        if response.status_code == 404:
+            return False
+
+        logger.warning(f"Unexpected registry response {response.status_code} for {url}")
+        return None
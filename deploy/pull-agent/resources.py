@@ -0,0 +1,192 @@
+"""
+Управление ресурсами сборки для Pull-агента
+
+- Ограничения контейнеров сборки (память, набор и доля CPU) - их
+  применяет dockerd к шагам RUN; nice/ionice клиента docker-compose
+  на сборку не влияют
+- Отложенный запуск сборки при высокой нагрузке на хост
+  (/proc/loadavg и метрики PSI из /proc/pressure)
+"""
+import os
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional, List, Dict
+
+from config import parse_size
+
+logger = logging.getLogger('build-resources')
+
+
+@dataclass
+class BuildLimits:
+    """
+    Ограничения контейнеров сборки (классический builder dockerd).
+
+    memory - лимит памяти шагов RUN ('2g'); cpuset - CPU, на которых
+    идёт сборка ('0-1': не больше двух ядер, остальные - production);
+    cpu_shares - вес CPU относительно других контейнеров (1024 - обычный).
+    """
+    memory: Optional[str] = None
+    cpuset: Optional[str] = None
+    cpu_shares: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> 'BuildLimits':
+        cpu_shares = os.getenv('BUILD_CPU_SHARES')
+        return cls(
+            memory=os.getenv('BUILD_MEMORY') or None,
+            cpuset=os.getenv('BUILD_CPUSET') or None,
+            cpu_shares=int(cpu_shares) if cpu_shares else None
+        )
+
+    @property
+    def limits_cpu(self) -> bool:
+        return bool(self.cpuset or self.cpu_shares)
+
+    def build_args(self) -> List[str]:
+        """Аргументы docker-compose build (у compose v1 есть только --memory)"""
+        args = []
+        if self.memory:
+            args += ['--memory', self.memory]
+        return args
+
+    def container_limits(self) -> Dict[str, Any]:
+        """container_limits сборки через Engine API"""
+        limits: Dict[str, Any] = {}
+        if self.memory:
+            limits['memory'] = parse_size(self.memory)
+        if self.cpuset:
+            limits['cpusetcpus'] = self.cpuset
+        if self.cpu_shares:
+            limits['cpushares'] = self.cpu_shares
+        return limits
+
+
+@dataclass
+class HostLoad:
+    """Снимок нагрузки на хост"""
+    load_per_cpu: float
+    cpu_pressure: Optional[float]
+    memory_pressure: Optional[float]
+    io_pressure: Optional[float]
+
+    def to_dict(self) -> Dict[str, Optional[float]]:
+        return {
+            'load_per_cpu': round(self.load_per_cpu, 2),
+            'cpu_pressure': self.cpu_pressure,
+            'memory_pressure': self.memory_pressure,
+            'io_pressure': self.io_pressure
+        }
+
+
+def _read_pressure(resource: str, proc_root: str = '/proc') -> Optional[float]:
+    """Значение 'some avg10' из /proc/pressure/<resource> (None если PSI недоступен)"""
+    try:
+        with open(os.path.join(proc_root, 'pressure', resource), 'r') as f:
+            for line in f:
+                if line.startswith('some '):
+                    for part in line.split()[1:]:
+                        key, _, value = part.partition('=')
+                        if key == 'avg10':
+                            return float(value)
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def read_host_load(proc_root: str = '/proc') -> HostLoad:
+    """Чтение текущей нагрузки на хост"""
+    with open(os.path.join(proc_root, 'loadavg'), 'r') as f:
+        load_1m = float(f.read().split()[0])
+
+    return HostLoad(
+        load_per_cpu=load_1m / (os.cpu_count() or 1),
+        cpu_pressure=_read_pressure('cpu', proc_root),
+        memory_pressure=_read_pressure('memory', proc_root),
+        io_pressure=_read_pressure('io', proc_root)
+    )
+
+
+@dataclass
+class LoadGateConfig:
+    """Пороги отложенной сборки (None - порог не проверяется)"""
+    enabled: bool = False
+    max_load_per_cpu: Optional[float] = None
+    max_cpu_pressure: Optional[float] = None
+    max_memory_pressure: Optional[float] = None
+    max_io_pressure: Optional[float] = None
+    max_wait: int = 600
+    poll_interval: int = 15
+
+    @classmethod
+    def from_env(cls) -> 'LoadGateConfig':
+        def optional_float(name: str) -> Optional[float]:
+            value = os.getenv(name)
+            return float(value) if value else None
+
+        return cls(
+            enabled=os.getenv('BUILD_LOAD_GATE', 'false').lower() == 'true',
+            max_load_per_cpu=optional_float('BUILD_MAX_LOAD_PER_CPU'),
+            max_cpu_pressure=optional_float('BUILD_MAX_CPU_PRESSURE'),
+            max_memory_pressure=optional_float('BUILD_MAX_MEMORY_PRESSURE'),
+            max_io_pressure=optional_float('BUILD_MAX_IO_PRESSURE'),
+            max_wait=int(os.getenv('BUILD_LOAD_MAX_WAIT', '600')),
+            poll_interval=int(os.getenv('BUILD_LOAD_POLL_INTERVAL', '15'))
+        )
+
+
+class HostLoadGate:
+    """Откладывает сборку, пока нагрузка на хост выше порогов"""
+
+    def __init__(self, config: LoadGateConfig, proc_root: str = '/proc'):
+        self.config = config
+        self.proc_root = proc_root
+
+    def overload_reason(self, load: HostLoad) -> Optional[str]:
+        """Причина перегрузки или None"""
+        checks = [
+            ('load per cpu', load.load_per_cpu, self.config.max_load_per_cpu),
+            ('cpu pressure', load.cpu_pressure, self.config.max_cpu_pressure),
+            ('memory pressure', load.memory_pressure, self.config.max_memory_pressure),
+            ('io pressure', load.io_pressure, self.config.max_io_pressure),
+        ]
+        for name, value, limit in checks:
+            if value is not None and limit is not None and value > limit:
+                return f"{name} {value:.2f} > {limit:.2f}"
+        return None
+
+    def check(self) -> Optional[str]:
+        """Причина перегрузки хоста сейчас (без ожидания) или None"""
+        if not self.config.enabled:
+            return None
+        try:
+            return self.overload_reason(read_host_load(self.proc_root))
+        except OSError as e:
+            logger.warning(f"Cannot read host load, not deferring build: {e}")
+            return None
+
+    def wait(self, max_wait: Optional[int] = None) -> bool:
+        """
+        Ожидание снижения нагрузки.
+
+        Returns:
+            True если можно собирать, False если нагрузка не снизилась за max_wait
+        """
+        if not self.config.enabled:
+            return True
+
+        max_wait = self.config.max_wait if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+
+        while True:
+            reason = self.check()
+            if not reason:
+                return True
+
+            if time.monotonic() >= deadline:
+                logger.warning(f"Host still overloaded after {max_wait}s: {reason}")
+                return False
+
+            logger.info(f"Deferring build, host overloaded: {reason}")
+            time.sleep(self.config.poll_interval)
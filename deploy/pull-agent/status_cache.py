@@ -0,0 +1,190 @@
+"""
+Кэш состояния контейнеров для Docker прокси
+
+Снимок контейнеров проекта загружается один раз через Engine API и затем
+обновляется по потоку событий Docker (create/start/stop/die/destroy,
+health_status), поэтому ps/status отдаются из памяти без запуска
+docker-compose. Изменения нумеруются версиями: клиенты могут ждать
+изменений после известной версии (long-poll / SSE) вместо опроса.
+
+При обрыве потока событий кэш помечается неактуальным (чтения уходят
+в Engine API/docker-compose), поток переподключается, снимок
+загружается заново.
+"""
+import time
+import threading
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from engine_backend import EngineBackend
+
+logger = logging.getLogger('status-cache')
+
+# События, меняющие состояние контейнера (exec_* от healthcheck пропускаются)
+TRACKED_ACTIONS = {
+    'create', 'start', 'restart', 'stop', 'die', 'kill', 'oom',
+    'pause', 'unpause', 'destroy', 'rename', 'update'
+}
+
+# Поля записи ps, изменение которых считается изменением состояния
+STATE_FIELDS = ('Name', 'Service', 'Image', 'State', 'Health')
+
+
+@dataclass
+class StateChange:
+    """Изменение состояния контейнера"""
+    version: int
+    service: str
+    container_id: str
+    action: str
+    container: Optional[Dict[str, Any]] = None
+    timestamp: float = field(default_factory=time.time)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'service': self.service,
+            'container_id': self.container_id,
+            'action': self.action,
+            'container': self.container,
+            'timestamp': self.timestamp
+        }
+
+
+class ContainerStateCache:
+    """Состояние контейнеров проекта, обновляемое событиями Docker"""
+
+    def __init__(self, engine: EngineBackend, history: int = 500, reconnect_delay: float = 5.0):
+        self.engine = engine
+        self.reconnect_delay = reconnect_delay
+        self._containers: Dict[str, Dict[str, Any]] = {}
+        self._changes: deque = deque(maxlen=history)
+        self._version = 0
+        self._ready = False
+        self._thread: Optional[threading.Thread] = None
+        self._changed = threading.Condition()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def start(self):
+        """Запуск слежения за событиями (однократно)"""
+        with self._changed:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._watch, name='status-cache', daemon=True)
+            self._thread.start()
+
+    def containers(self, services: Optional[List[str]] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Контейнеры из кэша.
+
+        Returns:
+            Записи в формате `ps --format json` или None, если кэш ещё
+            не синхронизирован (нужно читать напрямую)
+        """
+        self.start()
+        with self._changed:
+            if not self._ready:
+                return None
+            entries = [dict(e) for e in self._containers.values()]
+        if services is not None:
+            entries = [e for e in entries if e['Service'] in services]
+        return entries
+
+    def wait_for_changes(self, since: int, timeout: float) -> Dict[str, Any]:
+        """
+        Ожидание изменений с версией больше since.
+
+        Если since старше хранимой истории, возвращается reset=True и
+        полный снимок вместо списка изменений.
+        """
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self._version <= since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+
+            oldest = self._changes[0].version if self._changes else self._version + 1
+            if since < oldest - 1:
+                return {
+                    'version': self._version,
+                    'reset': True,
+                    'ready': self._ready,
+                    'containers': [dict(e) for e in self._containers.values()],
+                    'changes': []
+                }
+            return {
+                'version': self._version,
+                'reset': False,
+                'ready': self._ready,
+                'changes': [c for c in self._changes if c.version > since]
+            }
+
+    def _record(self, service: str, container_id: str, action: str, container: Optional[Dict[str, Any]]):
+        self._version += 1
+        self._changes.append(StateChange(self._version, service, container_id, action, container))
+        self._changed.notify_all()
+
+    def _resync(self):
+        """Полная загрузка снимка с фиксацией отличий как изменений"""
+        entries = {e['ID']: e for e in self.engine.containers()}
+        with self._changed:
+            for container_id, old in list(self._containers.items()):
+                if container_id not in entries:
+                    del self._containers[container_id]
+                    self._record(old['Service'], container_id, 'destroy', None)
+            for container_id, entry in entries.items():
+                old = self._containers.get(container_id)
+                self._containers[container_id] = entry
+                if old is None or any(old.get(f) != entry.get(f) for f in STATE_FIELDS):
+                    self._record(entry['Service'], container_id, 'sync', dict(entry))
+            self._ready = True
+            self._changed.notify_all()
+        logger.info(f"Status cache synced: {len(entries)} containers")
+
+    def _apply(self, event: Dict[str, Any]):
+        action = (event.get('Action') or event.get('status') or '').split(':')[0]
+        if action not in TRACKED_ACTIONS and action != 'health_status':
+            return
+
+        container_id = (event.get('Actor', {}).get('ID') or event.get('id') or '')[:12]
+        entry = None if action == 'destroy' else self.engine.container(container_id)
+
+        with self._changed:
+            old = self._containers.get(container_id)
+            if entry is None:
+                if old is not None:
+                    del self._containers[container_id]
+                    self._record(old['Service'], container_id, action, None)
+                return
+
+            self._containers[container_id] = entry
+            if old is None or any(old.get(f) != entry.get(f) for f in STATE_FIELDS):
+                self._record(entry['Service'], container_id, action, dict(entry))
+
+    def _watch(self):
+        while True:
+            try:
+                # Подписка до загрузки снимка, чтобы не потерять события между ними
+                events = self.engine.events()
+                self._resync()
+                for event in events:
+                    self._apply(event)
+                logger.warning("Docker events stream closed")
+            except Exception as e:
+                logger.warning(f"Docker events stream failed: {e}")
+
+            with self._changed:
+                self._ready = False
+            time.sleep(self.reconnect_delay)
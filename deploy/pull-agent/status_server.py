@@ -0,0 +1,138 @@
+"""
+Статус и liveness Pull-агента из памяти
+
+HTTP поверх unix-сокета (STATUS_SOCKET):
+
+- GET /health - 200, если watchdog жив и ошибок подряд меньше 5, иначе 503
+- GET /status - состояние агента (как в agent_status.json) и watchdog
+
+Watchdog: основной цикл и каждый этап деплоя обновляют heartbeat,
+у каждого этапа свой допуск (WATCHDOG_STAGE_TIMEOUTS, для холостого
+цикла - WATCHDOG_LOOP_TIMEOUT). Heartbeat старше допуска означает
+зависание (сборка, git, планировщик); healthcheck.py узнаёт об этом
+одним запросом, без чтения файла статуса.
+"""
+import os
+import json
+import time
+import logging
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler
+from typing import Any, Callable, Dict, Optional
+
+from config import WatchdogConfig
+
+logger = logging.getLogger('status-server')
+
+IDLE_STAGE = 'idle'
+
+# Как в проверке по файлу статуса (healthcheck.py)
+MAX_CONSECUTIVE_ERRORS = 5
+
+
+class Watchdog:
+    """Heartbeat основного цикла и этапов деплоя"""
+
+    def __init__(self, config: WatchdogConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._stage = 'starting'
+        self._beat = time.monotonic()
+        self._stage_started = self._beat
+
+    def beat(self, stage: str = IDLE_STAGE):
+        """Heartbeat: агент жив и находится на этапе stage"""
+        now = time.monotonic()
+        with self._lock:
+            if stage != self._stage:
+                self._stage = stage
+                self._stage_started = now
+            self._beat = now
+
+    def timeout_for(self, stage: str) -> int:
+        if stage == IDLE_STAGE:
+            return self.config.loop_timeout
+        return self.config.stage_timeouts.get(stage, self.config.default_timeout)
+
+    def state(self) -> Dict[str, Any]:
+        """Текущий этап, возраст heartbeat и признак жизни"""
+        now = time.monotonic()
+        with self._lock:
+            stage, beat, started = self._stage, self._beat, self._stage_started
+        timeout = self.timeout_for(stage)
+        age = now - beat
+        return {
+            'alive': age <= timeout,
+            'stage': stage,
+            'heartbeat_age': round(age, 1),
+            'stage_seconds': round(now - started, 1),
+            'timeout': timeout
+        }
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    server: '_UnixHTTPServer'
+
+    def _send_json(self, code: int, data: Dict[str, Any]):
+        body = json.dumps(data, default=str).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        status_server = self.server.status_server
+        watchdog = status_server.watchdog.state()
+        if self.path == '/health':
+            errors = status_server.status().get('consecutive_errors', 0)
+            healthy = watchdog['alive'] and errors < MAX_CONSECUTIVE_ERRORS
+            self._send_json(200 if healthy else 503, {**watchdog, 'consecutive_errors': errors})
+        elif self.path == '/status':
+            self._send_json(200, {**status_server.status(), 'watchdog': watchdog})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def log_message(self, format: str, *args: Any):
+        # Клиентский адрес unix-сокета пустой; запросы healthcheck не логируем
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    status_server: 'StatusServer'
+
+
+class StatusServer:
+    """HTTP-эндпоинт статуса на unix-сокете (в фоновом потоке)"""
+
+    def __init__(self, path: str, watchdog: Watchdog, status: Callable[[], Dict[str, Any]]):
+        self.path = path
+        self.watchdog = watchdog
+        self.status = status
+        self._server: Optional[_UnixHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        # Сокет от предыдущего запуска контейнера
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self._server = _UnixHTTPServer(self.path, _StatusHandler)
+        self._server.status_server = self
+        os.chmod(self.path, 0o660)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='status-server', daemon=True)
+        self._thread.start()
+        logger.info(f"Status endpoint listening on {self.path}")
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
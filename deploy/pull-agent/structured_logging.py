@@ -0,0 +1,172 @@
+"""
+Структурированное логирование Pull-агента
+
+- JSON-строка на запись (или текст при LOG_FORMAT=text) с полями
+  deploy_id, commit и stage текущего деплоя
+- Запись через очередь (QueueHandler/QueueListener): вызов логгера
+  не ждёт stdout и диска
+- Файл лога с ротацией по размеру
+- Сэмплирование повторяющихся сообщений холостой проверки
+  (`extra={'sample': 'idle'}`): первое сообщение пишется, затем не чаще
+  одного раза за интервал с числом пропущенных
+"""
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, Tuple
+
+from config import LogConfig
+
+CONTEXT_FIELDS = ('deploy_id', 'commit', 'stage')
+
+_context: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar('log_context', default={})
+
+# Стандартные атрибуты LogRecord (всё остальное - поля из extra)
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'sample'}
+
+_listener: Optional[QueueListener] = None
+
+
+@contextmanager
+def log_context(**fields: str):
+    """Поля контекста (deploy_id, commit, stage) для всех записей внутри блока"""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def update_context(**fields: str):
+    """Изменение полей контекста до конца текущего блока log_context"""
+    _context.set({**_context.get(), **fields})
+
+
+class ContextFilter(logging.Filter):
+    """Добавление полей контекста в запись (до передачи в очередь)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for name, value in _context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропуск повторов сообщений с extra={'sample': ...} в пределах интервала"""
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._state: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        sample = getattr(record, 'sample', None)
+        if sample is None or self.interval <= 0:
+            return True
+
+        key = (sample, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            last_emit, suppressed = self._state.get(key, (None, 0))
+            if last_emit is not None and now - last_emit < self.interval:
+                self._state[key] = (last_emit, suppressed + 1)
+                return False
+            self._state[key] = (now, 0)
+
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Запись лога одной JSON-строкой"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRS:
+                data[name] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Текстовый формат с полями контекста в конце строки"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = [f"{name}={getattr(record, name)}" for name in CONTEXT_FIELDS + ('suppressed',) if hasattr(record, name)]
+        return f"{line} [{' '.join(fields)}]" if fields else line
+
+
+def _stop_listener():
+    """Остановка текущего фонового потока записи (и при выходе, и при перенастройке)"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is None:
+        return
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+# Один обработчик на процесс, сколько бы раз ни вызывалась setup_logging()
+atexit.register(_stop_listener)
+
+
+def setup_logging(config: LogConfig):
+    """
+    Настройка корневого логгера: контекст и сэмплирование в потоке
+    вызывающего, форматирование и запись - в фоновом потоке.
+    """
+    global _listener
+
+    formatter = JsonFormatter() if config.format == 'json' else TextFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if config.file:
+        try:
+            handlers.append(RotatingFileHandler(
+                config.file,
+                maxBytes=config.max_bytes,
+                backupCount=config.backup_count,
+                encoding='utf-8'
+            ))
+        except OSError as e:
+            print(f"Cannot open log file {config.file}: {e}", file=sys.stderr)
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _stop_listener()
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    queue_handler.addFilter(SamplingFilter(config.idle_sample_interval))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(config.level.upper())
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
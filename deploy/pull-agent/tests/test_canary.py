@@ -0,0 +1,81 @@
+"""
+Веса canary по шагам и учёт проб по серверу upstream
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from canary import CanaryDeployer  # noqa: E402
+from config import CanaryConfig  # noqa: E402
+from docker_proxy import DockerProxyError  # noqa: E402
+
+
+def canary_config(upstream_dir: str = '/tmp', steps=(10, 25, 50)) -> CanaryConfig:
+    return CanaryConfig(
+        service='app-canary', stable_server='app:3000', canary_server='10.0.0.9:3000',
+        upstream_dir=upstream_dir, upstream_name='scoliologic_app', steps=list(steps),
+        step_duration=0, probes_per_step=10, min_probes=3,
+        probe_url='http://nginx:8081/api/health', ready_url='http://app-canary:3000/api/health',
+        probe_timeout=1, max_error_rate=0.05, max_latency_ms=1000
+    )
+
+
+class WeightScheduleTest(unittest.TestCase):
+
+    def test_weight_gives_share_against_stable_100(self):
+        for share, weight in ((10, 11), (25, 33), (50, 100), (75, 300), (1, 1)):
+            with self.subTest(share=share):
+                self.assertEqual(CanaryDeployer.canary_weight(share), weight)
+
+    def test_steps_must_increase_within_range(self):
+        for steps in ((), (0, 50), (10, 100), (50, 25)):
+            with self.subTest(steps=steps):
+                with self.assertRaises(DockerProxyError):
+                    CanaryDeployer(canary_config(steps=steps), docker_proxy=None)._validate_steps()
+
+    def test_weights_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            deployer = CanaryDeployer(canary_config(directory), docker_proxy=None)
+            deployer._write_weights(25)
+            self.assertIn('server 10.0.0.9:3000 weight=33;', deployer.upstream_file.read_text())
+            deployer._clear_weights()
+            self.assertFalse(deployer.upstream_file.exists())
+
+
+class StepProbeTest(unittest.TestCase):
+
+    def run_step(self, responses):
+        deployer = CanaryDeployer(canary_config(), docker_proxy=None)
+        deployer._request = mock.Mock(side_effect=responses)
+        with mock.patch('canary.time.sleep'):
+            return deployer._probe_step(), deployer._request.call_count
+
+    def test_probes_split_by_upstream(self):
+        responses = [(False, 5.0, '10.0.0.9:3000')] * 3 + [(True, 5.0, '10.0.0.2:3000')] * 7
+        (canary, stable), calls = self.run_step(responses)
+        self.assertEqual((canary.total, canary.errors, stable.total, stable.errors), (3, 3, 7, 0))
+        self.assertEqual(calls, 10)
+
+    def test_step_extends_until_canary_probes(self):
+        responses = [(True, 5.0, '10.0.0.2:3000')] * 12 + [(True, 5.0, '10.0.0.9:3000')] * 3
+        (canary, stable), calls = self.run_step(responses)
+        self.assertEqual((canary.total, stable.total, calls), (3, 12, 15))
+
+    def test_too_few_canary_probes_rejected(self):
+        (canary, _), calls = self.run_step([(True, 5.0, '10.0.0.2:3000')] * 50)
+        self.assertEqual(calls, 50)
+        self.assertIn('reached canary', CanaryDeployer(canary_config(), docker_proxy=None)._evaluate(canary))
+
+    def test_direct_probe_counts_for_canary(self):
+        (canary, stable), _ = self.run_step([(True, 5.0, None)] * 10)
+        self.assertEqual((canary.total, stable.total), (10, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+"""
+Приоритет переменных окружения над файлом конфигурации
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ConfigError, load_config  # noqa: E402
+
+
+class LoadConfigTest(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.yml')
+        with os.fdopen(handle, 'w') as f:
+            f.write('check_interval: 120\npolicy:\n  timezone: UTC\n')
+        self.addCleanup(os.unlink, self.path)
+
+    def load(self, **env):
+        with mock.patch.dict(os.environ, env):
+            for name in ('CHECK_INTERVAL', 'DEPLOY_TIMEZONE'):
+                if name not in env:
+                    os.environ.pop(name, None)
+            return load_config(self.path)
+
+    def test_file_value_without_env(self):
+        config = self.load()
+        self.assertEqual((config.check_interval, config.policy.timezone), (120, 'UTC'))
+
+    def test_empty_env_does_not_override_file(self):
+        config = self.load(CHECK_INTERVAL='', DEPLOY_TIMEZONE='')
+        self.assertEqual((config.check_interval, config.policy.timezone), (120, 'UTC'))
+
+    def test_env_overrides_file(self):
+        self.assertEqual(self.load(CHECK_INTERVAL='600').check_interval, 600)
+
+    def test_empty_env_uses_default(self):
+        with mock.patch.dict(os.environ, {'CHECK_INTERVAL': '', 'DEPLOY_TIMEZONE': ''}):
+            config = load_config('')
+        self.assertEqual((config.check_interval, config.policy.timezone), (300, 'Europe/Moscow'))
+
+    def test_fleet_host_timeout_exceeds_poll_interval(self):
+        env = {'FLEET_ENABLED': 'true', 'POLL_ADAPTIVE': 'true', 'POLL_MAX_INTERVAL': '1800'}
+        with mock.patch.dict(os.environ, env):
+            with self.assertRaisesRegex(ConfigError, 'host_timeout'):
+                load_config('')
+            with mock.patch.dict(os.environ, {'FLEET_HOST_TIMEOUT': '3600'}):
+                self.assertEqual(load_config('').fleet.host_timeout, 3600)
+
+    def test_adaptive_lookback_at_least_a_week(self):
+        with mock.patch.dict(os.environ, {'POLL_ADAPTIVE': 'true', 'POLL_LOOKBACK_DAYS': '3'}):
+            with self.assertRaisesRegex(ConfigError, 'lookback_days'):
+                load_config('')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+"""
+Деплой нескольких сервисов: уровни запуска по depends_on, сборка до запуска
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compose_file import ComposeFile  # noqa: E402
+from docker_proxy import DockerProxyError, ProxyConfig, SecureDockerProxy  # noqa: E402
+
+COMPOSE = """
+services:
+  app:
+    build: .
+    depends_on:
+      api:
+        condition: service_healthy
+      postgres:
+        condition: service_healthy
+  api:
+    build: ./api
+    depends_on: [postgres, cache]
+  cache:
+    image: redis:7
+  worker:
+    build: ./worker
+    depends_on: [api]
+  postgres:
+    image: postgres:16
+"""
+
+
+def compose(services) -> ComposeFile:
+    return ComposeFile(path=Path('docker-compose.yml'), data={'services': services})
+
+
+class StartOrderTest(unittest.TestCase):
+
+    def test_levels_follow_dependencies_in_deploy(self):
+        file = compose({
+            'app': {'depends_on': {'api': {}, 'postgres': {}}},
+            'api': {'depends_on': ['cache', 'postgres']},
+            'cache': {},
+            'worker': {'depends_on': ['api']},
+            'postgres': {}
+        })
+        self.assertEqual(file.start_order(['worker', 'app', 'api', 'cache']), [['cache'], ['api'], ['app', 'worker']])
+        # Зависимости вне деплоя уже работают
+        self.assertEqual(file.start_order(['app', 'worker']), [['app', 'worker']])
+
+    def test_cycle_rejected(self):
+        file = compose({'a': {'depends_on': ['b']}, 'b': {'depends_on': ['a']}, 'c': {}})
+        with self.assertRaisesRegex(ValueError, 'a, b'):
+            file.start_order(['a', 'b', 'c'])
+
+
+class DeployServicesTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        compose_file = os.path.join(directory.name, 'docker-compose.yml')
+        with open(compose_file, 'w') as f:
+            f.write(COMPOSE)
+        self.proxy = SecureDockerProxy(ProxyConfig(
+            allowed_services=['app', 'api', 'cache', 'worker'], compose_file=compose_file,
+            project_name='test', protected_services=['postgres'], backend='compose'
+        ))
+        self.calls = []
+        self.lock = threading.Lock()
+        self.failing = set()
+
+        def build(service, **kwargs):
+            with self.lock:
+                self.calls.append(('build', service))
+            return {'success': service not in self.failing, 'stderr': 'boom'}
+
+        def up(service, **kwargs):
+            self.calls.append(('up', service, kwargs['no_build'], kwargs['no_deps']))
+            return {'success': True, 'stderr': ''}
+
+        self.proxy.build = build
+        self.proxy.up = up
+
+    def test_builds_then_starts_by_level(self):
+        result = self.proxy.deploy_services(['worker', 'app', 'api', 'cache'], wait_for_capacity=False)
+        self.assertTrue(result['success'])
+        self.assertEqual(sorted(c[1] for c in self.calls[:3]), ['api', 'app', 'worker'])
+        self.assertTrue(all(c[0] == 'build' for c in self.calls[:3]))
+        self.assertEqual(self.calls[3:], [
+            ('up', 'cache', False, True),
+            ('up', 'api', True, True),
+            ('up', 'app', True, True),
+            ('up', 'worker', True, True)
+        ])
+
+    def test_failed_build_starts_nothing(self):
+        self.failing.add('api')
+        result = self.proxy.deploy_services(['app', 'api'], wait_for_capacity=False)
+        self.assertEqual((result['success'], result['stage']), (False, 'build'))
+        self.assertIn('api: boom', result['error'])
+        self.assertFalse([c for c in self.calls if c[0] == 'up'])
+
+    def test_before_up_runs_between_build_and_up(self):
+        def before_up():
+            self.calls.append(('before_up',))
+            return {'success': True}
+
+        self.proxy.deploy_services(['app', 'api'], wait_for_capacity=False, before_up=before_up)
+        self.assertEqual([c[0] for c in self.calls], ['build', 'build', 'before_up', 'up', 'up'])
+
+    def test_protected_service_rejected(self):
+        with self.assertRaises(DockerProxyError):
+            self.proxy.deploy_services(['app', 'postgres'], wait_for_capacity=False)
+
+
+if __name__ == '__main__':
+    unittest.main()
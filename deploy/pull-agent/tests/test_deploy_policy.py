@@ -0,0 +1,86 @@
+"""
+Разбор окон деплоя и периодов заморозки
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deploy_policy import DeployWindow, FreezePeriod  # noqa: E402
+
+# 2026-10-19 - понедельник
+MONDAY = datetime(2026, 10, 19)
+
+
+class DeployWindowParseTest(unittest.TestCase):
+
+    def test_day_range_and_time(self):
+        window = DeployWindow.parse('Mon-Fri 20:00-07:00')
+        self.assertEqual(window.days, {0, 1, 2, 3, 4})
+        self.assertEqual((window.start, window.end), (20 * 60, 7 * 60))
+
+    def test_whitespace_in_day_list_does_not_widen_window(self):
+        self.assertEqual(DeployWindow.parse('Sat, Sun 10:00-12:00').days, {5, 6})
+        self.assertEqual(DeployWindow.parse('Mon - Wed 10:00-12:00').days, {0, 1, 2})
+
+    def test_range_across_week_end(self):
+        self.assertEqual(DeployWindow.parse('Fri-Mon 10:00-12:00').days, {4, 5, 6, 0})
+
+    def test_full_day_names_and_case(self):
+        self.assertEqual(DeployWindow.parse('monday,SUNDAY 10:00-12:00').days, {0, 6})
+
+    def test_without_days_is_daily(self):
+        self.assertEqual(DeployWindow.parse('09:00-18:00').days, set(range(7)))
+
+    def test_invalid_specs(self):
+        for spec in ('', 'Sat, Xyz 10:00-12:00', 'Sat,,Sun 10:00-12:00', '10:00 - 12:00',
+                     'Mon 25:00-26:00', 'Mon 10:00', 'Mo 10:00-12:00'):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                DeployWindow.parse(spec)
+
+
+class DeployWindowContainsTest(unittest.TestCase):
+
+    def test_same_day_window(self):
+        window = DeployWindow.parse('Mon 10:00-12:00')
+        self.assertTrue(window.contains(MONDAY.replace(hour=10)))
+        self.assertFalse(window.contains(MONDAY.replace(hour=12)))
+        self.assertFalse(window.contains(MONDAY.replace(hour=10) + timedelta(days=1)))
+
+    def test_window_across_midnight_ends_next_day(self):
+        window = DeployWindow.parse('Fri 20:00-07:00')
+        friday = MONDAY + timedelta(days=4)
+        self.assertTrue(window.contains(friday.replace(hour=21)))
+        self.assertTrue(window.contains(friday.replace(hour=6) + timedelta(days=1)))
+        self.assertFalse(window.contains(friday.replace(hour=6)))
+
+    def test_whole_day(self):
+        window = DeployWindow.parse('Sat,Sun 00:00-24:00')
+        self.assertTrue(window.contains((MONDAY + timedelta(days=6)).replace(hour=23, minute=59)))
+        self.assertFalse(window.contains(MONDAY))
+
+    def test_starts_after(self):
+        window = DeployWindow.parse('Wed 10:00-12:00')
+        self.assertEqual(window.starts_after(MONDAY)[0], MONDAY + timedelta(days=2, hours=10))
+
+
+class FreezePeriodTest(unittest.TestCase):
+
+    def test_parse_and_contains(self):
+        freeze = FreezePeriod.parse('2026-12-30 00:00 / 2027-01-08 00:00', timezone.utc)
+        self.assertEqual(freeze.start, datetime(2026, 12, 30, tzinfo=timezone.utc))
+        self.assertTrue(freeze.contains(datetime(2027, 1, 1, tzinfo=timezone.utc)))
+        self.assertFalse(freeze.contains(datetime(2027, 1, 8, tzinfo=timezone.utc)))
+
+    def test_invalid_specs(self):
+        for spec in ('2026-12-30 00:00', '2026-12-30/2027-13-01', '2027-01-08/2026-12-30'):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                FreezePeriod.parse(spec, None)
+
+
+if __name__ == '__main__':
+    unittest.main()
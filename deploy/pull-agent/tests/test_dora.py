@@ -0,0 +1,80 @@
+"""
+DORA-метрики: дневные корзины, пары неудача - восстановление, курсор истории
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dora import DoraAggregator  # noqa: E402
+
+
+class DoraAggregatorTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.data_dir = directory.name
+
+    def aggregator(self, *history) -> DoraAggregator:
+        with open(os.path.join(self.data_dir, 'deploy_history.json'), 'w') as f:
+            json.dump(list(history), f)
+        aggregator = DoraAggregator(self.data_dir, repo_dir=self.data_dir)
+        # Коммит без git: за 10 минут до первого деплоя
+        aggregator._commit_times = lambda commit: [datetime(2026, 3, 1, 9, 50).timestamp()]
+        return aggregator
+
+    def update(self, *history) -> DoraAggregator:
+        aggregator = self.aggregator(*history)
+        aggregator.update()
+        return aggregator
+
+    def test_daily_buckets_and_restore_pairing(self):
+        aggregator = self.update(
+            {'timestamp': '2026-03-01T10:00:00', 'status': 'success', 'commit': 'a'},
+            {'timestamp': '2026-03-01T12:00:00', 'status': 'failed', 'commit': 'b'},
+            {'timestamp': '2026-03-01T12:30:00', 'status': 'failed', 'commit': 'c'},
+            {'timestamp': '2026-03-02T13:00:00', 'status': 'rolled_back', 'commit': 'a'},
+            {'timestamp': '2026-03-02T15:00:00', 'status': 'success', 'commit': 'd'}
+        )
+        first, second = aggregator.days['2026-03-01'], aggregator.days['2026-03-02']
+        self.assertEqual((first.deploys, first.failures), (1, 2))
+        self.assertEqual((second.deploys, second.failures), (1, 0))
+        # Восстановление - от первой неудачи до отката
+        self.assertEqual(second.restore_times, [25 * 3600.0])
+        self.assertEqual(first.lead_times, [600.0])
+        self.assertIsNone(aggregator.incident_started)
+
+        window = aggregator.window(date(2026, 3, 2), 2)
+        self.assertEqual(window['deploy_frequency_per_day'], 1.0)
+        self.assertEqual(window['change_failure_rate'], 0.5)
+
+    def test_malformed_timestamps_skipped(self):
+        aggregator = self.update(
+            {'status': 'success', 'commit': 'a'},
+            {'timestamp': 'yesterday', 'status': 'failed', 'commit': 'b'},
+            {'timestamp': None, 'status': 'failed', 'commit': 'c'},
+            {'timestamp': '2026-03-01T10:00:00', 'status': 'success', 'commit': 'd'}
+        )
+        self.assertEqual(list(aggregator.days), ['2026-03-01'])
+        self.assertEqual(aggregator.days['2026-03-01'].failures, 0)
+
+    def test_entries_with_same_timestamp_not_skipped(self):
+        first = {'timestamp': '2026-03-01T10:00:00', 'status': 'failed', 'commit': 'a'}
+        second = {'timestamp': '2026-03-01T10:00:00', 'status': 'failed', 'commit': 'b'}
+        self.update(first)
+        aggregator = self.update(first, second)
+        self.assertEqual(aggregator.days['2026-03-01'].failures, 2)
+
+        # Повторный запуск не считает записи дважды
+        self.assertEqual(self.aggregator(first, second).update(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
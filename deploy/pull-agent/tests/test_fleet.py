@@ -0,0 +1,100 @@
+"""
+Волны и аренды деплоя флота на временном SQLite-файле
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import FleetConfig  # noqa: E402
+from fleet import FleetCoordinator  # noqa: E402
+
+COMMIT = 'a' * 40
+
+
+class FleetTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.db_path = os.path.join(directory.name, 'fleet.db')
+        self.moment = datetime(2026, 1, 1, 12, 0)
+
+    def host(self, name: str, waves=(('app-1',), ('app-2', 'app-3')), max_unavailable=1) -> FleetCoordinator:
+        coordinator = FleetCoordinator(FleetConfig(
+            enabled=True, db_path=self.db_path, host_id=name,
+            waves=[list(wave) for wave in waves], max_unavailable=max_unavailable,
+            lease_ttl=2400, host_timeout=900, retry_interval=30
+        ))
+        self.addCleanup(lambda: coordinator._db and coordinator._db.close())
+        coordinator.heartbeat(None)
+        return coordinator
+
+    def test_later_wave_waits_for_earlier(self):
+        first, second = self.host('app-1'), self.host('app-2')
+        decision = second.acquire(COMMIT, self.moment)
+        self.assertFalse(decision.allowed)
+        self.assertIn('app-1', decision.reason)
+        self.assertIsNotNone(decision.next_attempt)
+
+        self.assertTrue(first.acquire(COMMIT, self.moment).allowed)
+        first.complete()
+        self.assertTrue(second.acquire(COMMIT, self.moment).allowed)
+
+    def test_max_unavailable_limits_wave(self):
+        second, third = self.host('app-2', waves=()), self.host('app-3', waves=())
+        self.assertTrue(second.acquire(COMMIT, self.moment).allowed)
+        decision = third.acquire(COMMIT, self.moment)
+        self.assertFalse(decision.allowed)
+        self.assertIn('max unavailable 1', decision.reason)
+
+        second.complete()
+        self.assertTrue(third.acquire(COMMIT, self.moment).allowed)
+
+    def test_released_lease_frees_slot(self):
+        second, third = self.host('app-2', waves=()), self.host('app-3', waves=())
+        self.assertTrue(second.acquire(COMMIT, self.moment).allowed)
+        second.release()
+        self.assertTrue(third.acquire(COMMIT, self.moment).allowed)
+
+    def test_failure_halts_rollout_until_resume(self):
+        first, second = self.host('app-1', waves=()), self.host('app-2', waves=())
+        self.assertTrue(first.acquire(COMMIT, self.moment).allowed)
+        first.fail('health check failed')
+
+        decision = second.acquire(COMMIT, self.moment)
+        self.assertFalse(decision.allowed)
+        self.assertIn('halted', decision.reason)
+        self.assertIsNone(decision.next_attempt)
+
+        self.assertEqual(second.resume(COMMIT[:8]), 1)
+        self.assertTrue(second.acquire(COMMIT, self.moment).allowed)
+
+    def test_dead_host_does_not_block_next_wave(self):
+        self.host('app-1')
+        second = self.host('app-2')
+        second.db.execute("UPDATE members SET last_seen = ? WHERE host = 'app-1'", (time.time() - 901,))
+        self.assertEqual(second._blocking_hosts(COMMIT, time.time()), [])
+        self.assertTrue(second.acquire(COMMIT, self.moment).allowed)
+
+    def test_keepalive_keeps_commit_and_refreshes_host(self):
+        first = self.host('app-1')
+        first.heartbeat(COMMIT)
+        first.db.execute("UPDATE members SET last_seen = ? WHERE host = 'app-1'", (time.time() - 901,))
+        first._beat_at = None
+        first.keepalive()
+
+        second = self.host('app-2')
+        self.assertEqual(second._blocking_hosts(COMMIT, time.time()), ['app-1'])
+        (sha,) = second.db.execute("SELECT commit_sha FROM members WHERE host = 'app-1'").fetchone()
+        self.assertEqual(sha, COMMIT)
+
+
+if __name__ == '__main__':
+    unittest.main()
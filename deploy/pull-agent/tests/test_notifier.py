@@ -0,0 +1,114 @@
+"""
+Живое сообщение деплоя: HTTP-запросы вне блокировки состояния, ответы 429
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import json
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import NotificationConfig  # noqa: E402
+from notifier import Notifier, RateLimitedError  # noqa: E402
+
+
+def live_config(interval: float = 0.0, slack: bool = False) -> NotificationConfig:
+    return NotificationConfig(
+        slack_webhook=None, telegram_token=None if slack else 'token', telegram_chat_id='1',
+        email_smtp_host=None, email_smtp_port=587, email_from=None, email_to=None,
+        slack_bot_token='xoxb' if slack else None, slack_channel='#deploy' if slack else None,
+        live_updates=True, live_interval=interval
+    )
+
+
+class LiveMessageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.notifier = Notifier(live_config())
+        self.calls = []
+        self.release = threading.Event()
+        self.entered = threading.Event()
+
+        def telegram_api(method, payload):
+            self.calls.append((method, payload))
+            if method == 'editMessageText':
+                self.entered.set()
+                self.release.wait(5)
+            return {'result': {'message_id': 42}}
+
+        self.notifier._telegram_api = telegram_api
+        self.notifier._send_static = lambda *args: True
+
+    def test_edits_reuse_message_id(self):
+        self.release.set()
+        self.notifier.begin_live('Deploy', 'started')
+        self.notifier.stage('build')
+        self.notifier.end_live()
+        self.assertEqual([c[0] for c in self.calls], ['sendMessage', 'editMessageText'])
+        self.assertEqual(self.calls[1][1]['message_id'], 42)
+
+    def test_state_updates_do_not_wait_for_http(self):
+        self.notifier.begin_live('Deploy', 'started')
+        sender = threading.Thread(target=self.notifier.stage, args=('build',))
+        sender.start()
+        self.assertTrue(self.entered.wait(5))
+
+        # Правка в пути: блокировка состояния свободна
+        acquired = self.notifier._live_lock.acquire(timeout=1)
+        self.assertTrue(acquired)
+        self.notifier._live_lock.release()
+
+        self.release.set()
+        sender.join(5)
+        self.notifier.end_live()
+        self.assertIn('build', self.calls[1][1]['text'])
+
+
+class SlackRateLimitTest(unittest.TestCase):
+
+    def test_retry_after_header(self):
+        response = mock.Mock(status_code=429, headers={'Retry-After': '30'})
+        with mock.patch('notifier.requests') as requests:
+            requests.post.return_value = response
+            with self.assertRaises(RateLimitedError) as raised:
+                Notifier(live_config(slack=True))._slack_api('chat.update', {})
+        self.assertEqual(raised.exception.retry_after, 30)
+
+    def test_final_state_retried_after_end_live(self):
+        # Интервал длиннее теста: правку отправляет только end_live()
+        notifier = Notifier(live_config(interval=60, slack=True))
+        notifier._send_static = lambda *args: True
+        calls, delivered = [], threading.Event()
+        responses = iter([
+            {'channel': 'C1', 'ts': '1.0'},
+            RateLimitedError('chat.update', 0.01),
+            {'ok': True}
+        ])
+
+        def slack_api(method, payload):
+            calls.append((method, payload))
+            response = next(responses)
+            if isinstance(response, Exception):
+                raise response
+            if len(calls) == 3:
+                delivered.set()
+            return response
+
+        notifier._slack_api = slack_api
+        notifier.begin_live('Deploy', 'started')
+        notifier.stage('build')
+        notifier.end_live()
+
+        self.assertTrue(delivered.wait(5))
+        self.assertEqual([c[0] for c in calls], ['chat.postMessage', 'chat.update', 'chat.update'])
+        self.assertEqual(calls[2][1]['ts'], '1.0')
+        self.assertIn('build', json.dumps(calls[2][1]['attachments'], ensure_ascii=False))
+        self.assertIsNone(notifier._live)
+
+
+if __name__ == '__main__':
+    unittest.main()
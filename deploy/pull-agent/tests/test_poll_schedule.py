@@ -0,0 +1,80 @@
+"""
+Адаптивный интервал проверок: интенсивность по часам недели и границы
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import PollingConfig  # noqa: E402
+from poll_schedule import HOURS_PER_WEEK, AdaptivePoller  # noqa: E402
+
+
+def poller(lookback_days: int = 28) -> AdaptivePoller:
+    config = PollingConfig(adaptive=True, min_interval=60, max_interval=1800, jitter=0.0, lookback_days=lookback_days)
+    return AdaptivePoller(
+        config, check_interval=300, repo_dir='/nonexistent', branch='main',
+        history_file=Path('/nonexistent/deploy_history.json'), tz=timezone.utc
+    )
+
+
+def current_slot() -> int:
+    now = datetime.now(timezone.utc)
+    return now.weekday() * 24 + now.hour
+
+
+class AdaptiveIntervalTest(unittest.TestCase):
+
+    def learned(self, current_rate: float, other_rate: float = 1.0) -> AdaptivePoller:
+        engine = poller()
+        engine._learned_at = time.time()
+        engine._rates = [other_rate] * HOURS_PER_WEEK
+        engine._rates[current_slot()] = current_rate
+        engine._mean_rate = 1.0
+        return engine
+
+    def test_interval_inverse_to_activity(self):
+        self.assertAlmostEqual(self.learned(2.0)._adaptive_interval(), 150)
+        self.assertAlmostEqual(self.learned(0.5)._adaptive_interval(), 600)
+
+    def test_quiet_hour_uses_max_interval(self):
+        self.assertEqual(self.learned(0.0)._adaptive_interval(), 1800)
+
+    def test_burst_uses_min_interval(self):
+        engine = self.learned(0.5)
+        engine.observe('a')
+        engine.observe('b')
+        self.assertEqual(engine._adaptive_interval(), 60)
+
+    def test_without_learned_rates_uses_check_interval(self):
+        engine = poller()
+        engine._learned_at = time.time()
+        self.assertEqual(engine._adaptive_interval(), 300)
+
+    def test_next_interval_clamped(self):
+        self.assertEqual(self.learned(100.0).next_interval(), 60)
+        self.assertEqual(self.learned(0.01).next_interval(), 1800)
+
+    def test_mean_matches_rates_over_lookback(self):
+        engine = poller(lookback_days=14)
+        start = (datetime.now(timezone.utc) - timedelta(days=13)).replace(minute=0, second=0, microsecond=0)
+        # 28 коммитов за 14 дней, все в один час недели
+        times = {f'c{i}': (start + timedelta(weeks=i % 2, minutes=i)).timestamp() for i in range(28)}
+        engine._git_commit_times = lambda since: times
+        engine.learn()
+
+        self.assertAlmostEqual(engine._mean_rate, 28 / (14 * 24))
+        self.assertAlmostEqual(sum(engine._rates) / HOURS_PER_WEEK, engine._mean_rate)
+        slot = start.weekday() * 24 + start.hour
+        # Сглаживание: половина коммитов часа, за две недели
+        self.assertAlmostEqual(engine._rates[slot], 28 / 2 / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
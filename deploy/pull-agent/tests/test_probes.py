@@ -0,0 +1,66 @@
+"""
+Проверка здоровья: исход решают PROBE_SERVICES, зависимости - только в отчёт
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import ProbeConfig  # noqa: E402
+from probes import ProbeEngine  # noqa: E402
+
+
+class FakeProxy:
+
+    def __init__(self, states):
+        self.states = states
+        self.requested = None
+
+    def containers(self, services):
+        self.requested = services
+        return {
+            'success': True,
+            'containers': {
+                s: [{'Name': f'{s}-1', 'State': self.states.get(s, 'running'), 'Health': 'healthy'}]
+                for s in services
+            }
+        }
+
+
+def probe_config(**overrides) -> ProbeConfig:
+    values = dict(
+        services=['app'], dependencies=['postgres', 'ollama'], http_targets={},
+        quorum=1.0, timeout=1, max_workers=4
+    )
+    values.update(overrides)
+    return ProbeConfig(**values)
+
+
+class ProbeEngineTest(unittest.TestCase):
+
+    def test_unhealthy_dependency_does_not_fail_report(self):
+        proxy = FakeProxy({'ollama': 'exited'})
+        report = ProbeEngine(probe_config(), proxy).run()
+        self.assertEqual(proxy.requested, ['app', 'postgres', 'ollama'])
+        self.assertTrue(report.healthy)
+        self.assertEqual(report.degraded_dependencies, ['ollama'])
+        self.assertFalse(report.to_dict()['dependencies']['ollama']['healthy'])
+
+    def test_unhealthy_service_fails_report(self):
+        report = ProbeEngine(probe_config(), FakeProxy({'app': 'exited'})).run()
+        self.assertFalse(report.healthy)
+        self.assertEqual(report.failing, ['app'])
+
+    def test_gating_service_is_not_probed_twice(self):
+        proxy = FakeProxy({'redis': 'exited'})
+        report = ProbeEngine(probe_config(services=['app', 'redis'], dependencies=['redis']), proxy).run()
+        self.assertEqual(proxy.requested, ['app', 'redis'])
+        self.assertFalse(report.healthy)
+        self.assertEqual(report.dependencies, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
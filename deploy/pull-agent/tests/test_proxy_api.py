@@ -0,0 +1,45 @@
+"""
+Лимит одновременных потоков и long-poll HTTP API прокси
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from proxy_api import create_app  # noqa: E402
+
+
+class FakeProxy:
+    state_cache = object()
+
+    def state_changes(self, since, timeout):
+        return {'version': since, 'reset': False, 'changes': []}
+
+
+class StreamLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = create_app(FakeProxy(), jobs=None, log_hub=None, max_streams=1).test_client()
+
+    def test_streams_over_limit_get_503(self):
+        stream = self.client.get('/events/stream', buffered=False)
+        self.assertEqual(stream.status_code, 200)
+
+        busy = self.client.get('/events?timeout=0')
+        self.assertEqual(busy.status_code, 503)
+        self.assertIn('Retry-After', busy.headers)
+        self.assertEqual(self.client.get('/health').status_code, 200)
+
+        stream.close()
+        self.assertEqual(self.client.get('/events?timeout=0').status_code, 200)
+
+    def test_long_poll_releases_slot(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get('/events?timeout=0').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+Повторная настройка логирования: один фоновый поток записи на процесс
+
+    cd deploy/pull-agent && python -m pytest tests
+"""
+import os
+import sys
+import logging
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import structured_logging  # noqa: E402
+from config import LogConfig  # noqa: E402
+
+
+class SetupLoggingTest(unittest.TestCase):
+
+    def setUp(self):
+        root = logging.getLogger()
+        handlers, level = list(root.handlers), root.level
+
+        def restore():
+            structured_logging._stop_listener()
+            for handler in list(root.handlers):
+                root.removeHandler(handler)
+            for handler in handlers:
+                root.addHandler(handler)
+            root.setLevel(level)
+
+        self.addCleanup(restore)
+
+    def test_repeated_setup_stops_previous_listener(self):
+        config = LogConfig(format='json', level='INFO', file=None, max_bytes=0, backup_count=0, idle_sample_interval=0)
+        with mock.patch('atexit.register') as register:
+            structured_logging.setup_logging(config)
+            first = structured_logging._listener
+            structured_logging.setup_logging(config)
+        register.assert_not_called()
+        self.assertIsNot(structured_logging._listener, first)
+        self.assertIsNone(first._thread)
+
+        # Обработчик выхода: повторная остановка не падает
+        structured_logging._stop_listener()
+        structured_logging._stop_listener()
+        self.assertIsNone(structured_logging._listener)
+
+
+if __name__ == '__main__':
+    unittest.main()
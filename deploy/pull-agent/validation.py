@@ -0,0 +1,401 @@
+"""
+Проверка коммита перед сборкой (dry-run) для Pull-агента
+
+Новый коммит проверяется после `git fetch`, но до `git reset` рабочей
+копии и до сборки: дерево коммита выгружается во временный каталог
+(`git archive`), после чего проверяются:
+
+- синтаксис docker-compose.yml и наличие деплоимых сервисов
+- переменные окружения, на которые ссылается compose-файл
+- существование контекстов сборки и Dockerfile
+- `docker-compose config` для выгруженного дерева
+- Dockerfile линтером (hadolint, если установлен, иначе встроенные проверки)
+
+Ошибочный коммит отклоняется за секунды, без неудачной сборки и отката.
+"""
+import os
+import re
+import json
+import time
+import shutil
+import tarfile
+import logging
+import tempfile
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import ValidationConfig
+from lazy_imports import yaml
+
+logger = logging.getLogger('validation')
+
+_HEREDOC_RE = re.compile(r'<<-?\s*["\']?([A-Za-z_][A-Za-z0-9_]*)["\']?')
+
+# $$ (экранирование), ${VAR}, ${VAR:-default}, ${VAR?err}, $VAR
+_VAR_RE = re.compile(r'\$\$|\$\{([A-Za-z_][A-Za-z0-9_]*)(?:(:?[-?])([^}]*))?\}|\$([A-Za-z_][A-Za-z0-9_]*)')
+
+DOCKERFILE_INSTRUCTIONS = {
+    'FROM', 'RUN', 'CMD', 'LABEL', 'MAINTAINER', 'EXPOSE', 'ENV', 'ADD', 'COPY',
+    'ENTRYPOINT', 'VOLUME', 'USER', 'WORKDIR', 'ARG', 'ONBUILD', 'STOPSIGNAL',
+    'HEALTHCHECK', 'SHELL'
+}
+
+
+@dataclass
+class ValidationReport:
+    """Результат проверки коммита"""
+    commit: str
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def summary(self, limit: int = 5) -> str:
+        lines = self.errors[:limit]
+        if len(self.errors) > limit:
+            lines.append(f"... and {len(self.errors) - limit} more")
+        return '\n'.join(lines)
+
+
+def read_env_file(path: Path) -> Dict[str, str]:
+    """Разбор .env файла (KEY=VALUE, комментарии и кавычки)"""
+    values = {}
+    if not path.is_file():
+        return values
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        values[key.strip().removeprefix('export ').strip()] = value.strip().strip('\'"')
+    return values
+
+
+def _strings(value: Any):
+    """Все строки (ключи и значения) во вложенной структуре YAML"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            yield from _strings(k)
+            yield from _strings(v)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+class PreDeployValidator:
+    """Проверка дерева коммита до сборки"""
+
+    def __init__(
+        self,
+        config: ValidationConfig,
+        repo_dir: str,
+        compose_file: str,
+        required_services: List[str],
+        work_dir: str
+    ):
+        self.config = config
+        self.repo_dir = Path(repo_dir)
+        self.compose_path = Path(os.path.relpath(compose_file, repo_dir))
+        self.required_services = required_services
+        self.work_dir = Path(work_dir)
+
+    def validate(self, commit: str) -> ValidationReport:
+        """Проверка коммита (должен быть доступен локально после fetch)"""
+        started = time.monotonic()
+        report = ValidationReport(commit=commit)
+
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.work_dir, prefix='validate-') as tmp:
+            tree = Path(tmp)
+            try:
+                self._export(commit, tree)
+            except (OSError, subprocess.SubprocessError, tarfile.TarError) as e:
+                report.errors.append(f"Cannot export commit {commit[:8]}: {e}")
+            else:
+                self._validate_tree(tree, report)
+
+        report.duration = time.monotonic() - started
+        level = logging.INFO if report.ok else logging.WARNING
+        logger.log(
+            level,
+            f"Validation of {commit[:8]}: {len(report.errors)} errors, "
+            f"{len(report.warnings)} warnings ({report.duration:.1f}s)"
+        )
+        for warning in report.warnings:
+            logger.info(f"Validation warning: {warning}")
+        return report
+
+    def _export(self, commit: str, target: Path):
+        """Выгрузка дерева коммита без изменения рабочей копии"""
+        process = subprocess.Popen(
+            ['git', 'archive', '--format=tar', commit],
+            cwd=self.repo_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        extract_error = None
+        try:
+            with tarfile.open(fileobj=process.stdout, mode='r|') as archive:
+                if hasattr(tarfile, 'data_filter'):
+                    archive.extractall(target, filter='data')
+                else:
+                    archive.extractall(target)
+        except tarfile.TarError as e:
+            extract_error = e
+
+        stderr = process.stderr.read().decode(errors='replace')
+        if process.wait(timeout=self.config.timeout) != 0:
+            raise subprocess.SubprocessError(stderr.strip() or 'git archive failed')
+        if extract_error is not None:
+            raise extract_error
+
+        # Локальный .env не хранится в репозитории, но нужен compose
+        env_file = self.repo_dir / '.env'
+        if env_file.is_file():
+            shutil.copy(env_file, target / '.env')
+
+    def _validate_tree(self, tree: Path, report: ValidationReport):
+        compose_path = tree / self.compose_path
+        if not compose_path.is_file():
+            report.errors.append(f"Compose file {self.compose_path} not found in commit")
+            return
+
+        try:
+            data = yaml.safe_load(compose_path.read_text()) or {}
+        except yaml.YAMLError as e:
+            report.errors.append(f"Invalid YAML in {self.compose_path}: {e}")
+            return
+
+        services = data.get('services') if isinstance(data, dict) else None
+        if not isinstance(services, dict):
+            report.errors.append(f"No services defined in {self.compose_path}")
+            return
+
+        for service in self.required_services:
+            if service not in services:
+                report.errors.append(f"Service '{service}' is not defined in {self.compose_path}")
+
+        self._check_env(data, tree, report)
+        dockerfiles = self._check_builds(services, compose_path.parent, tree, report)
+
+        if self.config.compose_config:
+            self._check_compose_config(compose_path, report)
+
+        if self.config.lint:
+            for service, context, dockerfile in dockerfiles:
+                self._lint_dockerfile(service, context, dockerfile, tree, report)
+
+    def _check_env(self, data: Dict[str, Any], tree: Path, report: ValidationReport):
+        """Переменные, подставляемые compose в ${...}"""
+        env = {**read_env_file(tree / '.env'), **os.environ}
+        missing = set()
+
+        for text in _strings(data):
+            for match in _VAR_RE.finditer(text):
+                if match.group(0) == '$$':
+                    continue
+                name = match.group(1) or match.group(4)
+                operator, argument = match.group(2), match.group(3)
+                value = env.get(name)
+
+                if operator in (':?', '?'):
+                    if value is None or (operator == ':?' and value == ''):
+                        report.errors.append(
+                            f"Required variable {name} is not set" + (f": {argument}" if argument else '')
+                        )
+                elif operator is None and value is None:
+                    missing.add(name)
+
+        for name in sorted(missing):
+            message = f"Variable {name} is not set and has no default"
+            (report.errors if self.config.strict_env else report.warnings).append(message)
+
+    def _check_builds(
+        self,
+        services: Dict[str, Any],
+        compose_dir: Path,
+        tree: Path,
+        report: ValidationReport
+    ) -> List[Tuple[str, Path, Path]]:
+        """Контексты сборки и Dockerfile; возвращает найденные Dockerfile"""
+        dockerfiles = []
+        for name, service in services.items():
+            build = (service or {}).get('build')
+            if not build:
+                continue
+            if isinstance(build, str):
+                build = {'context': build}
+
+            context_ref = str(build.get('context', '.'))
+            if '://' in context_ref or context_ref.startswith('git@'):
+                continue  # удалённый контекст
+
+            context = (compose_dir / context_ref).resolve()
+            if not context.is_relative_to(tree.resolve()) or not context.is_dir():
+                report.errors.append(f"Service '{name}': build context '{context_ref}' not found")
+                continue
+
+            if 'dockerfile_inline' in build:
+                continue
+
+            dockerfile_ref = str(build.get('dockerfile', 'Dockerfile'))
+            dockerfile = (context / dockerfile_ref).resolve()
+            if not dockerfile.is_file():
+                report.errors.append(f"Service '{name}': Dockerfile '{dockerfile_ref}' not found in '{context_ref}'")
+                continue
+
+            dockerfiles.append((name, context, dockerfile))
+        return dockerfiles
+
+    def _check_compose_config(self, compose_path: Path, report: ValidationReport):
+        """`docker-compose config` для выгруженного дерева"""
+        if not shutil.which('docker-compose'):
+            report.warnings.append("docker-compose not found, config check skipped")
+            return
+
+        try:
+            result = subprocess.run(
+                ['docker-compose', '-f', str(compose_path), 'config', '-q'],
+                cwd=compose_path.parent,
+                capture_output=True,
+                text=True,
+                timeout=self.config.timeout
+            )
+        except subprocess.TimeoutExpired:
+            report.errors.append("docker-compose config timed out")
+            return
+
+        if result.returncode != 0:
+            report.errors.append(f"docker-compose config failed: {result.stderr.strip()[-1000:]}")
+
+    def _lint_dockerfile(self, service: str, context: Path, dockerfile: Path, tree: Path, report: ValidationReport):
+        relative = dockerfile.relative_to(tree.resolve())
+        hadolint = shutil.which(self.config.hadolint)
+        if hadolint:
+            try:
+                result = subprocess.run(
+                    [hadolint, '--no-color', '--failure-threshold', 'error', str(dockerfile)],
+                    capture_output=True,
+                    text=True,
+                    timeout=self.config.timeout
+                )
+            except subprocess.TimeoutExpired:
+                report.warnings.append(f"hadolint timed out on {relative}")
+                return
+            findings = [line.replace(str(dockerfile), str(relative)) for line in result.stdout.splitlines() if line]
+            (report.errors if result.returncode != 0 else report.warnings).extend(findings)
+            return
+
+        errors, warnings = lint_dockerfile(dockerfile.read_text(), context)
+        report.errors.extend(f"{relative}: {e}" for e in errors)
+        report.warnings.extend(f"{relative}: {w}" for w in warnings)
+
+
+def _instructions(text: str) -> List[Tuple[int, str, str]]:
+    """Инструкции Dockerfile (номер строки, инструкция, аргументы) с учётом переносов"""
+    instructions = []
+    buffer, start = '', 0
+    heredoc: Optional[str] = None
+    for number, line in enumerate(text.splitlines(), 1):
+        stripped = line.strip()
+        if heredoc is not None:
+            if stripped == heredoc:
+                heredoc = None
+            continue
+        if not buffer and (not stripped or stripped.startswith('#')):
+            continue
+        if buffer and stripped.startswith('#'):
+            continue
+        if not buffer:
+            start = number
+        if stripped.endswith('\\'):
+            buffer += stripped[:-1] + ' '
+            continue
+        buffer += stripped
+        parts = buffer.split(None, 1)
+        instructions.append((start, parts[0].upper(), parts[1] if len(parts) > 1 else ''))
+        buffer = ''
+
+        match = _HEREDOC_RE.search(parts[1] if len(parts) > 1 else '')
+        if match:
+            heredoc = match.group(1)
+    return instructions
+
+
+def _copy_sources(arguments: str) -> Optional[List[str]]:
+    """Источники COPY/ADD (None - копирование из другого этапа)"""
+    args = arguments.strip()
+    if args.startswith('['):
+        try:
+            paths = json.loads(args)
+        except json.JSONDecodeError:
+            return []
+        return paths[:-1]
+
+    tokens = args.split()
+    if any(t.startswith('--from') for t in tokens):
+        return None
+    paths = [t for t in tokens if not t.startswith('--')]
+    return paths[:-1]
+
+
+def lint_dockerfile(text: str, context: Path) -> Tuple[List[str], List[str]]:
+    """
+    Встроенные проверки Dockerfile (если hadolint не установлен).
+
+    Returns:
+        (ошибки, предупреждения)
+    """
+    errors, warnings = [], []
+    instructions = _instructions(text)
+    stages = set()
+    seen_from = False
+
+    for number, instruction, arguments in instructions:
+        if instruction not in DOCKERFILE_INSTRUCTIONS:
+            errors.append(f"line {number}: unknown instruction {instruction}")
+            continue
+
+        if instruction == 'FROM':
+            seen_from = True
+            tokens = [t for t in arguments.split() if not t.startswith('--')]
+            if len(tokens) >= 3 and tokens[1].upper() == 'AS':
+                stages.add(tokens[2].lower())
+            image = tokens[0] if tokens else ''
+            if image.lower() not in stages and '$' not in image and image != 'scratch':
+                name = image.split('@')[0].rsplit('/', 1)[-1]
+                if ':' not in name and '@' not in image:
+                    warnings.append(f"line {number}: image '{image}' has no tag")
+                elif name.endswith(':latest'):
+                    warnings.append(f"line {number}: image '{image}' uses the latest tag")
+            continue
+
+        if not seen_from and instruction != 'ARG':
+            errors.append(f"line {number}: {instruction} before FROM")
+            continue
+
+        if instruction in ('COPY', 'ADD'):
+            sources = _copy_sources(arguments)
+            if sources is None:
+                continue
+            if not sources:
+                errors.append(f"line {number}: {instruction} requires a source and a destination")
+                continue
+            for source in sources:
+                if any(c in source for c in '*?[$') or '://' in source:
+                    continue
+                path = (context / source).resolve()
+                if not path.is_relative_to(context) or not path.exists():
+                    errors.append(f"line {number}: {instruction} source '{source}' not found in build context")
+
+    if not seen_from:
+        errors.append("no FROM instruction")
+
+    return errors, warnings
@@ -0,0 +1,197 @@
+"""
+Профиль холодного старта и прогрев приложения после деплоя
+
+Этап между `up -d` и health check:
+
+- время создания и запуска нового контейнера app (Engine API)
+- первый момент, когда порт HEALTH_CHECK_URL принимает соединения
+  (first listen), и первый ответ 200 (first 200) - опрос каждые 250 мс
+- прогрев: WARMUP_URLS (горячие API, SSR-страницы) в WARMUP_ROUNDS
+  кругов, параллельно - кэши и ленивая инициализация готовы до того,
+  как health check пропустит трафик
+
+Разбивка пишется в историю деплоев (cold_start) и метрики.
+"""
+import time
+import socket
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+from config import DeployConfig, WarmupConfig
+from docker_proxy import SecureDockerProxy, DockerProxyError
+from metrics import MetricsStore
+from lazy_imports import requests
+
+logger = logging.getLogger('warmup')
+
+POLL_INTERVAL = 0.25
+
+
+def _parse_docker_time(value: Optional[str]) -> Optional[float]:
+    """Время Engine API (RFC 3339 с наносекундами) в epoch"""
+    if not value or value.startswith('0001-'):
+        return None
+    main, _, fraction = value.rstrip('Z').partition('.')
+    try:
+        moment = datetime.fromisoformat(f"{main}.{fraction[:6].ljust(6, '0')}+00:00")
+    except ValueError:
+        return None
+    return moment.timestamp()
+
+
+def _delta(end: Optional[float], start: Optional[float]) -> Optional[float]:
+    if end is None or start is None:
+        return None
+    return round(end - start, 3)
+
+
+@dataclass
+class ColdStart:
+    """Моменты холодного старта (epoch) и результаты прогрева"""
+    deploy_started: float
+    created: Optional[float] = None
+    started: Optional[float] = None
+    first_listen: Optional[float] = None
+    first_200: Optional[float] = None
+    warmed: Optional[float] = None
+    routes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Длительности этапов для истории деплоев"""
+        return {
+            'until_created_seconds': _delta(self.created, self.deploy_started),
+            'start_seconds': _delta(self.started, self.created),
+            'listen_seconds': _delta(self.first_listen, self.started),
+            'first_200_seconds': _delta(self.first_200, self.started),
+            'warmup_seconds': _delta(self.warmed, self.first_200),
+            'ready_seconds': _delta(self.warmed or self.first_200, self.deploy_started),
+            'routes': self.routes
+        }
+
+
+class ColdStartProfiler:
+    """Замер холодного старта и прогрев новой версии"""
+
+    def __init__(
+        self,
+        config: WarmupConfig,
+        deploy: DeployConfig,
+        docker_proxy: SecureDockerProxy,
+        metrics: Optional[MetricsStore] = None
+    ):
+        self.config = config
+        self.health_url = deploy.health_check_url
+        self.docker_proxy = docker_proxy
+        self.metrics = metrics
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(self.config.concurrency, 1))
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def _container_times(self, service: str, result: ColdStart):
+        """Время создания/запуска контейнера, созданного этим деплоем"""
+        try:
+            times = self.docker_proxy.container_times(service)
+        except DockerProxyError as e:
+            logger.warning(f"Cannot inspect {service} containers: {e}")
+            return
+        parsed = [(_parse_docker_time(t['created']), _parse_docker_time(t['started'])) for t in times]
+        # Контейнер старше деплоя не пересоздавался - его время не о холодном старте
+        parsed = [p for p in parsed if p[0] is not None and p[0] >= result.deploy_started - 1]
+        if parsed:
+            result.created, result.started = max(parsed)
+
+    def _wait_listen(self, deadline: float) -> Optional[float]:
+        url = urlparse(self.health_url)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection((url.hostname, port), timeout=1):
+                    return time.time()
+            except OSError:
+                time.sleep(POLL_INTERVAL)
+        return None
+
+    def _wait_200(self, deadline: float) -> Optional[float]:
+        while time.monotonic() < deadline:
+            try:
+                response = self.session.get(self.health_url, timeout=self.config.request_timeout)
+                if response.status_code == 200:
+                    return time.time()
+            except requests.RequestException:
+                pass
+            time.sleep(POLL_INTERVAL)
+        return None
+
+    def _request(self, url: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        try:
+            response = self.session.get(url, timeout=self.config.request_timeout)
+            status: Any = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        return {'status': status, 'ms': round((time.monotonic() - started) * 1000, 1)}
+
+    def _warm_up(self, result: ColdStart):
+        """Круги запросов к горячим маршрутам: первый (холодный) и последний"""
+        urls = [urljoin(self.health_url, u) for u in self.config.urls]
+        with ThreadPoolExecutor(max_workers=max(self.config.concurrency, 1), thread_name_prefix='warmup') as pool:
+            for round_index in range(max(self.config.rounds, 1)):
+                for path, outcome in zip(self.config.urls, pool.map(self._request, urls)):
+                    route = result.routes.setdefault(path, {})
+                    route['status'] = outcome['status']
+                    route['first_ms' if round_index == 0 else 'last_ms'] = outcome['ms']
+        failed = {path: r['status'] for path, r in result.routes.items() if r['status'] != 200}
+        if failed:
+            logger.warning(f"Warm-up requests failed: {failed}")
+
+    def run(self, service: str, deploy_started: float) -> ColdStart:
+        """
+        Профиль холодного старта и прогрев.
+
+        Не решает судьбу деплоя: без first 200 за WARMUP_TIMEOUT
+        решение принимает health check.
+
+        Args:
+            service: Сервис приложения
+            deploy_started: Начало этапа деплоя (epoch)
+        """
+        result = ColdStart(deploy_started=deploy_started)
+        deadline = time.monotonic() + self.config.timeout
+
+        self._container_times(service, result)
+        result.first_listen = self._wait_listen(deadline)
+        if result.first_listen is not None:
+            result.first_200 = self._wait_200(deadline)
+
+        if result.first_200 is None:
+            logger.warning(f"{self.health_url} did not answer 200 within {self.config.timeout}s")
+            return result
+
+        if self.config.urls:
+            self._warm_up(result)
+            result.warmed = time.time()
+
+        breakdown = result.breakdown()
+        if self.metrics is not None:
+            for name in ('first_200_seconds', 'warmup_seconds', 'ready_seconds'):
+                if breakdown[name] is not None:
+                    self.metrics.set(f"cold_start_{name}", breakdown[name], help=f"Cold start {name.replace('_', ' ')}")
+            self.metrics.write()
+        logger.info("Cold start profile", extra={'cold_start': breakdown})
+        return result
@@ -0,0 +1,142 @@
+"""
+Рабочие копии по коммитам (git worktree) для Pull-агента
+
+Каждый деплоимый коммит разворачивается в отдельный `git worktree`
+в <data_dir>/worktrees/<sha>, а активная версия - это символическая
+ссылка `current`, через которую прокси читает docker-compose.yml.
+Переключение версии (деплой, откат) - атомарная замена ссылки, без
+checkout всего дерева и без detached HEAD в основной копии. Старые
+рабочие копии удаляются сверх лимита, кроме активной и защищённых.
+"""
+import os
+import re
+import shutil
+import logging
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger('worktrees')
+
+_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+
+class WorktreeError(Exception):
+    """Ошибка подготовки рабочей копии"""
+    pass
+
+
+class WorktreeManager:
+    """Рабочие копии коммитов и ссылка на активную"""
+
+    def __init__(self, repo_dir: str, root: str, keep: int = 5):
+        self.repo_dir = Path(repo_dir)
+        self.root = Path(root)
+        self.keep = keep
+        self.current_link = self.root / 'current'
+
+    def _git(self, *args: str, timeout: int = 120) -> Tuple[int, str, str]:
+        try:
+            result = subprocess.run(
+                ['git', *args],
+                cwd=self.repo_dir,
+                capture_output=True,
+                text=True,
+                timeout=timeout
+            )
+            return result.returncode, result.stdout, result.stderr
+        except subprocess.TimeoutExpired:
+            return -1, '', 'Command timed out'
+        except OSError as e:
+            return -1, '', str(e)
+
+    def resolve(self, ref: str) -> str:
+        """Полный SHA коммита"""
+        code, stdout, stderr = self._git('rev-parse', '--verify', f'{ref}^{{commit}}', timeout=10)
+        if code != 0:
+            raise WorktreeError(f"Unknown commit {ref}: {stderr.strip()}")
+        return stdout.strip()
+
+    def path_for(self, commit: str) -> Path:
+        return self.root / commit
+
+    def active_commit(self) -> Optional[str]:
+        """Коммит, на который указывает ссылка current"""
+        try:
+            name = Path(os.readlink(self.current_link)).name
+        except OSError:
+            return None
+        return name if _SHA_RE.match(name) else None
+
+    def active_path(self) -> Path:
+        return self.current_link
+
+    def ensure(self, commit: str) -> Path:
+        """Рабочая копия коммита (создаётся при отсутствии)"""
+        commit = self.resolve(commit)
+        path = self.path_for(commit)
+        if (path / '.git').is_file():
+            return path
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            shutil.rmtree(path)
+        self._git('worktree', 'prune')
+
+        code, stdout, stderr = self._git('worktree', 'add', '--detach', str(path), commit)
+        if code != 0:
+            raise WorktreeError(f"git worktree add failed for {commit[:8]}: {stderr.strip()}")
+
+        # Локальный .env не хранится в репозитории, но нужен compose
+        env_file = self.repo_dir / '.env'
+        if env_file.is_file() and not (path / '.env').exists():
+            (path / '.env').symlink_to(env_file.resolve())
+
+        logger.info(f"Created worktree for {commit[:8]} at {path}")
+        return path
+
+    def activate(self, commit: str) -> Path:
+        """Атомарное переключение ссылки current на коммит"""
+        path = self.ensure(commit)
+        tmp_link = self.root / f'.current-{os.getpid()}'
+        if tmp_link.is_symlink():
+            tmp_link.unlink()
+        tmp_link.symlink_to(path.name)
+        os.replace(tmp_link, self.current_link)
+        os.utime(path)  # время активации для вытеснения
+
+        logger.info(f"Activated worktree {path.name[:8]}")
+        return path
+
+    def worktrees(self) -> List[Path]:
+        """Рабочие копии коммитов, от недавно активированных к старым"""
+        if not self.root.is_dir():
+            return []
+        paths = [p for p in self.root.iterdir() if _SHA_RE.match(p.name) and p.is_dir() and not p.is_symlink()]
+        return sorted(paths, key=lambda p: p.stat().st_mtime, reverse=True)
+
+    def evict(self, protect: Optional[List[Optional[str]]] = None) -> List[str]:
+        """
+        Удаление рабочих копий сверх лимита keep.
+
+        Активная копия и коммиты из protect не удаляются.
+        """
+        protected = {c for c in (protect or []) if c}
+        active = self.active_commit()
+        if active:
+            protected.add(active)
+
+        removed = []
+        for path in self.worktrees()[self.keep:]:
+            if path.name in protected:
+                continue
+            code, stdout, stderr = self._git('worktree', 'remove', '--force', str(path))
+            if code != 0:
+                logger.warning(f"git worktree remove failed for {path.name[:8]}: {stderr.strip()}")
+                shutil.rmtree(path, ignore_errors=True)
+            removed.append(path.name)
+
+        if removed:
+            self._git('worktree', 'prune')
+            logger.info(f"Evicted worktrees: {[c[:8] for c in removed]}")
+        return removed